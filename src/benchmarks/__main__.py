@@ -0,0 +1,181 @@
+"""Throughput and latency of every v1 route.
+
+    python -m src.benchmarks run --sellers 100 --books 10000 --output before.json
+    python -m src.benchmarks compare before.json after.json
+
+By default the app runs in-process behind httpx.ASGITransport.
+--uvicorn starts a separate uvicorn process instead, with metrics
+enabled so that DB round trips are read from its /metrics. Seeded rows
+are removed when the run ends.
+
+In-process runs report the CPU time per row, e.g. to compare a run with
+--fast-serialization against one without (--no-cache, or the reads are
+served from the cache). Inserts/s of books.create with and without
+write-behind batching:
+
+    python -m src.benchmarks run --scenario books.create --concurrency 64 --output before.json
+    python -m src.benchmarks run --scenario books.create --concurrency 64 --batch-inserts --output after.json
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import uuid
+from datetime import datetime, timezone
+
+from src.benchmarks.runner import (
+    QueryCounter, ScrapedQueryCounter, asgi_client, run_scenario, uvicorn_client,
+)
+from src.benchmarks.scenarios import build_scenarios
+from src.benchmarks.seed import cleanup, seed
+from src.configurations.settings import settings
+from src.migrations import upgrade
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from src.configurations.database import (
+        get_async_engine, global_dispose, global_init,
+    )
+    from src.main import app
+    from src.services.jobs import close_job_runner, get_job_runner
+
+    if args.no_cache:
+        settings.cache_backend = "none"
+    if args.fast_serialization:
+        settings.fast_serialization = True
+    if args.batch_inserts:
+        settings.book_insert_batching = True
+
+    global_init(args.database_url)
+    await upgrade(get_async_engine())
+    engine = get_async_engine()
+
+    run_id = uuid.uuid4().hex[:8]
+    data = await seed(engine, run_id, args.sellers, args.books, spare=args.requests)
+    scenarios = [
+        scenario for scenario in build_scenarios(data)
+        if not args.scenario or scenario.name in args.scenario
+    ]
+
+    results = []
+    counter = None
+    try:
+        if args.uvicorn:
+            extra_env = {"CACHE_BACKEND": "none"} if args.no_cache else {}
+            if args.fast_serialization:
+                extra_env["FAST_SERIALIZATION"] = "true"
+            if args.batch_inserts:
+                extra_env["BOOK_INSERT_BATCHING"] = "true"
+            client_context = uvicorn_client(args.database_url, extra_env)
+        else:
+            counter = QueryCounter(engine)
+            client_context = asgi_client(app)
+
+        async with client_context as client:
+            if args.uvicorn:
+                counter = ScrapedQueryCounter(client)
+            for scenario in scenarios:
+                result = await run_scenario(
+                    client, scenario, args.requests, args.concurrency, args.warmup, counter,
+                    in_process=not args.uvicorn,
+                )
+                results.append(result)
+                print(json.dumps(result))
+    finally:
+        if counter:
+            counter.close()
+        if not args.uvicorn:
+            # The jobs of the respond-async scenarios finish before their rows go
+            await get_job_runner().wait()
+            await close_job_runner()
+        await cleanup(engine, data)
+        await global_dispose()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "mode": "uvicorn" if args.uvicorn else "asgi",
+            "sellers": args.sellers,
+            "books": args.books,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "cache": not args.no_cache,
+            "fast_serialization": args.fast_serialization,
+            "batch_inserts": args.batch_inserts,
+        },
+        "results": results,
+    }
+
+
+def compare(before_path: str, after_path: str) -> None:
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before = {result["scenario"]: result for result in json.load(before_file)["results"]}
+        after = {result["scenario"]: result for result in json.load(after_file)["results"]}
+
+    print(f"{'scenario':<24}{'req/s':>22}{'p99 ms':>22}{'queries/req':>18}{'cpu us/row':>22}")
+    for name, new in after.items():
+        if (old := before.get(name)) is None:
+            continue
+        change = (new["requests_per_second"] / old["requests_per_second"] - 1) * 100
+        queries = new["db_round_trips_per_request"]
+        # Runs saved before CPU time was measured have no cpu_us_per_row
+        old_cpu, new_cpu = old.get("cpu_us_per_row"), new.get("cpu_us_per_row")
+        cpu = f"{old_cpu:.1f} -> {new_cpu:.1f}" if old_cpu is not None and new_cpu is not None else ""
+        print(
+            f"{name:<24}"
+            f"{old['requests_per_second']:>9.0f} -> {new['requests_per_second']:<7.0f}{change:>+4.0f}%"
+            f"{old['p99_ms']:>10.1f} -> {new['p99_ms']:<8.1f}"
+            f"{'' if queries is None else f'{queries:.2f}':>18}"
+            f"{cpu:>22}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.benchmarks", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark the routes and print JSON lines")
+    run_parser.add_argument("--database-url", default=settings.database_test_url)
+    run_parser.add_argument("--sellers", type=int, default=100)
+    run_parser.add_argument("--books", type=int, default=10000)
+    run_parser.add_argument("--requests", type=int, default=500)
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--warmup", type=int, default=10)
+    run_parser.add_argument("--scenario", action="append", help="only run the named scenarios")
+    run_parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    run_parser.add_argument(
+        "--fast-serialization", action="store_true", help="serialize reads from column tuples"
+    )
+    run_parser.add_argument(
+        "--batch-inserts", action="store_true", help="write-behind batching of POST /books"
+    )
+    run_parser.add_argument("--uvicorn", action="store_true", help="serve the app from a uvicorn process")
+    run_parser.add_argument("--output", help="save the results as JSON")
+
+    compare_parser = commands.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args.before, args.after)
+        return
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Seller registration throughput under concurrency.
+
+Registers sellers through the ASGI app against a real database and
+reports registrations per second together with the worst event loop
+stall, which stays near zero while the password hashes run in the
+thread pool.
+
+    python -m src.benchmarks.registration --requests 200 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import json
+import uuid
+from time import perf_counter
+
+import httpx
+from sqlalchemy import delete
+
+from src.configurations.database import (
+    get_async_engine, get_async_session, global_dispose, global_init,
+)
+from src.configurations.settings import settings
+from src.migrations import upgrade
+from src.models.sellers import Seller
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires, i.e. how long the loop was blocked."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, loop.time() - expected)
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc_info):
+        self._task.cancel()
+
+
+async def register_sellers(client: httpx.AsyncClient, run_id: str, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def register(number: int) -> None:
+        async with semaphore:
+            response = await client.post(
+                "/api/v1/seller",
+                json={
+                    "first_name": "Bench",
+                    "last_name": "Mark",
+                    "e_mail": f"bench-{run_id}-{concurrency}-{number}@example.com",
+                    "password": "Benchmark1",
+                },
+            )
+            response.raise_for_status()
+
+    with LoopLagMonitor() as monitor:
+        start = perf_counter()
+        await asyncio.gather(*(register(number) for number in range(requests)))
+        elapsed = perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "registrations_per_second": requests / elapsed,
+        "max_loop_lag_ms": monitor.max_lag * 1000,
+    }
+
+
+async def main(args: argparse.Namespace) -> list[dict]:
+    from src.main import app
+
+    global_init(args.database_url)
+    await upgrade(get_async_engine())
+
+    run_id = uuid.uuid4().hex[:8]
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for concurrency in args.concurrency:
+            results.append(await register_sellers(client, run_id, args.requests, concurrency))
+            print(json.dumps(results[-1]))
+
+    session_generator = get_async_session()
+    session = await anext(session_generator)
+    await session.execute(delete(Seller).where(Seller.e_mail.like(f"bench-{run_id}-%")))
+    # Resuming the dependency commits the session
+    await anext(session_generator, None)
+    await global_dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=settings.database_test_url)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+from math import ceil
+from time import perf_counter, process_time
+from typing import AsyncIterator, Optional
+
+import httpx
+from sqlalchemy import event, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.benchmarks.scenarios import Scenario
+
+__all__ = ["QueryCounter", "ScrapedQueryCounter", "run_scenario", "asgi_client", "uvicorn_client"]
+
+
+TRANSACTION_EVENTS = ("begin", "commit", "rollback")
+
+
+class QueryCounter:
+    """Counts statements sent to the database, i.e. DB round trips.
+
+    BEGIN, COMMIT and ROLLBACK count too, except on autocommit
+    connections where the driver does not send them.
+    """
+
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+        for name in TRANSACTION_EVENTS:
+            event.listen(engine.sync_engine, name, self._on_transaction)
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+    def _on_transaction(self, conn) -> None:
+        if conn.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+            self.count += 1
+
+    async def read(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        event.remove(self.engine.sync_engine, "before_cursor_execute", self._on_execute)
+        for name in TRANSACTION_EVENTS:
+            event.remove(self.engine.sync_engine, name, self._on_transaction)
+
+
+class ScrapedQueryCounter:
+    """Reads the statement counter of a server started with METRICS_ENABLED."""
+
+    def __init__(self, client: httpx.AsyncClient) -> None:
+        self.client = client
+
+    async def read(self) -> int:
+        response = await self.client.get("/metrics")
+        for line in response.text.splitlines():
+            if line.startswith("db_queries_total "):
+                return int(line.split()[1])
+        raise RuntimeError("db_queries_total is missing from /metrics")
+
+    def close(self) -> None:
+        pass
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    # Nearest-rank percentile of an ascending list
+    return ordered[max(0, ceil(q / 100 * len(ordered)) - 1)]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    warmup: int = 10,
+    counter: Optional[QueryCounter | ScrapedQueryCounter] = None,
+    in_process: bool = True,
+) -> dict:
+    """Send `requests` requests of `scenario`, `concurrency` at a time.
+
+    CPU time is only reported when the app runs `in_process`, it then
+    covers the app and the client alike.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def send(number: int, record: bool = True) -> None:
+        nonlocal errors
+        body = scenario.body(number) if scenario.body else None
+        async with semaphore:
+            start = perf_counter()
+            response = await client.request(
+                scenario.method, scenario.path(number), json=body, headers=scenario.headers
+            )
+            await response.aread()
+            elapsed = perf_counter() - start
+        if record:
+            latencies.append(elapsed)
+            errors += response.status_code >= 400
+
+    if not scenario.consumes:
+        await asyncio.gather(*(send(number, record=False) for number in range(warmup)))
+
+    queries_before = await counter.read() if counter else 0
+    start, cpu_start = perf_counter(), process_time()
+    await asyncio.gather(*(send(number) for number in range(requests)))
+    elapsed, cpu = perf_counter() - start, process_time() - cpu_start
+    queries = await counter.read() - queries_before if counter else None
+
+    latencies.sort()
+    return {
+        "scenario": scenario.name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "requests_per_second": requests / elapsed,
+        "rows_per_second": requests * scenario.rows / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "db_round_trips_per_request": queries / requests if counter else None,
+        "cpu_us_per_row": cpu / (requests * scenario.rows) * 1_000_000 if in_process else None,
+    }
+
+
+@asynccontextmanager
+async def asgi_client(app) -> AsyncIterator[httpx.AsyncClient]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        yield client
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def uvicorn_client(database_url: str, extra_env: dict[str, str]) -> AsyncIterator[httpx.AsyncClient]:
+    """Run the app in a separate uvicorn process on `database_url`."""
+    url = make_url(database_url)
+    port = free_port()
+    env = {
+        **os.environ,
+        **extra_env,
+        # Round trips are read from the server's /metrics
+        "METRICS_ENABLED": "true",
+        "DB_HOST": f"{url.host}:{url.port or 5432}",
+        "DB_NAME": url.database,
+        "DB_USERNAME": url.username,
+        "DB_PASSWORD": url.password,
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            for _ in range(100):
+                try:
+                    await client.get("/system/pool")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not start")
+            yield client
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,120 @@
+"""One scenario per v1 route, and per way of calling it.
+
+The change feed, /api/v1/changes/stream and /api/v1/changes/ws, has none:
+a follower keeps its response open until it goes away, so it has no
+requests per second or latency to measure. Its cost is the relay and the
+polling of the feed, the same whatever the number of followers.
+
+The `Prefer: respond-async` scenarios measure the 202 only. Their jobs run
+on in the background, so they come last: in-process, the jobs would slow
+down the scenarios after them.
+"""
+from typing import Any, Callable, NamedTuple, Optional
+
+from src.benchmarks.seed import BULK_SIZE, Seed, book_row
+
+__all__ = ["Scenario", "build_scenarios"]
+
+RESPOND_ASYNC = {"Prefer": "respond-async"}
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    # Request number -> path, and request number -> JSON body
+    path: Callable[[int], str]
+    body: Optional[Callable[[int], Any]] = None
+    # Rows written or read per request, for rows/s next to req/s
+    rows: int = 1
+    # Uses up one spare seeded row per request, no warm-up
+    consumes: bool = False
+    headers: Optional[dict[str, str]] = None
+
+
+def pick(ids: list[int], number: int) -> int:
+    return ids[number % len(ids)]
+
+
+def build_scenarios(seed: Seed) -> list[Scenario]:
+    def incoming_book(number: int) -> dict:
+        book = book_row(number, pick(seed.seller_ids, number))
+        book["count_pages"] = book.pop("pages")
+        return book
+
+    def returned_book(number: int) -> dict:
+        book = book_row(number, pick(seed.seller_ids, number))
+        book["id"] = pick(seed.book_ids, number)
+        return book
+
+    def seller(number: int) -> dict:
+        return {
+            "first_name": "Bench",
+            "last_name": "Registered",
+            "e_mail": f"bench-{seed.run_id}-registered-{number}@example.com",
+            "password": "Benchmark1",
+        }
+
+    def returned_seller(number: int) -> dict:
+        return {
+            "id": pick(seed.seller_ids, number),
+            "first_name": "Bench",
+            "last_name": f"Updated{number}",
+            "e_mail": f"bench-{seed.run_id}-{pick(seed.seller_ids, number)}@example.com",
+        }
+
+    return [
+        Scenario("books.list", "GET", lambda n: "/api/v1/books/?limit=100", rows=100),
+        Scenario("books.list_filtered", "GET", lambda n: f"/api/v1/books/?author=Author%20{n % 50}&limit=100"),
+        Scenario("books.get", "GET", lambda n: f"/api/v1/books/{pick(seed.book_ids, n)}"),
+        Scenario(
+            "books.export", "GET",
+            lambda n: f"/api/v1/books/export?seller_id={pick(seed.seller_ids, n)}",
+        ),
+        Scenario("books.create", "POST", lambda n: "/api/v1/books/", incoming_book),
+        Scenario(
+            "books.create_bulk", "POST", lambda n: "/api/v1/books/bulk",
+            lambda n: [incoming_book(n * BULK_SIZE + row) for row in range(BULK_SIZE)],
+            rows=BULK_SIZE,
+        ),
+        Scenario("books.update", "PUT", lambda n: f"/api/v1/books/{pick(seed.book_ids, n)}", returned_book),
+        Scenario(
+            "books.update_bulk", "PUT", lambda n: "/api/v1/books/bulk",
+            lambda n: [returned_book(n * BULK_SIZE + row) for row in range(BULK_SIZE)],
+            rows=BULK_SIZE,
+        ),
+        Scenario(
+            "books.delete", "DELETE", lambda n: f"/api/v1/books/{seed.spare_book_ids[n]}", consumes=True,
+        ),
+        Scenario(
+            "books.delete_bulk", "DELETE", lambda n: "/api/v1/books/bulk",
+            lambda n: seed.spare_book_batches[n], rows=BULK_SIZE, consumes=True,
+        ),
+        Scenario(
+            "books.search", "GET", lambda n: f"/api/v1/books/search?q=author%20{n % 50}&limit=100", rows=100,
+        ),
+        Scenario("seller.register", "POST", lambda n: "/api/v1/seller", seller),
+        Scenario("seller.list", "GET", lambda n: "/api/v1/seller?limit=100", rows=100),
+        Scenario("seller.get", "GET", lambda n: f"/api/v1/seller/{pick(seed.seller_ids, n)}"),
+        Scenario("seller.export", "GET", lambda n: "/api/v1/seller/export"),
+        Scenario(
+            "seller.update", "PUT", lambda n: f"/api/v1/seller/{pick(seed.seller_ids, n)}", returned_seller,
+        ),
+        Scenario(
+            "seller.delete", "DELETE", lambda n: f"/api/v1/seller/{seed.spare_seller_ids[2 * n]}", consumes=True,
+        ),
+        Scenario("stats.catalogue", "GET", lambda n: "/api/v1/stats"),
+        Scenario("stats.years", "GET", lambda n: "/api/v1/stats/years"),
+        Scenario("stats.authors", "GET", lambda n: "/api/v1/stats/authors?limit=100", rows=100),
+        Scenario("stats.sellers", "GET", lambda n: "/api/v1/stats/sellers?limit=100", rows=100),
+        Scenario("stats.seller", "GET", lambda n: f"/api/v1/stats/sellers/{pick(seed.seller_ids, n)}"),
+        Scenario("jobs.get", "GET", lambda n: f"/api/v1/jobs/{pick(seed.job_ids, n)}"),
+        Scenario(
+            "books.create_bulk_async", "POST", lambda n: "/api/v1/books/bulk",
+            lambda n: [incoming_book(n * BULK_SIZE + row) for row in range(BULK_SIZE)],
+            rows=BULK_SIZE, headers=RESPOND_ASYNC,
+        ),
+        Scenario(
+            "seller.delete_async", "DELETE", lambda n: f"/api/v1/seller/{seed.spare_seller_ids[2 * n + 1]}",
+            consumes=True, headers=RESPOND_ASYNC,
+        ),
+    ]
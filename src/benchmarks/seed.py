@@ -0,0 +1,105 @@
+from itertools import islice
+from typing import NamedTuple
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.models.books import Book
+from src.models.jobs import Job
+from src.models.sellers import Seller
+from src.services.security import hash_password_sync
+
+__all__ = ["Seed", "seed", "cleanup", "BULK_SIZE"]
+
+CHUNK_SIZE = 1000
+# Rows per request of the bulk scenarios
+BULK_SIZE = 100
+# Finished jobs polled by the jobs.get scenario
+JOBS = 100
+
+
+class Seed(NamedTuple):
+    run_id: str
+    seller_ids: list[int]
+    book_ids: list[int]
+    # Consumed by the DELETE scenarios: two sellers (seller.delete and
+    # seller.delete_async) and one book per request
+    spare_seller_ids: list[int]
+    spare_book_ids: list[int]
+    # Consumed by books.delete_bulk, a batch per request
+    spare_book_batches: list[list[int]]
+    job_ids: list[int]
+
+
+def seller_row(run_id: str, number: int, password: str) -> dict:
+    return {
+        "first_name": "Bench",
+        "last_name": f"Seller{number % 100}",
+        "e_mail": f"bench-{run_id}-{number}@example.com",
+        "password": password,
+    }
+
+
+def book_row(number: int, seller_id: int) -> dict:
+    return {
+        "title": f"Book {number}",
+        "author": f"Author {number % 50}",
+        "year": 2020 + number % 6,
+        "pages": 100 + number % 400,
+        "seller_id": seller_id,
+    }
+
+
+def job_row(run_id: str) -> dict:
+    return {"kind": "bench", "status": "succeeded", "params": {"run_id": run_id}, "done": 1, "total": 1}
+
+
+async def insert_returning_ids(session: AsyncSession, model, rows: list[dict]) -> list[int]:
+    ids, iterator = [], iter(rows)
+    while chunk := list(islice(iterator, CHUNK_SIZE)):
+        result = await session.execute(insert(model).values(chunk).returning(model.id))
+        ids.extend(result.scalars())
+    return ids
+
+
+async def seed(engine: AsyncEngine, run_id: str, sellers: int, books: int, spare: int) -> Seed:
+    """Insert `sellers` sellers sharing `books` books and a few finished jobs,
+    plus what the DELETE scenarios consume in `spare` requests."""
+    # Hashing is the slow part of registration, all seeded sellers share one hash
+    password = hash_password_sync("Benchmark1")
+    async with AsyncSession(engine) as session, session.begin():
+        # The last one holds the batches of books.delete_bulk, out of the
+        # way of the seller scenarios
+        seller_ids = await insert_returning_ids(
+            session, Seller, [seller_row(run_id, number, password) for number in range(sellers + 2 * spare + 1)]
+        )
+        book_ids = await insert_returning_ids(
+            session,
+            Book,
+            [book_row(number, seller_ids[number % sellers]) for number in range(books + spare)],
+        )
+        # An author of their own, so that they do not show in the filtered
+        # lists and the searches
+        batch_ids = await insert_returning_ids(
+            session,
+            Book,
+            [book_row(number, seller_ids[-1]) | {"author": "Spare"} for number in range(spare * BULK_SIZE)],
+        )
+        job_ids = await insert_returning_ids(session, Job, [job_row(run_id) for _ in range(JOBS)])
+    return Seed(
+        run_id,
+        seller_ids[:sellers],
+        book_ids[:books],
+        seller_ids[sellers:-1],
+        book_ids[books:],
+        [batch_ids[start:start + BULK_SIZE] for start in range(0, len(batch_ids), BULK_SIZE)],
+        job_ids,
+    )
+
+
+async def cleanup(engine: AsyncEngine, data: Seed) -> None:
+    # Books go with their sellers through ON DELETE CASCADE. The jobs of the
+    # run were created after the seeded ones
+    async with AsyncSession(engine) as session, session.begin():
+        await session.execute(delete(Seller).where(Seller.e_mail.like(f"bench-{data.run_id}-%")))
+        await session.execute(delete(Job).where(Job.id >= data.job_ids[0]))
@@ -1,6 +1,8 @@
 import logging
 
-from typing import AsyncGenerator, Callable, Optional
+from typing import Annotated, AsyncGenerator, Awaitable, Callable, Optional
+from fastapi import Depends, Request, Response
+from sqlalchemy import make_url
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -8,29 +10,96 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 
-from src.models.base import BaseModel
+from src import migrations
 from src.configurations.settings import settings
+from src.configurations.pool import InstrumentedPool
+from src.configurations.replicas import PRIMARY_READS_COOKIE, Replica, ReplicaSet
+from src.services.metrics import instrument_engine
 
-__all__ = ["global_init", "get_async_session", "create_db_and_tables"]
+__all__ = [
+    "global_init", "get_async_session", "get_write_session", "get_read_session", "get_primary_read_session",
+    "get_stream_session",
+    "read_from_replica", "prepare_schema",
+    "get_pool_status", "after_commit", "run_after_commit", "global_dispose",
+    "get_async_engine",
+]
 
-logger = logging.getLogger("__name__")
+logger = logging.getLogger(__name__)
 
 __async_engine: Optional[AsyncEngine] = None
 __session_factory: Optional[Callable[[], AsyncSession]] = None
+__read_session_factory: Optional[Callable[[], AsyncSession]] = None
+__replicas: Optional[ReplicaSet] = None
 
 SQLALCHEMY_DATABASE_URL = settings.database_url
 
 
-def global_init() -> None:
-    global __async_engine, __session_factory
+def create_engine(url: str) -> AsyncEngine:
+    url = make_url(url)
+    connect_args = {}
+    if url.get_driver_name() == "asyncpg":
+        # Prepared statements cached by SQLAlchemy's asyncpg adapter
+        # and by asyncpg itself, per pooled connection
+        url = url.update_query_dict(
+            {"prepared_statement_cache_size": str(settings.db_prepared_statement_cache_size)}
+        )
+        connect_args["statement_cache_size"] = settings.db_statement_cache_size
+
+    return create_async_engine(
+        url=url,
+        echo=settings.db_echo,
+        poolclass=InstrumentedPool,
+        pool_size=settings.max_connection_count,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        query_cache_size=settings.db_query_cache_size,
+        connect_args=connect_args,
+    )
+
+
+def global_init(url: str = SQLALCHEMY_DATABASE_URL) -> None:
+    global __async_engine, __session_factory, __read_session_factory, __replicas
 
     if __session_factory:
         return
 
     if not __async_engine:
-        __async_engine = create_async_engine(url=SQLALCHEMY_DATABASE_URL, echo=True)
+        __async_engine = create_engine(url)
+        if settings.metrics_enabled:
+            instrument_engine(__async_engine)
 
     __session_factory = async_sessionmaker(__async_engine)
+    # Same pool; in autocommit mode no BEGIN, COMMIT or ROLLBACK is sent
+    read_engine = __async_engine.execution_options(isolation_level="AUTOCOMMIT")
+    __read_session_factory = async_sessionmaker(read_engine)
+
+    if settings.db_replica_urls:
+        replica_engines = [create_engine(replica_url) for replica_url in settings.db_replica_urls]
+        if settings.metrics_enabled:
+            for engine in replica_engines:
+                instrument_engine(engine)
+        __replicas = ReplicaSet(
+            [Replica(engine) for engine in replica_engines],
+            strategy=settings.db_replica_strategy,
+            health_interval=settings.db_replica_health_interval,
+            health_timeout=settings.db_replica_health_timeout,
+            fallback=read_engine,
+        )
+
+
+async def global_dispose() -> None:
+    global __async_engine, __session_factory, __read_session_factory, __replicas
+
+    if __replicas is not None:
+        await __replicas.dispose()
+    if __async_engine is not None:
+        await __async_engine.dispose()
+    __replicas = None
+    __async_engine = None
+    __session_factory = None
+    __read_session_factory = None
 
 
 async def get_async_session() -> AsyncGenerator:
@@ -46,17 +115,111 @@ async def get_async_session() -> AsyncGenerator:
     try:
         yield session
         await session.commit()
+        await run_after_commit(session)
     except Exception as e:
         logger.error("Raises exception: %s", e)
+        await session.rollback()
         raise e
     finally:
-        await session.rollback()
+        # After a commit there is nothing left to roll back
+        session.info.pop("after_commit", None)
+        await session.close()
+
+
+async def get_write_session(
+    response: Response, session: Annotated[AsyncSession, Depends(get_async_session)]
+) -> AsyncSession:
+    """Session of the write routes, always on the primary.
+
+    With replicas, the client's reads stay on the primary for a while
+    so that it sees its own writes.
+    """
+    if __replicas is not None:
+        response.set_cookie(
+            PRIMARY_READS_COOKIE, "1", max_age=settings.read_your_writes_seconds, httponly=True
+        )
+    return session
+
+
+async def get_read_session(request: Request) -> AsyncGenerator:
+    """Session for read-only routes, on a replica when there are any.
+
+    Each statement runs in its own implicit transaction, so the request
+    pays no BEGIN and no trailing COMMIT or ROLLBACK. Several queries of
+    one request do not share a snapshot. A replica that cannot be reached
+    is taken out of rotation and the request goes on on the primary.
+    """
+    global __read_session_factory
+
+    if not __read_session_factory:
+        raise ValueError(
+            {"message": "You must call global_init() before using this method"}
+        )
+
+    replica = None
+    if __replicas is not None and PRIMARY_READS_COOKIE not in request.cookies:
+        replica = __replicas.choose()
+    session: AsyncSession = __replicas.session(replica) if replica else __read_session_factory()
+
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def get_primary_read_session() -> AsyncGenerator:
+    """Session for read-only routes that must see the latest writes.
+
+    Autocommit like get_read_session, but always on the primary, whatever
+    the replicas.
+    """
+    global __read_session_factory
+
+    if not __read_session_factory:
+        raise ValueError(
+            {"message": "You must call global_init() before using this method"}
+        )
+
+    session: AsyncSession = __read_session_factory()
+
+    try:
+        yield session
+    finally:
         await session.close()
 
 
-async def create_db_and_tables():
-    from src.models.books import Book
+def read_from_replica(session: AsyncSession) -> bool:
+    """Whether the reads of `session` so far went to a replica, which may lag behind."""
+    return session.info.get("replica") is not None
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """Schedule `callback` to run once the request transaction is committed."""
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+async def run_after_commit(session: AsyncSession) -> None:
+    for callback in session.info.pop("after_commit", []):
+        await callback()
+
 
+async def get_stream_session() -> AsyncSession:
+    """Session for streaming responses.
+
+    The response body is produced after the dependencies are torn down,
+    so the session is not closed here; the consumer must close it.
+    """
+    global __session_factory
+
+    if not __session_factory:
+        raise ValueError(
+            {"message": "You must call global_init() before using this method"}
+        )
+
+    return __session_factory()
+
+
+def get_async_engine() -> AsyncEngine:
     global __async_engine
 
     if __async_engine is None:
@@ -64,5 +227,19 @@ async def create_db_and_tables():
             {"message": "You must call global_init() before using this method"}
         )
 
-    async with __async_engine.begin() as conn:
-        await conn.run_sync(BaseModel.metadata.create_all)
+    return __async_engine
+
+
+def get_pool_status() -> dict:
+    return get_async_engine().pool.status_dict()
+
+
+async def prepare_schema() -> None:
+    """Check at boot that the schema is migrated, one query per worker.
+
+    With DB_AUTO_MIGRATE the pending migrations are applied instead.
+    """
+    if settings.db_auto_migrate:
+        await migrations.upgrade(get_async_engine())
+    else:
+        await migrations.check(get_async_engine())
@@ -0,0 +1,59 @@
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Final, Optional
+
+from src.configurations.settings import settings
+
+__all__ = ["DEBUG", "debug", "setup_logging", "shutdown_logging"]
+
+DEBUG: Final = settings.debug
+
+logger = logging.getLogger("src")
+
+__listener: Optional[QueueListener] = None
+
+
+def setup_logging() -> None:
+    """Send application log records through a queue.
+
+    Request handlers only enqueue records; formatting and the blocking
+    writes to stderr happen on the listener thread.
+    """
+    global __listener
+
+    if __listener is not None:
+        return
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    logger.addHandler(QueueHandler(records))
+    logger.setLevel(logging.DEBUG if DEBUG else settings.log_level)
+    logger.propagate = False
+
+    __listener = QueueListener(records, handler, respect_handler_level=True)
+    __listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    global __listener
+
+    if __listener is not None:
+        __listener.stop()
+        __listener = None
+
+
+def _debug(message: str, *args) -> None:
+    logger.debug(message, *args, stacklevel=2)
+
+
+def _skip_debug(message: str, *args) -> None:
+    pass
+
+
+# Chosen once at import time, so with debug mode off a call costs a bare function call
+debug = _debug if DEBUG else _skip_debug
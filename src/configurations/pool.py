@@ -0,0 +1,56 @@
+from time import perf_counter
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+__all__ = ["InstrumentedPool", "PoolMetrics"]
+
+
+class PoolMetrics:
+    """Counters of connection checkouts for one pool."""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.checkout_seconds_total = 0.0
+        self.checkout_seconds_max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.checkout_seconds_total += seconds
+        self.checkout_seconds_max = max(self.checkout_seconds_max, seconds)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long requests wait for a connection.
+
+    The checkout time covers waiting for a free connection, opening a new
+    one within the overflow and the pre-ping, which is what a request
+    pays before its first query.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+        start = perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        self.metrics.observe(perf_counter() - start)
+        return connection
+
+    def status_dict(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "checkouts": self.metrics.checkouts,
+            "timeouts": self.metrics.timeouts,
+            "checkout_seconds_total": self.metrics.checkout_seconds_total,
+            "checkout_seconds_max": self.metrics.checkout_seconds_max,
+        }
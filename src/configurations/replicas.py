@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from itertools import count
+from typing import Optional
+
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+__all__ = ["Replica", "ReplicaSet", "ReplicaSession", "PRIMARY_READS_COOKIE"]
+
+logger = logging.getLogger(__name__)
+
+# Set on responses of write routes: the client's next reads go to the
+# primary until it expires, so it sees its own writes despite replica lag
+PRIMARY_READS_COOKIE = "read_primary"
+
+
+class ReplicaSession(AsyncSession):
+    """Read session on a replica, `info["replica"]`.
+
+    A statement that cannot reach the replica takes it out of rotation and
+    runs again on `fallback`, the primary, as does the rest of the request.
+    Only once: a second error is raised.
+    """
+
+    replicas: Optional["ReplicaSet"] = None
+    fallback: Optional[AsyncEngine] = None
+
+    async def _retry_on_fallback(self, method, *args, **kwargs):
+        try:
+            return await method(*args, **kwargs)
+        except (exc.OperationalError, exc.InterfaceError, OSError) as e:
+            if (replica := self.info.pop("replica", None)) is None or self.fallback is None:
+                raise
+            logger.warning("Read on replica %s failed, retrying on the primary: %s", replica.name, e)
+            self.replicas.mark_down(replica)
+            await self.close()
+            self.bind = self.fallback
+            self.sync_session.bind = self.fallback.sync_engine
+            return await method(*args, **kwargs)
+
+    async def execute(self, *args, **kwargs):
+        return await self._retry_on_fallback(super().execute, *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await self._retry_on_fallback(super().scalar, *args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        return await self._retry_on_fallback(super().scalars, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await self._retry_on_fallback(super().get, *args, **kwargs)
+
+
+class Replica:
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        self.name = engine.url.render_as_string(hide_password=True)
+        # GET routes only, see get_read_session
+        self.session_factory = async_sessionmaker(
+            engine.execution_options(isolation_level="AUTOCOMMIT"), class_=ReplicaSession
+        )
+        self.healthy = True
+
+    def connections(self) -> int:
+        return self.engine.pool.checkedout()
+
+    def session(self) -> ReplicaSession:
+        session = self.session_factory()
+        session.info["replica"] = self
+        return session
+
+
+class ReplicaSet:
+    """Read replicas of the primary, picked per request.
+
+    A replica that fails a health check, or a request with a connection
+    error, leaves the rotation until a later check succeeds. The checks
+    run in a background task started by the first `choose()`. The request
+    itself retries on `fallback`, the primary.
+    """
+
+    def __init__(
+        self,
+        replicas: list[Replica],
+        strategy: str = "round_robin",
+        health_interval: float = 5.0,
+        health_timeout: float = 2.0,
+        fallback: Optional[AsyncEngine] = None,
+    ) -> None:
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown replica strategy: {strategy}")
+        self.replicas = replicas
+        self.fallback = fallback
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._turn = count()
+        self._health_task: Optional[asyncio.Task] = None
+
+    def choose(self) -> Optional[Replica]:
+        """A healthy replica, or None when the primary has to serve the read."""
+        if self._health_task is None:
+            self._health_task = asyncio.get_running_loop().create_task(self._check_periodically())
+
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.strategy == "least_connections":
+            return min(healthy, key=Replica.connections)
+        return healthy[next(self._turn) % len(healthy)]
+
+    def session(self, replica: Replica) -> ReplicaSession:
+        session = replica.session()
+        session.replicas, session.fallback = self, self.fallback
+        return session
+
+    def mark_down(self, replica: Replica) -> None:
+        if replica.healthy:
+            logger.warning("Replica %s is out of rotation", replica.name)
+        replica.healthy = False
+
+    @staticmethod
+    async def ping(replica: Replica) -> None:
+        async with replica.engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    async def check(self, replica: Replica) -> bool:
+        try:
+            await asyncio.wait_for(self.ping(replica), self.health_timeout)
+        except Exception as e:
+            logger.debug("Health check of %s failed: %s", replica.name, e)
+            self.mark_down(replica)
+            return False
+
+        if not replica.healthy:
+            logger.warning("Replica %s is back in rotation", replica.name)
+        replica.healthy = True
+        return True
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+    async def _check_periodically(self) -> None:
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.health_interval)
+
+    async def dispose(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
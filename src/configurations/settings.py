@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,7 +10,149 @@ class Settings(BaseSettings):
     db_username: str
     db_password: str
     db_test_name: str = "fastapi_project_test_db"
+
+    # Logging, debug mode enables the debug() calls on request paths
+    debug: bool = False
+    log_level: str = "INFO"
+
+    # Connection pool, per worker process
     max_connection_count: int = 10
+    db_max_overflow: int = 5
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    # A round trip on every checkout; off, a connection dropped by the server
+    # fails its first query instead and is replaced (pool_recycle retires
+    # idle ones before the usual server timeouts)
+    db_pool_pre_ping: bool = False
+    db_statement_cache_size: int = 100
+    db_prepared_statement_cache_size: int = 100
+    # Compiled statements cached by SQLAlchemy per engine, one per shape of
+    # query (hits and misses in /metrics as db_statement_cache_total)
+    db_query_cache_size: int = 500
+    db_echo: bool = False
+    # Connections of the database server all the workers of `python -m
+    # src.serve` may hold, 0 asks the server at launch (max_connections
+    # less the superuser reserve). The pool of each worker is shrunk to fit.
+    db_max_connections: int = 0
+    # Left free for migrations, replication, monitoring and other clients
+    db_reserved_connections: int = 5
+    # Apply the schema migrations at boot instead of only checking the
+    # version, for development; deploys run `python -m src.migrations upgrade`
+    db_auto_migrate: bool = False
+
+    # Read replicas for the GET routes, e.g. DB_REPLICA_URLS='["postgresql+asyncpg://..."]'.
+    # A replica may lag behind an invalidation, so its reads never fill the
+    # response cache: with replicas, the cache is only filled by the reads
+    # that fall back to the primary. Use one or the other
+    db_replica_urls: list[str] = []
+    # "round_robin" or "least_connections"
+    db_replica_strategy: str = "round_robin"
+    db_replica_health_interval: float = 5.0
+    db_replica_health_timeout: float = 2.0
+    # After a write, the client's reads stay on the primary this many seconds
+    read_your_writes_seconds: int = 5
+
+    # Launcher, python -m src.serve
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    # Worker processes, 0 is one per CPU
+    server_workers: int = 0
+    # "uvloop" or "asyncio", "httptools" or "h11"
+    server_loop: str = "uvloop"
+    server_http: str = "httptools"
+    # Connections the kernel queues before they are accepted
+    server_backlog: int = 2048
+    # Seconds an idle keep-alive connection stays open
+    server_keep_alive: int = 5
+    # On SIGTERM, seconds the requests in flight have to finish
+    server_graceful_shutdown: int = 30
+    server_access_log: bool = False
+
+    # Pagination
+    default_page_size: int = 100
+    max_page_size: int = 1000
+
+    # List and detail reads select column tuples and serialize them with
+    # orjson directly, without ORM instances or response model validation
+    fast_serialization: bool = False
+
+    # Rows fetched from the server-side cursor per NDJSON chunk
+    export_chunk_size: int = 1000
+
+    # Bulk book endpoints
+    bulk_max_rows: int = 50000
+    # Write-behind batching of POST /books: concurrent inserts are written by
+    # one multi-row INSERT once this many rows are queued or after the latency
+    book_insert_batching: bool = False
+    book_insert_batch_size: int = 100
+    book_insert_batch_latency: float = 0.005
+    # Rows per multi-row statement, asyncpg allows at most 32767 bind parameters
+    bulk_chunk_size: int = 1000
+    # Batches larger than this are loaded with COPY on asyncpg
+    bulk_copy_threshold: int = 5000
+
+    # Background jobs (Prefer: respond-async on DELETE /seller/{id} and
+    # POST /books/bulk): jobs run at once per worker, rows per transaction
+    job_concurrency: int = 2
+    job_chunk_size: int = 1000
+    # A running job without progress for this long has lost its worker and
+    # is resumed by the next worker to start
+    job_lease_seconds: float = 300.0
+
+    # Change feed, GET /api/v1/changes/stream (SSE) and /api/v1/changes/ws.
+    # Latest changes kept in memory per worker, older ones come from the table
+    change_feed_buffer: int = 10000
+    # How often the outbox is checked without a NOTIFY, e.g. off PostgreSQL
+    change_feed_poll_interval: float = 1.0
+    # Idle SSE streams get a comment this often, so proxies keep them open
+    change_feed_keepalive: float = 15.0
+    # Older changes are deleted, resuming before them gets 410 Gone
+    change_feed_retention_hours: float = 24.0
+
+    # Password hashing (scrypt), cost is n * r, hashes run in a bounded thread pool
+    password_hash_n: int = 2**14
+    password_hash_r: int = 8
+    password_hash_p: int = 1
+    password_hash_workers: int = 4
+
+    # Response cache of GET routes: "memory", "redis" or "none". A write
+    # invalidates "memory" only in its own worker, so several workers need
+    # "redis" (python -m src.serve refuses "memory" with more than one).
+    # Reads served by a replica do not fill it, see db_replica_urls
+    cache_backend: str = "none"
+    cache_ttl: float = 30.0
+    cache_max_entries: int = 10000
+    redis_url: str = "redis://127.0.0.1:6379/0"
+    # Concurrent identical GETs missing the cache share one query, per worker
+    single_flight: bool = True
+
+    # Admission control: excess requests are answered at once with 429 (token
+    # bucket of the client empty) or 503 (too many in flight) and Retry-After
+    admission_enabled: bool = False
+    # Token buckets, per client and per client and route: "memory" (per
+    # worker) or "redis" (shared, at redis_url)
+    rate_limit_store: str = "memory"
+    rate_limit_rate: float = 50.0
+    rate_limit_burst: int = 100
+    # Tighter buckets of some routes, by method and path template, e.g.
+    # RATE_LIMIT_ROUTES='{"GET /api/v1/books/": [10, 20]}' (rate, burst)
+    rate_limit_routes: dict[str, tuple[float, int]] = {}
+    # Clients are told apart by this header (e.g. x-api-key) when it is
+    # set, by their address otherwise
+    rate_limit_client_header: Optional[str] = None
+    # Proxies of ours in front of the app, when the header is a list they
+    # append to (x-forwarded-for): the client is the entry the outermost
+    # one added, counted from the right. The entries left of it are
+    # whatever the client sent.
+    rate_limit_trusted_hops: int = 1
+    # Requests in flight per worker, 0 is twice what the pool serves at once
+    max_in_flight: int = 0
+
+    # Per-request query counts and timings: Server-Timing headers and /metrics.
+    # When off, neither the middleware nor the engine hooks are installed
+    metrics_enabled: bool = False
+    # The same statement run this many times in one request is logged as N+1
+    n_plus_one_threshold: int = 5
 
     @property
     def database_url(self) -> str:
@@ -2,16 +2,30 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
-from src.configurations.database import create_db_and_tables, global_init
-from src.routers import v1_router
-from icecream import ic
+from src.configurations.database import get_async_engine, global_dispose, global_init, prepare_schema
+from src.configurations.log import setup_logging, shutdown_logging
+from src.configurations.settings import settings
+from src.routers import metrics_router, system_router, v1_router
+from src.services.batching import close_book_batcher
+from src.services.changes import close_change_feed, get_change_feed
+from src.services.jobs import close_job_runner, get_job_runner
+from src.services.metrics import MetricsMiddleware
+from src.services.ratelimit import AdmissionMiddleware
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    setup_logging()
     global_init()
-    await create_db_and_tables()
+    await prepare_schema()
+    await get_job_runner().resume()
+    await get_change_feed().start(get_async_engine())
     yield
+    await close_change_feed()
+    await close_job_runner()
+    await close_book_batcher()
+    await global_dispose()
+    shutdown_logging()
 
 
 app = FastAPI(
@@ -24,3 +38,12 @@ app = FastAPI(
 )
 
 app.include_router(v1_router)
+app.include_router(system_router)
+
+if settings.admission_enabled:
+    app.add_middleware(AdmissionMiddleware, router=app.router)
+
+# Added last, so that the requests shed by admission control are measured too
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics_router)
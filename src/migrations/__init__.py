@@ -0,0 +1,106 @@
+"""Versioned schema migrations, applied once per deploy out of band:
+
+    python -m src.migrations upgrade
+    python -m src.migrations current
+
+Workers do not create tables: at boot they compare the version recorded
+in schema_version with HEAD, a single query, see `check`. The migration
+modules are imported by `migrate` only.
+"""
+import logging
+from importlib import import_module
+from typing import Optional
+
+from sqlalchemy import (
+    Column, Connection, DateTime, Integer, MetaData, String, Table, exc, func, insert, select, text,
+)
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+__all__ = [
+    "MIGRATIONS", "HEAD", "SchemaVersionError", "schema_version", "migrate", "upgrade",
+    "current_version", "verify", "check",
+]
+
+logger = logging.getLogger(__name__)
+
+# (version, module, description), applied in this order. A released
+# migration is never edited, changes come as a new one.
+MIGRATIONS = (
+    (1, "v0001_catalogue", "Sellers and books with their indexes"),
+    (2, "v0002_stats", "Book statistics tables maintained by triggers"),
+    (3, "v0003_jobs", "Background jobs"),
+    (4, "v0004_changes", "Outbox of the change feed"),
+    (5, "v0005_stats_shards", "Book statistics in shards"),
+)
+HEAD = MIGRATIONS[-1][0]
+
+# Key of the PostgreSQL advisory lock held while migrating
+LOCK_KEY = 0x5DA_0001
+
+metadata = MetaData()
+
+# One row per applied migration
+schema_version = Table(
+    "schema_version",
+    metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def migrate(connection: Connection) -> list[int]:
+    """Apply the pending migrations in the transaction of `connection`, returns their versions."""
+    if connection.dialect.name == "postgresql":
+        # Concurrent runs wait for each other, every migration is applied once
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+    metadata.create_all(connection)
+    applied = set(connection.scalars(select(schema_version.c.version)))
+
+    migrated = []
+    for version, module, description in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info("Applying migration %s: %s", version, description)
+        import_module(f"{__name__}.{module}").upgrade(connection)
+        connection.execute(insert(schema_version).values(version=version, description=description))
+        migrated.append(version)
+    return migrated
+
+
+async def upgrade(engine: AsyncEngine) -> list[int]:
+    # PostgreSQL DDL is transactional: a failed migration leaves no trace
+    async with engine.begin() as connection:
+        return await connection.run_sync(migrate)
+
+
+async def current_version(connection: AsyncConnection) -> Optional[int]:
+    """Version of the schema, None when no migration was applied."""
+    return await connection.scalar(select(func.max(schema_version.c.version)))
+
+
+def verify(version: Optional[int]) -> None:
+    if version is None or version < HEAD:
+        raise SchemaVersionError(
+            f"Database schema is at version {version}, the app needs {HEAD}: "
+            "run `python -m src.migrations upgrade`"
+        )
+    if version > HEAD:
+        # During a rolling deploy the schema is migrated before the new code runs
+        logger.warning("Database schema is at version %s, ahead of this app (%s)", version, HEAD)
+
+
+async def check(engine: AsyncEngine) -> None:
+    """Refuse to start on a schema older than HEAD, at the cost of one query."""
+    async with engine.execution_options(isolation_level="AUTOCOMMIT").connect() as connection:
+        try:
+            version = await current_version(connection)
+        except exc.DBAPIError as e:
+            raise SchemaVersionError(
+                f"Cannot read the schema version ({e.orig}): run `python -m src.migrations upgrade`"
+            ) from e
+    verify(version)
@@ -0,0 +1,35 @@
+import argparse
+import asyncio
+import logging
+
+from src.configurations.settings import settings
+from src.migrations import HEAD, current_version, upgrade
+
+
+async def run(args: argparse.Namespace) -> None:
+    from src.configurations.database import create_engine
+
+    engine = create_engine(args.database_url)
+    try:
+        if args.command == "upgrade":
+            migrated = await upgrade(engine)
+            print(f"Applied {migrated}" if migrated else f"Already at version {HEAD}")
+        else:
+            async with engine.connect() as connection:
+                print(f"Database at version {await current_version(connection)}, app at {HEAD}")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.migrations", description="Database schema migrations")
+    parser.add_argument("command", choices=["upgrade", "current"])
+    parser.add_argument("--database-url", default=settings.database_url)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Sellers and books with their indexes, the full-text search one on PostgreSQL."""
+from sqlalchemy import Connection
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+from src.models.base import BaseModel
+from src.models.books import Book
+from src.models.sellers import Seller
+
+# Added to both tables after the first release: version and updated_at back
+# the ETag validators of the GET routes
+ADDED_COLUMNS = ("version", "updated_at")
+
+
+def upgrade(connection: Connection) -> None:
+    tables = [Seller.__table__, Book.__table__]
+    # A new database gets the tables complete, with their indexes
+    BaseModel.metadata.create_all(connection, tables=tables)
+    if connection.dialect.name != "postgresql":
+        return
+
+    # Databases created at boot before the migrations existed have the
+    # tables of the first release: every statement below is a no-op on a
+    # table that is already up to date
+    dialect = connection.dialect
+    for table in tables:
+        for name in ADDED_COLUMNS:
+            column = CreateColumn(table.c[name]).compile(dialect=dialect)
+            # Existing rows get the defaults: version 1, updated now
+            connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS {column}")
+    # The first release's column was too narrow for the scrypt hash strings
+    password_type = Seller.__table__.c.password.type.compile(dialect=dialect)
+    connection.exec_driver_sql(f"ALTER TABLE sellers_table ALTER COLUMN password TYPE {password_type}")
+    for table in tables:
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            connection.execute(CreateIndex(index, if_not_exists=True))
@@ -0,0 +1,106 @@
+"""Book statistics: summary tables of books_table kept current by triggers.
+
+The triggers and the backfill are PostgreSQL only; on other databases
+the tables stay empty.
+"""
+from sqlalchemy import BigInteger, Column, Connection, Integer, MetaData, String, Table, inspect
+
+metadata = MetaData()
+
+# The tables as this migration created them, migration 5 adds their shards
+RELEASED_TABLES = [
+    Table(
+        "seller_year_stats", metadata,
+        Column("seller_id", Integer, primary_key=True),
+        Column("year", Integer, primary_key=True),
+        Column("books", BigInteger, nullable=False),
+        Column("pages", BigInteger, nullable=False),
+    ),
+    Table(
+        "author_stats", metadata,
+        Column("author", String(100), primary_key=True),
+        Column("books", BigInteger, nullable=False),
+        Column("pages", BigInteger, nullable=False),
+    ),
+    Table(
+        "year_stats", metadata,
+        Column("year", Integer, primary_key=True),
+        Column("books", BigInteger, nullable=False),
+        Column("pages", BigInteger, nullable=False),
+    ),
+]
+
+# Summary table -> its key columns in books_table
+STATS_KEYS = {
+    "seller_year_stats": ("seller_id", "year"),
+    "author_stats": ("author",),
+    "year_stats": ("year",),
+}
+
+
+def apply_changes(changes: str) -> list[str]:
+    """Add `changes` (rows of key columns, books and pages) to every summary table.
+
+    Keys are upserted in order, so concurrent writers lock the summary
+    rows in the same order and cannot deadlock on them.
+    """
+    return [
+        f"""
+        INSERT INTO {table} AS s ({columns}, books, pages)
+        SELECT {columns}, sum(books), sum(pages) FROM ({changes}) AS changes
+        GROUP BY {columns}
+        HAVING sum(books) <> 0 OR sum(pages) <> 0
+        ORDER BY {columns}
+        ON CONFLICT ({columns}) DO UPDATE
+        SET books = s.books + EXCLUDED.books, pages = s.pages + EXCLUDED.pages"""
+        for table, columns in ((table, ", ".join(keys)) for table, keys in STATS_KEYS.items())
+    ]
+
+
+def remove_empty() -> list[str]:
+    """Drop the summary rows of removed books that are down to zero books."""
+    return [
+        f"""
+        DELETE FROM {table}
+        WHERE books = 0 AND ({columns}) IN (SELECT {columns} FROM old_rows)"""
+        for table, columns in ((table, ", ".join(keys)) for table, keys in STATS_KEYS.items())
+    ]
+
+
+NEW_ROWS = "SELECT seller_id, author, year, 1 AS books, pages FROM new_rows"
+OLD_ROWS = "SELECT seller_id, author, year, -1 AS books, -pages AS pages FROM old_rows"
+
+TRIGGERS = {
+    "INSERT": ("REFERENCING NEW TABLE AS new_rows", apply_changes(NEW_ROWS)),
+    "UPDATE": (
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+        apply_changes(f"{NEW_ROWS} UNION ALL {OLD_ROWS}") + remove_empty(),
+    ),
+    "DELETE": ("REFERENCING OLD TABLE AS old_rows", apply_changes(OLD_ROWS) + remove_empty()),
+}
+
+
+def upgrade(connection: Connection) -> None:
+    # Databases from before the migrations may have the tables, filled
+    # by the triggers, already
+    existed = inspect(connection).has_table("year_stats")
+    metadata.create_all(connection, tables=RELEASED_TABLES)
+    if connection.dialect.name != "postgresql":
+        return
+
+    for operation, (referencing, statements) in TRIGGERS.items():
+        name = f"books_stats_{operation.lower()}"
+        body = "".join(statement + ";" for statement in statements)
+        connection.exec_driver_sql(f"""
+        CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN{body}
+            RETURN NULL;
+        END $$""")
+        connection.exec_driver_sql(f"""
+        CREATE OR REPLACE TRIGGER {name} AFTER {operation} ON books_table
+        {referencing} FOR EACH STATEMENT EXECUTE FUNCTION {name}()""")
+
+    if not existed:
+        # Books written before the summary tables existed
+        for statement in apply_changes("SELECT seller_id, author, year, 1 AS books, pages FROM books_table"):
+            connection.exec_driver_sql(statement)
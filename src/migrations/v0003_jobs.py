@@ -0,0 +1,9 @@
+"""Background jobs and their progress."""
+from sqlalchemy import Connection
+
+from src.models.base import BaseModel
+from src.models.jobs import Job
+
+
+def upgrade(connection: Connection) -> None:
+    BaseModel.metadata.create_all(connection, tables=[Job.__table__])
@@ -0,0 +1,13 @@
+"""Outbox of the catalogue change feed."""
+from sqlalchemy import Connection
+
+from src.models.base import BaseModel
+from src.models.changes import Change
+
+
+def upgrade(connection: Connection) -> None:
+    BaseModel.metadata.create_all(connection, tables=[Change.__table__])
+    if connection.dialect.name == "postgresql":
+        # The feed numbers a change once its transaction, and every older
+        # one, is finished
+        connection.exec_driver_sql("ALTER TABLE changes_table ALTER COLUMN txid SET DEFAULT txid_current()")
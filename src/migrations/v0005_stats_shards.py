@@ -0,0 +1,80 @@
+"""Book statistics in shards: concurrent writers of one key update different rows.
+
+With a single row per key, every transaction writing books of a popular
+seller, author or year queued on the lock of that row until the previous
+one committed. Each summary row is now split in STATS_SHARDS rows, the
+triggers write to the shard of their connection and the reads add them up.
+"""
+from sqlalchemy import Connection
+
+from src.migrations.v0002_stats import NEW_ROWS, OLD_ROWS, STATS_KEYS
+from src.models.base import BaseModel
+from src.models.stats import AuthorStats, SellerYearStats, YearStats
+
+STATS_SHARDS = 16
+# Stable for a connection, so one transaction writes one row per key
+SHARD = f"pg_backend_pid() % {STATS_SHARDS}"
+
+
+def apply_changes(changes: str) -> list[str]:
+    """Add `changes` to the shard of this connection in every summary table.
+
+    Keys are upserted in order, so concurrent writers on the same shard
+    lock its rows in the same order and cannot deadlock on them.
+    """
+    return [
+        f"""
+        INSERT INTO {table} AS s ({columns}, shard, books, pages)
+        SELECT {columns}, {SHARD}, sum(books), sum(pages) FROM ({changes}) AS changes
+        GROUP BY {columns}
+        HAVING sum(books) <> 0 OR sum(pages) <> 0
+        ORDER BY {columns}
+        ON CONFLICT ({columns}, shard) DO UPDATE
+        SET books = s.books + EXCLUDED.books, pages = s.pages + EXCLUDED.pages"""
+        for table, columns in ((table, ", ".join(keys)) for table, keys in STATS_KEYS.items())
+    ]
+
+
+def remove_empty() -> list[str]:
+    """Drop the shard rows of removed books that are down to nothing.
+
+    Other shards of the key may still hold its books, or its pages after
+    a book moved shard, so both counts have to be zero.
+    """
+    return [
+        f"""
+        DELETE FROM {table}
+        WHERE shard = {SHARD} AND books = 0 AND pages = 0
+        AND ({columns}) IN (SELECT {columns} FROM old_rows)"""
+        for table, columns in ((table, ", ".join(keys)) for table, keys in STATS_KEYS.items())
+    ]
+
+
+TRIGGER_FUNCTIONS = {
+    "books_stats_insert": apply_changes(NEW_ROWS),
+    "books_stats_update": apply_changes(f"{NEW_ROWS} UNION ALL {OLD_ROWS}") + remove_empty(),
+    "books_stats_delete": apply_changes(OLD_ROWS) + remove_empty(),
+}
+
+
+def upgrade(connection: Connection) -> None:
+    if connection.dialect.name != "postgresql":
+        # No triggers, the tables are empty
+        tables = [model.__table__ for model in (SellerYearStats, AuthorStats, YearStats)]
+        BaseModel.metadata.drop_all(connection, tables=tables)
+        BaseModel.metadata.create_all(connection, tables=tables)
+        return
+
+    for table, keys in STATS_KEYS.items():
+        # The existing rows become shard 0
+        connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN shard SMALLINT NOT NULL DEFAULT 0")
+        connection.exec_driver_sql(f"ALTER TABLE {table} DROP CONSTRAINT {table}_pkey")
+        connection.exec_driver_sql(f"ALTER TABLE {table} ADD PRIMARY KEY ({', '.join(keys)}, shard)")
+    # The triggers of migration 2 call the new bodies
+    for name, statements in TRIGGER_FUNCTIONS.items():
+        body = "".join(statement + ";" for statement in statements)
+        connection.exec_driver_sql(f"""
+        CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN{body}
+            RETURN NULL;
+        END $$""")
@@ -1,9 +1,12 @@
+from datetime import datetime
 from typing import List
 
-from sqlalchemy import String
+from sqlalchemy import DateTime, Index, String, func, literal
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.orm import relationship
 from sqlalchemy import ForeignKey
+# Registers the typed full text search functions used by func.to_tsvector
+from sqlalchemy.dialects import postgresql  # noqa: F401
 from .sellers import Seller
 
 from .base import BaseModel
@@ -11,6 +14,14 @@ from .base import BaseModel
 
 class Book(BaseModel):
     __tablename__ = "books_table"
+    __table_args__ = (
+        # Composite indexes back the keyset-paginated filters of GET /books/
+        Index("ix_books_author_id", "author", "id"),
+        Index("ix_books_seller_id_id", "seller_id", "id"),
+        Index("ix_books_year_id", "year", "id"),
+        # Latest change among a seller's books, part of the seller's ETag
+        Index("ix_books_seller_id_updated_at", "seller_id", "updated_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(50), nullable=False)
@@ -19,3 +30,23 @@ class Book(BaseModel):
     pages: Mapped[int]
     seller_id: Mapped[int] = mapped_column(ForeignKey("sellers_table.id", ondelete="CASCADE"))
     seller: Mapped["Seller"] = relationship(back_populates="books")
+    # Row version for ETags and optimistic concurrency, bumped on every UPDATE
+    # (by the ORM on flush, explicitly by the UPDATE statements of the routes)
+    version: Mapped[int] = mapped_column(nullable=False, server_default="1")
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    __mapper_args__ = {"version_id_col": version, "eager_defaults": True}
+
+
+# Full-text search over title and author, see GET /books/search. Queries
+# must use this very expression for Postgres to pick the GIN index; the
+# arguments are rendered inline, a bound parameter would not match it.
+# The "simple" configuration does no stemming, which suits names.
+search_document = func.to_tsvector(
+    literal("simple", literal_execute=True),
+    Book.__table__.c.title + literal(" ", literal_execute=True) + Book.__table__.c.author,
+)
+
+Index("ix_books_search", search_document, postgresql_using="gin").ddl_if(dialect="postgresql")
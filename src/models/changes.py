@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, DateTime, Index, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import BaseModel
+
+__all__ = ["Change"]
+
+
+# Outbox of the change feed, see src.services.changes. Writers add a row in
+# the transaction of the write; `seq` is assigned after the commit, once
+# every transaction that started before it is finished, so the feed never
+# numbers a change behind one it already delivered.
+class Change(BaseModel):
+    __tablename__ = "changes_table"
+    __table_args__ = (
+        Index("ix_changes_seq", "seq", unique=True),
+        Index("ix_changes_created_at", "created_at"),
+    )
+
+    # SQLite numbers only INTEGER primary keys
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    seq: Mapped[Optional[int]] = mapped_column(BigInteger)
+    # Id of the writing transaction, txid_current() on PostgreSQL (set by
+    # src.migrations.v0004_changes)
+    txid: Mapped[Optional[int]] = mapped_column(BigInteger)
+    # "book" or "seller"; "created", "updated" or "deleted"
+    entity: Mapped[str] = mapped_column(String(16), nullable=False)
+    entity_id: Mapped[int] = mapped_column(nullable=False)
+    op: Mapped[str] = mapped_column(String(16), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
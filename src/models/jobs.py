@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import JSON, DateTime, Index, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import BaseModel
+
+__all__ = ["Job"]
+
+
+# Background operations too long for a request, see src.services.jobs. The
+# progress is committed with each chunk of work, so a job taken over after
+# a crash resumes where it stopped.
+class Job(BaseModel):
+    __tablename__ = "jobs_table"
+    __table_args__ = (
+        # Jobs left to resume at startup
+        Index("ix_jobs_status_heartbeat_at", "status", "heartbeat_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    # "queued", "running", "succeeded" or "failed"
+    status: Mapped[str] = mapped_column(String(16), nullable=False, server_default="queued")
+    params: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+    # Units of work done out of `total`, e.g. rows
+    done: Mapped[int] = mapped_column(nullable=False, server_default="0")
+    total: Mapped[Optional[int]]
+    result: Mapped[Optional[dict[str, Any]]] = mapped_column(JSON)
+    error: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    # Refreshed with the progress; a running job without news for the
+    # lease is taken to have lost its worker
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+    __mapper_args__ = {"eager_defaults": True}
@@ -1,6 +1,7 @@
+from datetime import datetime
 from typing import List, TYPE_CHECKING
 
-from sqlalchemy import String
+from sqlalchemy import DateTime, Index, String, func
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.orm import relationship
 
@@ -12,11 +13,27 @@ if TYPE_CHECKING:
 
 class Seller(BaseModel):
     __tablename__ = 'sellers_table'
+    __table_args__ = (
+        Index('ix_sellers_last_name_id', 'last_name', 'id'),
+        Index('ix_sellers_e_mail', 'e_mail'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     first_name: Mapped[str] = mapped_column(String(32), nullable=False)
     last_name: Mapped[str] = mapped_column(String(32), nullable=False)
     e_mail: Mapped[str] = mapped_column(String(64), nullable=False)
-    password: Mapped[str] = mapped_column(String(64), nullable=False)
-    books: Mapped[List["Book"]] = relationship(back_populates="seller", cascade="all, delete-orphan")
+    # scrypt hash, see src.services.security
+    password: Mapped[str] = mapped_column(String(128), nullable=False)
+    # Deleting a seller leaves the books to ON DELETE CASCADE instead of loading them
+    books: Mapped[List["Book"]] = relationship(
+        back_populates="seller", cascade="all, delete-orphan", passive_deletes=True
+    )
+    # Row version for ETags and optimistic concurrency, bumped on every UPDATE
+    # (by the ORM on flush, explicitly by the UPDATE statements of the routes)
+    version: Mapped[int] = mapped_column(nullable=False, server_default='1')
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    __mapper_args__ = {'version_id_col': version, 'eager_defaults': True}
     
\ No newline at end of file
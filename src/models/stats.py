@@ -0,0 +1,45 @@
+from sqlalchemy import BigInteger, SmallInteger, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import BaseModel
+
+__all__ = ["SellerYearStats", "AuthorStats", "YearStats"]
+
+
+# Summary tables of books_table, kept current by statement-level triggers
+# (PostgreSQL only, created by src.migrations.v0002_stats). Reads are a
+# primary key range scan of a few rows instead of an aggregate over the
+# catalogue. There is no foreign key to the sellers: the cascade from
+# a deleted seller reaches the books, whose trigger then takes the
+# seller's rows to zero and removes them.
+#
+# Each key has up to 16 rows, its shards (src.migrations.v0005_stats_shards):
+# a transaction adds to the shard of its connection, so that concurrent
+# writers do not wait on each other's row lock. Reads sum the shards.
+
+class SellerYearStats(BaseModel):
+    __tablename__ = "seller_year_stats"
+
+    seller_id: Mapped[int] = mapped_column(primary_key=True)
+    year: Mapped[int] = mapped_column(primary_key=True)
+    shard: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    books: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    pages: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+
+class AuthorStats(BaseModel):
+    __tablename__ = "author_stats"
+
+    author: Mapped[str] = mapped_column(String(100), primary_key=True)
+    shard: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    books: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    pages: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+
+class YearStats(BaseModel):
+    __tablename__ = "year_stats"
+
+    year: Mapped[int] = mapped_column(primary_key=True)
+    shard: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    books: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    pages: Mapped[int] = mapped_column(BigInteger, nullable=False)
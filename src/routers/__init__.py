@@ -1,10 +1,17 @@
 from fastapi import APIRouter
 
 from .v1.books import books_router
+from .v1.changes import changes_router
+from .v1.jobs import jobs_router
 from .v1.seller import seller_router
+from .v1.stats import stats_router
+from .system import metrics_router, system_router
 
 
 v1_router = APIRouter(tags=["v1"], prefix="/api/v1")
 
 v1_router.include_router(books_router)
 v1_router.include_router(seller_router)
+v1_router.include_router(stats_router)
+v1_router.include_router(jobs_router)
+v1_router.include_router(changes_router)
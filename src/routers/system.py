@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from src.configurations import get_pool_status
+from src.services.metrics import PROMETHEUS_MEDIA_TYPE, registry
+
+system_router = APIRouter(tags=["system"], prefix="/system")
+# Mounted at the root, where Prometheus scrapes by default
+metrics_router = APIRouter(tags=["system"])
+
+
+@system_router.get("/pool")
+async def get_pool():
+    """Connection pool occupancy and checkout wait statistics of this worker."""
+    return get_pool_status()
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Request, query and pool metrics of this worker in the Prometheus text format."""
+    return Response(registry.render(get_pool_status()), media_type=PROMETHEUS_MEDIA_TYPE)
@@ -1,20 +1,67 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, Response, status
-from sqlalchemy import select
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, select, update
 from src.models.books import Book
-from src.schemas import IncomingBook, ReturnedAllbooks, ReturnedBook
-from icecream import ic
+from pydantic import TypeAdapter
+from src.schemas import (
+    BookFilters, BookPage, BookSearch, BookSearchResults, BulkCreatedBooks, BulkDeletedBooks,
+    BulkUpdatedBooks, IncomingBook, ReturnedAllbooks, ReturnedBook, ReturnedJob,
+)
+from src.configurations.log import debug
+from src.configurations.settings import settings
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.configurations import get_async_session
+from src.configurations import get_read_session, get_stream_session, get_write_session
+from src.services import bulk, search, statements
+from src.services.batching import InsertBatcher, get_book_batcher
+from src.services.cache import (
+    BOOKS_LIST_TAG, CachedResponse, ResponseCache, book_key, get_read_cache, get_response_cache,
+    params_key, seller_books_tag, seller_key,
+)
+from src.services.changes import record_changes
+from src.services.conditional import (
+    etag_matches, etag_versions, json_response, make_etag, not_modified, validator_headers,
+)
+from src.services.jobs import JobRunner, get_job_runner, job_accepted, respond_async
+from src.services.serialization import dump_response, dump_rows
+from src.services.statements import BOOK_COLUMNS, BOOK_FIELDS
+from src.services.streaming import NDJSON_MEDIA_TYPE, ndjson_response
 
 books_router = APIRouter(tags=["books"], prefix="/books")
 
-DBSession = Annotated[AsyncSession, Depends(get_async_session)]
+DBSession = Annotated[AsyncSession, Depends(get_write_session)]
+# GET routes, no transaction around the queries
+ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
+StreamSession = Annotated[AsyncSession, Depends(get_stream_session)]
+Cache = Annotated[ResponseCache, Depends(get_response_cache)]
+ReadCache = Annotated[ResponseCache, Depends(get_read_cache)]
+Batcher = Annotated[InsertBatcher, Depends(get_book_batcher)]
+Jobs = Annotated[JobRunner, Depends(get_job_runner)]
+
+incoming_book_adapter = TypeAdapter(IncomingBook)
+returned_book_adapter = TypeAdapter(ReturnedBook)
+book_id_adapter = TypeAdapter(int)
+all_books_adapter = TypeAdapter(ReturnedAllbooks)
+search_results_adapter = TypeAdapter(BookSearchResults)
+
+
+
+def invalidate_books(session: AsyncSession, cache: ResponseCache, seller_ids: dict[int, int]) -> None:
+    """Drop the cached books, their sellers and every list page, keyed by book id."""
+    tags = [seller_key(seller_id) for seller_id in set(seller_ids.values())]
+    tags.append(BOOKS_LIST_TAG)
+    cache.invalidate_on_commit(session, [book_key(book_id) for book_id in seller_ids], tags)
+
 
 @books_router.post(
         "/", response_model=ReturnedBook, status_code=status.HTTP_201_CREATED
 )
-async def create_book(book: IncomingBook, session: DBSession): 
+async def create_book(book: IncomingBook, session: DBSession, cache: Cache, batcher: Batcher):
+    cache.invalidate_on_commit(session, tags=[seller_key(book.seller_id), BOOKS_LIST_TAG])
+    if settings.book_insert_batching:
+        # Written and committed with the batch, the request session stays unused
+        return dict(await batcher.insert(book.model_dump(include=set(bulk.INSERTED_BOOK_FIELDS))))
+
     new_book = Book(
         **{
             "title": book.title,
@@ -26,42 +73,194 @@ async def create_book(book: IncomingBook, session: DBSession):
     )
     session.add(new_book)
     await session.flush()
+    await record_changes(session, "book", "created", [new_book.id])
     return new_book
 
 
 @books_router.get("/", response_model=ReturnedAllbooks)
-async def get_all_books(session: DBSession):
-    query = select(Book)
-    result = await session.execute(query)
-    books = result.scalars().all()
-    return {"books": books}
+async def get_all_books(
+    page: Annotated[BookPage, Query()], request: Request, session: ReadSession, cache: ReadCache
+):
+    key = f"{BOOKS_LIST_TAG}:{params_key(page)}"
+    if cached := await cache.get(key):
+        return json_response(request, cached.body)
+
+    async def load() -> CachedResponse:
+        fast = settings.fast_serialization
+        result = await session.execute(statements.books_page(page, page.after, page.limit, fast))
+        books = result.all() if fast else result.scalars().all()
+        next_after = books[page.limit - 1].id if len(books) > page.limit else None
+        content = {"books": books[:page.limit], "next_after": next_after}
+        body = dump_rows(content) if fast else dump_response(all_books_adapter, content)
+        await cache.set(key, body, [BOOKS_LIST_TAG])
+        return CachedResponse(body, {})
+
+    loaded = await cache.load(key, load)
+    return Response(loaded.body, media_type="application/json")
+
+
+@books_router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
+)
+async def export_books(filters: Annotated[BookFilters, Query()], session: StreamSession):
+    query = statements.books_export(filters)
+    return ndjson_response(session, query)
+
+
+@books_router.get("/search", response_model=BookSearchResults)
+async def search_books(
+    params: Annotated[BookSearch, Query()], request: Request, session: ReadSession, cache: ReadCache
+):
+    key = f"{BOOKS_LIST_TAG}:search:{params_key(params)}"
+    if cached := await cache.get(key):
+        return json_response(request, cached.body)
+
+    async def load() -> CachedResponse:
+        # Every word of q has to start a word of the title or the author
+        books = []
+        if terms := search.to_tsquery_text(params.q):
+            # One extra row tells whether there is a next page
+            result = await session.execute(search.search_books(terms, params.limit + 1, params.offset))
+            books = result.all()
+        next_offset = params.offset + params.limit if len(books) > params.limit else None
+        body = dump_response(
+            search_results_adapter, {"books": books[:params.limit], "next_offset": next_offset}
+        )
+        await cache.set(key, body, [BOOKS_LIST_TAG])
+        return CachedResponse(body, {})
+
+    loaded = await cache.load(key, load)
+    return Response(loaded.body, media_type="application/json")
+
+
+# Bulk routes take a JSON array or an NDJSON body and report errors per row
+
+@books_router.post("/bulk", response_model=BulkCreatedBooks, responses={202: {"model": ReturnedJob}})
+async def create_books_bulk(request: Request, session: DBSession, cache: Cache, jobs: Jobs):
+    books, errors = bulk.validate_rows(incoming_book_adapter, await bulk.read_rows(request))
+    if respond_async(request):
+        # Inserted in the background, a chunk per transaction
+        rows = [(index, book.model_dump(by_alias=True)) for index, book in books]
+        job = await jobs.submit(session, "import_books", {"books": rows, "errors": errors}, total=len(rows))
+        return job_accepted(request, job)
+    created, insert_errors = await bulk.insert_books(session, books)
+    await record_changes(session, "book", "created", [book["id"] for book in created])
+    cache.invalidate_on_commit(
+        session, tags={seller_key(book["seller_id"]) for book in created} | {BOOKS_LIST_TAG}
+    )
+    return {"created": created, "errors": sorted(errors + insert_errors, key=lambda e: e["index"])}
+
+
+@books_router.put("/bulk", response_model=BulkUpdatedBooks)
+async def update_books_bulk(request: Request, session: DBSession, cache: Cache):
+    books, errors = bulk.validate_rows(returned_book_adapter, await bulk.read_rows(request))
+    updated, update_errors = await bulk.update_books(session, books)
+    await record_changes(session, "book", "updated", updated)
+    invalidate_books(session, cache, updated)
+    return {
+        "updated": sorted(updated),
+        "errors": sorted(errors + update_errors, key=lambda e: e["index"]),
+    }
+
+
+@books_router.delete("/bulk", response_model=BulkDeletedBooks)
+async def delete_books_bulk(request: Request, session: DBSession, cache: Cache):
+    book_ids, errors = bulk.validate_rows(book_id_adapter, await bulk.read_rows(request))
+    deleted, delete_errors = await bulk.delete_books(session, book_ids)
+    await record_changes(session, "book", "deleted", deleted)
+    invalidate_books(session, cache, deleted)
+    return {
+        "deleted": sorted(deleted),
+        "errors": sorted(errors + delete_errors, key=lambda e: e["index"]),
+    }
+
+
+def book_validators(book: Book) -> dict[str, str]:
+    return validator_headers(make_etag(book.version), book.updated_at)
+
+
+async def load_book_body(session: AsyncSession, book_id: int) -> Optional[tuple[bytes, Book]]:
+    """The serialized book and the row holding its seller id and validators."""
+    if settings.fast_serialization:
+        result = await session.execute(statements.book_row(book_id))
+        if row := result.first():
+            return dump_rows(dict(zip(BOOK_FIELDS, row))), row
+        return None
+    # Rows changed by UPDATE statements in this session are read again, not
+    # taken from the identity map with expired columns
+    if book := await session.get(Book, book_id, populate_existing=True):
+        return dump_response(returned_book_adapter, book), book
+    return None
 
 
 @books_router.get("/{book_id}", response_model=ReturnedBook)
-async def get_book(book_id: int, session: DBSession):
-    if result := await session.get(Book, book_id):
-        return result
+async def get_book(book_id: int, request: Request, session: ReadSession, cache: ReadCache):
+    key = book_key(book_id)
+    if cached := await cache.get(key):
+        return json_response(request, cached.body, cached.headers)
+
+    if if_none_match := request.headers.get("if-none-match"):
+        # Revalidation reads only the version columns
+        result = await session.execute(statements.book_versions(book_id))
+        if (row := result.first()) and etag_matches(if_none_match, make_etag(row.version)):
+            return not_modified(book_validators(row))
+
+    async def load() -> Optional[CachedResponse]:
+        if loaded := await load_book_body(session, book_id):
+            body, book = loaded
+            headers = book_validators(book)
+            await cache.set(key, body, [seller_books_tag(book.seller_id)], headers)
+            return CachedResponse(body, headers)
+        return None
+
+    # Concurrent requests for the book share one query
+    if loaded := await cache.load(key, load):
+        return Response(loaded.body, media_type="application/json", headers=loaded.headers)
     return Response(status_code=status.HTTP_404_NOT_FOUND)
 
 
 @books_router.delete("/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_book(book_id: int, session: DBSession):
-    deleted_book = await session.get(Book, book_id)
-    ic(deleted_book)
-    if deleted_book:
-        await session.delete(deleted_book)
+async def delete_book(book_id: int, session: DBSession, cache: Cache):
+    result = await session.execute(
+        delete(Book).where(Book.id == book_id).returning(Book.seller_id)
+    )
+    seller_id = result.scalar_one_or_none()
+    debug("Deleting book %s of seller %s", book_id, seller_id)
+    if seller_id is not None:
+        await record_changes(session, "book", "deleted", [book_id])
+        invalidate_books(session, cache, {book_id: seller_id})
     else:
         return Response(status_code=status.HTTP_404_NOT_FOUND)
 
 
 @books_router.put("/{book_id}", response_model=ReturnedBook)
-async def update_book(book_id: int, new_book_data: ReturnedBook, session: DBSession):
-    if updated_book := await session.get(Book, book_id):
-        updated_book.author = new_book_data.author
-        updated_book.title = new_book_data.title
-        updated_book.year = new_book_data.year
-        updated_book.pages = new_book_data.pages
-
-        await session.flush()
-        return updated_book
+async def update_book(
+    book_id: int, new_book_data: ReturnedBook, request: Request, session: DBSession, cache: Cache
+):
+    query = update(Book).where(Book.id == book_id)
+    # If-Match is checked by the UPDATE itself, so there is no window
+    # between reading the version and writing the row
+    if_match = request.headers.get("if-match")
+    if if_match and (versions := etag_versions(if_match)) is not None:
+        query = query.where(Book.version.in_(versions))
+
+    result = await session.execute(
+        query.values(
+            author=new_book_data.author,
+            title=new_book_data.title,
+            year=new_book_data.year,
+            pages=new_book_data.pages,
+            version=Book.version + 1,
+        ).returning(*BOOK_COLUMNS)
+    )
+    if updated_book := result.mappings().first():
+        await record_changes(session, "book", "updated", [book_id])
+        invalidate_books(session, cache, {book_id: updated_book["seller_id"]})
+        return dict(updated_book)
+
+    # Nothing updated: only a failed If-Match needs a second look
+    if if_match and await session.scalar(select(Book.id).where(Book.id == book_id)):
+        return Response(status_code=status.HTTP_412_PRECONDITION_FAILED)
     return Response(status_code=status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Annotated, AsyncIterator, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, Header, Query, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
+
+from src.configurations.settings import settings
+from src.services.changes import ChangeFeed, get_change_feed
+
+# Catalogue changes in commit order, each with its sequence number: a client
+# that reconnects gives the last one it received and misses nothing.
+# See src.services.changes
+changes_router = APIRouter(tags=["changes"], prefix="/changes")
+
+Feed = Annotated[ChangeFeed, Depends(get_change_feed)]
+
+SSE_MEDIA_TYPE = "text/event-stream"
+# WebSocket close code: the changes after the requested one were pruned
+GONE_CLOSE_CODE = 4410
+
+
+async def stream_events(feed: ChangeFeed, after: Optional[int]) -> AsyncIterator[bytes]:
+    async for batch in feed.subscribe(after, timeout=settings.change_feed_keepalive):
+        if not batch:
+            # Keeps the proxies from closing an idle stream
+            yield b": keep-alive\n\n"
+            continue
+        yield b"".join(
+            b"id: %d\nevent: change\ndata: %s\n\n" % (change["seq"], orjson.dumps(change)) for change in batch
+        )
+
+
+async def send_changes(websocket: WebSocket, feed: ChangeFeed, after: Optional[int]) -> None:
+    async for batch in feed.subscribe(after):
+        for change in batch:
+            await websocket.send_text(orjson.dumps(change).decode())
+
+
+@changes_router.get("/stream", response_class=StreamingResponse)
+async def stream_changes(
+    feed: Feed,
+    after: Annotated[Optional[int], Query(ge=0)] = None,
+    last_event_id: Annotated[Optional[int], Header(ge=0)] = None,
+):
+    """Server-sent events, from the change after `after`, or from now.
+
+    Browsers reconnect with Last-Event-ID, which takes precedence.
+    """
+    if last_event_id is not None:
+        after = last_event_id
+    if not await feed.retains(after):
+        # Too old: the client reloads what it shows, then follows from now
+        return Response(status_code=status.HTTP_410_GONE)
+    return StreamingResponse(
+        stream_events(feed, after),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@changes_router.websocket("/ws")
+async def follow_changes(websocket: WebSocket, feed: Feed, after: Annotated[Optional[int], Query(ge=0)] = None):
+    """The changes as JSON messages, one per change."""
+    await websocket.accept()
+    if not await feed.retains(after):
+        await websocket.close(code=GONE_CLOSE_CODE)
+        return
+    sending = asyncio.create_task(send_changes(websocket, feed, after))
+    try:
+        # Messages from the client are ignored, a disconnect stops the changes
+        # at once rather than at the next one sent
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sending.cancel()
+        await asyncio.gather(sending, return_exceptions=True)
@@ -0,0 +1,22 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.configurations import get_primary_read_session
+from src.models.jobs import Job
+from src.schemas import ReturnedJob
+
+# Background jobs, started with Prefer: respond-async, see src.services.jobs
+jobs_router = APIRouter(tags=["jobs"], prefix="/jobs")
+
+# Polled: autocommit, and on the primary so that the progress does not
+# lag behind on a replica
+PrimaryReadSession = Annotated[AsyncSession, Depends(get_primary_read_session)]
+
+
+@jobs_router.get("/{job_id}", response_model=ReturnedJob)
+async def get_job(job_id: int, session: PrimaryReadSession):
+    if job := await session.get(Job, job_id):
+        return job
+    return Response(status_code=status.HTTP_404_NOT_FOUND)
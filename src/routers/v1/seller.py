@@ -1,78 +1,244 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, Response, status
-from sqlalchemy import select
+from datetime import datetime
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, func, select, update
+from src.models.books import Book
 from src.models.sellers import Seller
-from sqlalchemy.orm import selectinload
 from src.schemas import (
-    RegisteringSeller, ReturnedSeller, ReturnedSellerWithBooks,
-    ReturnedAllSellers,
+    RegisteringSeller, ReturnedJob, ReturnedSeller, ReturnedSellerFields,
+    ReturnedAllSellers, SellerFilters, SellerPage, SellerView,
 )
-from icecream import ic
+from src.configurations.log import debug
+from src.configurations.settings import settings
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.configurations import get_async_session
+from src.configurations import get_read_session, get_stream_session, get_write_session
+from pydantic import TypeAdapter
+from src.services.cache import (
+    BOOKS_LIST_TAG, SELLERS_LIST_TAG, CachedResponse, ResponseCache, get_read_cache, get_response_cache,
+    params_key, seller_books_tag, seller_key,
+)
+from src.services.changes import record_changes
+from src.services.conditional import (
+    etag_matches, json_response, make_etag, not_modified, validator_headers,
+)
+from src.services.jobs import JobRunner, get_job_runner, job_accepted, respond_async
+from src.services.security import hash_password
+from src.services import statements
+from src.services.serialization import dump_response, dump_rows
+from src.services.statements import RETURNED_SELLER_COLUMNS
+from src.services.streaming import NDJSON_MEDIA_TYPE, ndjson_response
 
 seller_router = APIRouter(tags=["seller"], prefix="/seller")
 
-DBSession = Annotated[AsyncSession, Depends(get_async_session)]
+DBSession = Annotated[AsyncSession, Depends(get_write_session)]
+# GET routes, no transaction around the queries
+ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
+StreamSession = Annotated[AsyncSession, Depends(get_stream_session)]
+Cache = Annotated[ResponseCache, Depends(get_response_cache)]
+ReadCache = Annotated[ResponseCache, Depends(get_read_cache)]
+Jobs = Annotated[JobRunner, Depends(get_job_runner)]
+
+all_sellers_adapter = TypeAdapter(ReturnedAllSellers)
+seller_fields_adapter = TypeAdapter(ReturnedSellerFields)
+
+# Selectable field -> its column
+SELLER_COLUMNS = {
+    'first_name': Seller.first_name,
+    'last_name': Seller.last_name,
+    'id': Seller.id,
+    'email': Seller.e_mail,
+}
+
+def seller_validators(
+    version: int, updated_at: datetime, books_count: int, books_updated_at: Optional[datetime]
+) -> dict[str, str]:
+    # The seller response embeds the books, so their count and latest
+    # change are part of the ETag next to the seller's own version
+    books_stamp = int(books_updated_at.timestamp() * 1_000_000) if books_updated_at else 0
+    last_modified = max(updated_at, books_updated_at) if books_updated_at else updated_at
+    return validator_headers(make_etag(version, books_count, books_stamp), last_modified)
+
+
+async def load_seller_validators(
+    session: AsyncSession, seller_id: int, with_books: bool = True
+) -> Optional[dict[str, str]]:
+    # Without the books the seller's own version is the ETag
+    result = await session.execute(statements.seller_versions(seller_id, with_books))
+    if row := result.first():
+        return seller_validators(*row) if with_books else validator_headers(make_etag(row[0]), row[1])
+    return None
+
+
+async def load_seller_books(session: AsyncSession, seller_id: int, view: SellerView) -> dict:
+    result = await session.execute(
+        statements.seller_books_page(seller_id, view.books_after, view.books_limit, settings.fast_serialization)
+    )
+    books = result.all() if settings.fast_serialization else result.scalars().all()
+    page = {'books': books[:view.books_limit]}
+    if len(books) > view.books_limit:
+        page['books_next_after'] = books[view.books_limit - 1].id
+    return page
 
 
 @seller_router.post(
     '', response_model=ReturnedSeller, status_code=status.HTTP_201_CREATED
 )
-async def register_seller(seller: RegisteringSeller, session: DBSession):
+async def register_seller(seller: RegisteringSeller, session: DBSession, cache: Cache):
     new_seller = Seller(
         **{
             'first_name': seller.first_name,
             'last_name': seller.last_name,
             'e_mail': seller.e_mail,
-            'password': seller.password,
+            'password': await hash_password(seller.password),
         }
     )
 
     session.add(new_seller)
     await session.flush()
+    await record_changes(session, 'seller', 'created', [new_seller.id])
+    cache.invalidate_on_commit(session, tags=[SELLERS_LIST_TAG])
 
     return new_seller
 
 
 @seller_router.get('', response_model=ReturnedAllSellers)
-async def get_all_sellers(session: DBSession):
-    query = select(Seller)
-    result = await session.execute(query)
-    sellers = result.scalars().all()
-    return {'sellers': sellers}
+async def get_all_sellers(
+    page: Annotated[SellerPage, Query()], request: Request, session: ReadSession, cache: ReadCache
+):
+    key = f'{SELLERS_LIST_TAG}:{params_key(page)}'
+    if cached := await cache.get(key):
+        return json_response(request, cached.body)
 
+    async def load() -> CachedResponse:
+        fast = settings.fast_serialization
+        result = await session.execute(statements.sellers_page(page, page.after, page.limit, fast))
+        sellers = result.all() if fast else result.scalars().all()
+        next_after = sellers[page.limit - 1].id if len(sellers) > page.limit else None
+        content = {'sellers': sellers[:page.limit], 'next_after': next_after}
+        body = dump_rows(content) if fast else dump_response(all_sellers_adapter, content)
+        await cache.set(key, body, [SELLERS_LIST_TAG])
+        return CachedResponse(body, {})
 
-@seller_router.get('/{seller_id}', response_model=ReturnedSellerWithBooks)
-async def get_seller(seller_id: int, session: DBSession):
-    result = await session.execute(
-        select(Seller).options(selectinload(Seller.books)).where(Seller.id == seller_id)
-    )
-    seller = result.scalar_one_or_none()
-    if seller:
-        return seller
-    else:
-        return Response(status_code=status.HTTP_404_NOT_FOUND)
+    loaded = await cache.load(key, load)
+    return Response(loaded.body, media_type='application/json')
+
+
+@seller_router.get(
+    '/export',
+    response_class=StreamingResponse,
+    responses={200: {'content': {NDJSON_MEDIA_TYPE: {}}}},
+)
+async def export_sellers(filters: Annotated[SellerFilters, Query()], session: StreamSession):
+    query = statements.sellers_export(filters)
+    return ndjson_response(session, query)
+
+
+@seller_router.get('/{seller_id}', response_model=ReturnedSellerFields, response_model_exclude_unset=True)
+async def get_seller(
+    seller_id: int, view: Annotated[SellerView, Query()], request: Request, session: ReadSession, cache: ReadCache
+):
+    # Every variant is tagged with the seller, the default one keeps its plain key
+    key = seller_key(seller_id)
+    if view.model_fields_set:
+        key = f'{key}:{params_key(view)}'
+    if cached := await cache.get(key):
+        return json_response(request, cached.body, cached.headers)
+
+    if if_none_match := request.headers.get('if-none-match'):
+        # Revalidation reads only the versions, the books are not loaded
+        headers = await load_seller_validators(session, seller_id, view.with_books)
+        if headers and etag_matches(if_none_match, headers['ETag']):
+            return not_modified(headers)
+
+    async def load() -> Optional[CachedResponse]:
+        # Only the selected columns, a single primary key lookup for a summary
+        columns = [SELLER_COLUMNS[name] for name in view.selected_fields]
+        result = await session.execute(statements.seller_row(seller_id, columns, view.with_books))
+        row = result.first()
+        if row is None:
+            return None
+
+        seller = row[0]
+        content = {name: getattr(seller, column.key) for name, column in zip(view.selected_fields, columns)}
+        if view.with_books:
+            content.update(await load_seller_books(session, seller_id, view))
+            headers = seller_validators(seller.version, seller.updated_at, *row[1:])
+        else:
+            headers = validator_headers(make_etag(seller.version), seller.updated_at)
+        if settings.fast_serialization:
+            body = dump_rows(content)
+        else:
+            body = dump_response(seller_fields_adapter, content, exclude_unset=True)
+        await cache.set(key, body, [seller_key(seller_id)], headers)
+        return CachedResponse(body, headers)
+
+    # Concurrent requests for the seller share one query
+    if loaded := await cache.load(key, load):
+        return Response(loaded.body, media_type='application/json', headers=loaded.headers)
+    return Response(status_code=status.HTTP_404_NOT_FOUND)
     
 
 @seller_router.put('/{seller_id}', response_model=ReturnedSeller)
-async def update_seller(seller_id: int, new_seller_data: ReturnedSeller, session: DBSession):
-    if updated_seller := await session.get(Seller, seller_id):
-        updated_seller.first_name = new_seller_data.first_name
-        updated_seller.last_name = new_seller_data.last_name
-        updated_seller.e_mail = new_seller_data.e_mail
-
-        await session.flush()
-        
-        return updated_seller
+async def update_seller(
+    seller_id: int, new_seller_data: ReturnedSeller, request: Request, session: DBSession, cache: Cache
+):
+    query = update(Seller).where(Seller.id == seller_id)
+    if if_match := request.headers.get('if-match'):
+        # The ETag also covers the books, so it is compared here; the
+        # UPDATE is then guarded by the seller version it was built from
+        headers = await load_seller_validators(session, seller_id)
+        if headers is None:
+            return Response(status_code=status.HTTP_404_NOT_FOUND)
+        version = int(headers['ETag'].strip('"').split('.')[0])
+        # A summary response (no books) carries the seller version alone
+        if not any(etag_matches(if_match, etag, weak=False) for etag in (headers['ETag'], make_etag(version))):
+            return Response(status_code=status.HTTP_412_PRECONDITION_FAILED)
+        query = query.where(Seller.version == version)
+
+    result = await session.execute(
+        query.values(
+            first_name=new_seller_data.first_name,
+            last_name=new_seller_data.last_name,
+            e_mail=new_seller_data.e_mail,
+            version=Seller.version + 1,
+        ).returning(*RETURNED_SELLER_COLUMNS)
+    )
+    if updated_seller := result.mappings().first():
+        await record_changes(session, 'seller', 'updated', [seller_id])
+        cache.invalidate_on_commit(session, tags=[seller_key(seller_id), SELLERS_LIST_TAG])
+        return dict(updated_seller)
+    if if_match:
+        # Changed by a concurrent request since the ETag was compared
+        return Response(status_code=status.HTTP_412_PRECONDITION_FAILED)
     return Response(status_code=status.HTTP_404_NOT_FOUND)
 
 
-@seller_router.delete('/{seller_id}', status_code=status.HTTP_204_NO_CONTENT)
-async def delete_seller(seller_id: int, session: DBSession):
-    deleted_seller = await session.get(Seller, seller_id)
-    ic(deleted_seller)
-    if deleted_seller:
-        await session.delete(deleted_seller)
+@seller_router.delete(
+    '/{seller_id}', status_code=status.HTTP_204_NO_CONTENT, responses={202: {'model': ReturnedJob}}
+)
+async def delete_seller(seller_id: int, request: Request, session: DBSession, cache: Cache, jobs: Jobs):
+    if respond_async(request):
+        # A large catalogue goes chunk by chunk in a background job
+        books = select(func.count(Book.id)).where(Book.seller_id == seller_id).scalar_subquery()
+        result = await session.execute(select(Seller.id, books).where(Seller.id == seller_id))
+        if (row := result.first()) is None:
+            return Response(status_code=status.HTTP_404_NOT_FOUND)
+        job = await jobs.submit(session, 'delete_seller', {'seller_id': seller_id}, total=row[1])
+        return job_accepted(request, job)
+
+    # A single statement, the books go with ON DELETE CASCADE
+    result = await session.execute(
+        delete(Seller).where(Seller.id == seller_id).returning(Seller.id)
+    )
+    deleted = result.scalar_one_or_none() is not None
+    debug('Deleting seller %s: %s', seller_id, deleted)
+    if deleted:
+        # The books go with the seller, without changes of their own
+        await record_changes(session, 'seller', 'deleted', [seller_id])
+        cache.invalidate_on_commit(
+            session,
+            tags=[seller_key(seller_id), SELLERS_LIST_TAG, BOOKS_LIST_TAG, seller_books_tag(seller_id)],
+        )
     else:
         return Response(status_code=status.HTTP_404_NOT_FOUND)
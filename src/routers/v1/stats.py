@@ -0,0 +1,109 @@
+from itertools import groupby
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query, Response, status
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+from src.configurations import get_read_session
+from src.models.sellers import Seller
+from src.models.stats import AuthorStats, SellerYearStats, YearStats
+from src.schemas import (
+    AuthorStatsPage, BookTotals, ReturnedAuthorTotals, ReturnedSellerTotals, SellerStatsPage,
+    SellerTotals, YearTotals,
+)
+
+# Read from the summary tables, which the database keeps current on every
+# write to books_table, adding up the shards of each key, see src.models.stats
+stats_router = APIRouter(tags=["stats"], prefix="/stats")
+
+ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
+
+
+def totals(*keys: InstrumentedAttribute) -> Select:
+    """Books and pages per value of `keys`, over the shards of the key."""
+    model = keys[0].class_
+    books = func.sum(model.books)
+    # Keys whose books are all gone may keep shards that add up to zero
+    return (
+        select(*keys, books.label("books"), func.sum(model.pages).label("pages"))
+        .group_by(*keys)
+        .having(books != 0)
+    )
+
+
+def seller_totals(seller_id: int, rows: list[dict]) -> dict:
+    return {
+        "seller_id": seller_id,
+        "books": sum(row["books"] for row in rows),
+        "pages": sum(row["pages"] for row in rows),
+        "years": rows,
+    }
+
+
+@stats_router.get("", response_model=BookTotals)
+async def get_catalogue_stats(session: ReadSession):
+    # A few rows per year, a few hundred rows for the whole catalogue
+    result = await session.execute(
+        select(func.coalesce(func.sum(YearStats.books), 0), func.coalesce(func.sum(YearStats.pages), 0))
+    )
+    books, pages = result.one()
+    return {"books": books, "pages": pages}
+
+
+@stats_router.get("/years", response_model=list[YearTotals])
+async def get_year_stats(session: ReadSession):
+    result = await session.execute(totals(YearStats.year).order_by(YearStats.year))
+    return result.mappings().all()
+
+
+@stats_router.get("/authors", response_model=ReturnedAuthorTotals)
+async def get_author_stats(page: Annotated[AuthorStatsPage, Query()], session: ReadSession):
+    query = totals(AuthorStats.author)
+    if page.after is not None:
+        query = query.where(AuthorStats.author > page.after)
+    result = await session.execute(query.order_by(AuthorStats.author).limit(page.limit + 1))
+    authors = result.mappings().all()
+    next_after = authors[page.limit - 1]["author"] if len(authors) > page.limit else None
+    return {"authors": authors[:page.limit], "next_after": next_after}
+
+
+@stats_router.get("/sellers", response_model=ReturnedSellerTotals)
+async def get_seller_stats(page: Annotated[SellerStatsPage, Query()], session: ReadSession):
+    seller_ids = (
+        select(SellerYearStats.seller_id)
+        .group_by(SellerYearStats.seller_id)
+        .having(func.sum(SellerYearStats.books) != 0)
+    )
+    if page.after is not None:
+        seller_ids = seller_ids.where(SellerYearStats.seller_id > page.after)
+    seller_ids = seller_ids.order_by(SellerYearStats.seller_id).limit(page.limit + 1)
+    ids = (await session.scalars(seller_ids)).all()
+    next_after = ids[page.limit - 1] if len(ids) > page.limit else None
+
+    result = await session.execute(
+        totals(SellerYearStats.seller_id, SellerYearStats.year)
+        .where(SellerYearStats.seller_id.in_(ids[:page.limit]))
+        .order_by(SellerYearStats.seller_id, SellerYearStats.year)
+    )
+    sellers = [
+        seller_totals(seller_id, list(rows))
+        for seller_id, rows in groupby(result.mappings(), key=lambda row: row["seller_id"])
+    ]
+    return {"sellers": sellers, "next_after": next_after}
+
+
+@stats_router.get("/sellers/{seller_id}", response_model=SellerTotals)
+async def get_one_seller_stats(seller_id: int, session: ReadSession):
+    result = await session.execute(
+        totals(SellerYearStats.year)
+        .where(SellerYearStats.seller_id == seller_id)
+        .order_by(SellerYearStats.year)
+    )
+    if rows := result.mappings().all():
+        return seller_totals(seller_id, rows)
+    # No summary rows: a seller without books, or no such seller
+    if await session.scalar(select(Seller.id).where(Seller.id == seller_id)):
+        return seller_totals(seller_id, [])
+    return Response(status_code=status.HTTP_404_NOT_FOUND)
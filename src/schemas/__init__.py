@@ -1,5 +1,9 @@
 from .books import *
+from .jobs import *
 from .sellers import *
+from .stats import *
 
 __all__ = books.__all__
+__all__.extend(jobs.__all__)
 __all__.extend(sellers.__all__)
+__all__.extend(stats.__all__)
@@ -1,7 +1,15 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field, field_validator
 from pydantic_core import PydanticCustomError
 
-__all__ = ["IncomingBook", "ReturnedBook", "ReturnedAllbooks", "ReturnedBookLinkedToSeller"]
+from src.configurations.settings import settings
+
+__all__ = [
+    "IncomingBook", "ReturnedBook", "ReturnedAllbooks", "ReturnedBookLinkedToSeller",
+    "BookFilters", "BookPage", "BulkRowError", "BulkCreatedBooks", "BulkUpdatedBooks",
+    "BulkDeletedBooks", "BookSearch", "BookSearchHit", "BookSearchResults",
+]
 
 
 class BaseBook(BaseModel):
@@ -11,6 +19,8 @@ class BaseBook(BaseModel):
 
 
 class IncomingBook(BaseBook):
+    # Book.title is a String(50)
+    title: str = Field(max_length=50)
     seller_id: int
     pages: int = Field(
         default=150, alias="count_pages"
@@ -31,6 +41,39 @@ class ReturnedBook(BaseBook):
 
 class ReturnedAllbooks(BaseModel):
     books: list[ReturnedBook]
+    next_after: Optional[int] = None
+
+
+class BookFilters(BaseModel):
+    author: Optional[str] = None
+    seller_id: Optional[int] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+
+
+class BookPage(BookFilters):
+    # Keyset pagination: `after` is the last book id of the previous page
+    limit: int = Field(default=settings.default_page_size, ge=1, le=settings.max_page_size)
+    after: Optional[int] = None
+
+class BookSearch(BaseModel):
+    # Every word must match the start of a word of the title or author
+    q: str = Field(min_length=1, max_length=200)
+    limit: int = Field(default=settings.default_page_size, ge=1, le=settings.max_page_size)
+    # Results are ordered by rank, so pages are numbered by offset
+    offset: int = Field(default=0, ge=0)
+
+
+class BookSearchHit(ReturnedBook):
+    rank: float
+    # Title and author as HTML: the text escaped, the matched words in <b></b>
+    title_highlight: str
+    author_highlight: str
+
+
+class BookSearchResults(BaseModel):
+    books: list[BookSearchHit]
+    next_offset: Optional[int] = None
 
 class ReturnedBookLinkedToSeller(BaseBook):
     id: int
@@ -38,3 +81,24 @@ class ReturnedBookLinkedToSeller(BaseBook):
     model_config = {
         "populate_by_name": True,
     }
+
+
+class BulkRowError(BaseModel):
+    # Position of the row in the request body
+    index: int
+    errors: list[dict]
+
+
+class BulkCreatedBooks(BaseModel):
+    created: list[ReturnedBook]
+    errors: list[BulkRowError]
+
+
+class BulkUpdatedBooks(BaseModel):
+    updated: list[int]
+    errors: list[BulkRowError]
+
+
+class BulkDeletedBooks(BaseModel):
+    deleted: list[int]
+    errors: list[BulkRowError]
@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+__all__ = ["ReturnedJob"]
+
+
+class ReturnedJob(BaseModel):
+    id: int
+    kind: str
+    status: str
+    done: int
+    total: Optional[int] = None
+    result: Optional[dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
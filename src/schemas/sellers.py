@@ -1,12 +1,25 @@
+from typing import Literal, Optional
+
 from pydantic import (
     BaseModel, EmailStr, Field, SecretStr, field_validator
 )
 from pydantic_core import PydanticCustomError
+from src.configurations.settings import settings
 from password_validator import PasswordValidator
-from icecream import ic
 from .books import ReturnedBookLinkedToSeller
 
-__all__ = ['RegisteringSeller', 'ReturnedSeller', 'ReturnedAllSellers', 'ReturnedSellerWithBooks']
+__all__ = [
+    'RegisteringSeller', 'ReturnedSeller', 'ReturnedAllSellers', 'ReturnedSellerWithBooks',
+    'SellerFilters', 'SellerPage', 'SellerView', 'ReturnedSellerFields', 'SELLER_FIELDS',
+]
+
+# Built once, the rules do not change between requests
+password_schema = PasswordValidator()
+password_schema.min(8).max(64)\
+    .has().uppercase()\
+    .has().lowercase()\
+    .has().digits()\
+    .has().no().spaces()
 
 class BaseSeller(BaseModel):
     first_name: str
@@ -18,14 +31,7 @@ class RegisteringSeller(BaseSeller):
     @field_validator('password')
     @staticmethod
     def validate_password(password):
-        ic(password)
-        schema = PasswordValidator()
-        schema.min(8).max(64)\
-            .has().uppercase()\
-            .has().lowercase()\
-            .has().digits()\
-            .has().no().spaces()
-        if not schema.validate(password):
+        if not password_schema.validate(password):
             raise PydanticCustomError('Validation error', 'Password should be in common format!')
         return password
 
@@ -35,6 +41,16 @@ class ReturnedSeller(BaseSeller):
 
 class ReturnedAllSellers(BaseModel):
     sellers: list[ReturnedSeller]
+    next_after: Optional[int] = None
+
+class SellerFilters(BaseModel):
+    last_name: Optional[str] = None
+    e_mail: Optional[str] = None
+
+class SellerPage(SellerFilters):
+    # Keyset pagination: `after` is the last seller id of the previous page
+    limit: int = Field(default=settings.default_page_size, ge=1, le=settings.max_page_size)
+    after: Optional[int] = None
 
 class ReturnedSellerWithBooks(BaseSeller):
     id: int
@@ -43,4 +59,49 @@ class ReturnedSellerWithBooks(BaseSeller):
     model_config = {
         "populate_by_name": True,
     }
-    
\ No newline at end of file
+    
+
+# Fields of the seller itself a client may select, in response order
+SELLER_FIELDS = ('first_name', 'last_name', 'id', 'email')
+
+class SellerView(BaseModel):
+    # `fields` selects the seller's own fields, `include=books` adds a page
+    # of the books; neither gives the whole seller with the first page
+    fields: Optional[str] = None
+    include: Optional[Literal['books']] = None
+    # Keyset pagination: `books_after` is the last book id of the previous page
+    books_limit: int = Field(default=settings.default_page_size, ge=1, le=settings.max_page_size)
+    books_after: Optional[int] = None
+
+    @field_validator('fields')
+    @staticmethod
+    def validate_fields(fields):
+        if fields is None:
+            return None
+        names = {name.strip() for name in fields.split(',') if name.strip()}
+        if unknown := names.difference(SELLER_FIELDS):
+            raise PydanticCustomError(
+                'Validation error', 'Unknown seller fields: {unknown}', {'unknown': ', '.join(sorted(unknown))}
+            )
+        # Normalized, so equal selections share a cache entry
+        return ','.join(name for name in SELLER_FIELDS if name in names)
+
+    @property
+    def selected_fields(self) -> tuple[str, ...]:
+        return tuple(self.fields.split(',')) if self.fields else SELLER_FIELDS
+
+    @property
+    def with_books(self) -> bool:
+        return self.include == 'books' or self.fields is None
+
+class ReturnedSellerFields(BaseModel):
+    # Dumped with exclude_unset: only the selected fields are rendered
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    id: Optional[int] = None
+    e_mail: Optional[EmailStr] = Field(default=None, alias="email")
+    books: Optional[list[ReturnedBookLinkedToSeller]] = None
+    books_next_after: Optional[int] = None
+    model_config = {
+        "populate_by_name": True,
+    }
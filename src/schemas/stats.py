@@ -0,0 +1,49 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from src.configurations.settings import settings
+
+__all__ = [
+    "BookTotals", "YearTotals", "AuthorTotals", "SellerTotals", "ReturnedAuthorTotals",
+    "ReturnedSellerTotals", "AuthorStatsPage", "SellerStatsPage",
+]
+
+
+class BookTotals(BaseModel):
+    books: int
+    pages: int
+
+
+class YearTotals(BookTotals):
+    year: int
+
+
+class AuthorTotals(BookTotals):
+    author: str
+
+
+class SellerTotals(BookTotals):
+    seller_id: int
+    years: list[YearTotals]
+
+
+class ReturnedAuthorTotals(BaseModel):
+    authors: list[AuthorTotals]
+    next_after: Optional[str] = None
+
+
+class ReturnedSellerTotals(BaseModel):
+    sellers: list[SellerTotals]
+    next_after: Optional[int] = None
+
+
+class AuthorStatsPage(BaseModel):
+    # Keyset pagination: `after` is the last author of the previous page
+    limit: int = Field(default=settings.default_page_size, ge=1, le=settings.max_page_size)
+    after: Optional[str] = None
+
+
+class SellerStatsPage(BaseModel):
+    limit: int = Field(default=settings.default_page_size, ge=1, le=settings.max_page_size)
+    after: Optional[int] = None
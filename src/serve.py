@@ -0,0 +1,119 @@
+"""Production launcher:
+
+    python -m src.serve
+
+Worker count, event loop, HTTP parser, backlog, keep-alive and the
+graceful shutdown timeout come from Settings (SERVER_*). Before the
+workers start, the connection pool of each one is sized so that all of
+them together stay within the connections the database server accepts.
+
+On SIGTERM the supervisor passes the signal to every worker, which stops
+accepting connections and lets the requests in flight finish, for at most
+SERVER_GRACEFUL_SHUTDOWN seconds, before the lifespan shutdown flushes the
+book insert batches and closes the pool.
+
+The response cache must be shared by the workers: a write invalidates
+only the cache of the worker that handled it, so CACHE_BACKEND=memory is
+refused with more than one worker. Use redis, or none.
+"""
+import asyncio
+import logging
+import os
+from typing import NamedTuple
+
+import uvicorn
+from sqlalchemy import NullPool, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.configurations.settings import settings
+
+__all__ = [
+    "PoolSize", "size_pool", "server_max_connections", "worker_count", "check_cache_backend",
+    "uvicorn_options", "main",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSize(NamedTuple):
+    pool_size: int
+    max_overflow: int
+
+
+def size_pool(workers: int, max_connections: int, pool_size: int, max_overflow: int) -> PoolSize:
+    """Per-worker pool within `max_connections` for all the workers.
+
+    The configured pool is kept when it fits; otherwise the overflow goes
+    first, then the pool shrinks to the share of each worker.
+    """
+    budget = max_connections // workers
+    if budget < 1:
+        raise ValueError(f"{workers} workers cannot share {max_connections} database connections")
+    if pool_size + max_overflow <= budget:
+        return PoolSize(pool_size, max_overflow)
+    pool_size = min(pool_size, budget)
+    return PoolSize(pool_size, budget - pool_size)
+
+
+async def server_max_connections(url: str) -> int:
+    """Connections the server accepts from ordinary roles."""
+    engine = create_async_engine(url, poolclass=NullPool)
+    try:
+        async with engine.connect() as connection:
+            return await connection.scalar(text(
+                "SELECT current_setting('max_connections')::int"
+                " - current_setting('superuser_reserved_connections')::int"
+            ))
+    finally:
+        await engine.dispose()
+
+
+def worker_count() -> int:
+    return settings.server_workers or os.cpu_count() or 1
+
+
+def check_cache_backend(workers: int, backend: str) -> None:
+    # The other workers would serve the bodies and ETags of before a write
+    # until they expire
+    if backend == "memory" and workers > 1:
+        raise ValueError(f"CACHE_BACKEND=memory is per worker, {workers} workers need redis or none")
+
+
+def uvicorn_options(workers: int) -> dict:
+    return {
+        "host": settings.server_host,
+        "port": settings.server_port,
+        "workers": workers,
+        "loop": settings.server_loop,
+        "http": settings.server_http,
+        "backlog": settings.server_backlog,
+        "timeout_keep_alive": settings.server_keep_alive,
+        "timeout_graceful_shutdown": settings.server_graceful_shutdown,
+        "access_log": settings.server_access_log,
+    }
+
+
+def main() -> None:
+    logging.basicConfig(level=settings.log_level, format="%(levelname)s %(name)s: %(message)s")
+    workers = worker_count()
+    check_cache_backend(workers, settings.cache_backend)
+
+    max_connections = settings.db_max_connections or asyncio.run(server_max_connections(settings.database_url))
+    max_connections -= settings.db_reserved_connections
+    size = size_pool(workers, max_connections, settings.max_connection_count, settings.db_max_overflow)
+    if size != (settings.max_connection_count, settings.db_max_overflow):
+        logger.warning(
+            "Pool of %s + %s connections per worker exceeds %s connections for %s workers, using %s + %s",
+            settings.max_connection_count, settings.db_max_overflow, max_connections, workers, *size,
+        )
+    # A single worker runs in this process, several are new processes that
+    # read their settings from the environment
+    settings.max_connection_count, settings.db_max_overflow = size
+    os.environ["MAX_CONNECTION_COUNT"] = str(size.pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(size.max_overflow)
+
+    uvicorn.run("src.main:app", **uvicorn_options(workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from typing import AsyncContextManager, Callable, Optional
+
+from sqlalchemy import RowMapping, insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.configurations.database import get_async_engine
+from src.configurations.settings import settings
+from src.models.books import Book
+from src.services.changes import record_changes
+from src.services.statements import BOOK_COLUMNS
+
+__all__ = ["InsertBatcher", "get_book_batcher", "close_book_batcher"]
+
+logger = logging.getLogger(__name__)
+
+
+class InsertBatcher:
+    """Write-behind batching of single-row book inserts, per worker.
+
+    Concurrent `insert` calls are queued and written by one multi-row
+    INSERT ... RETURNING in a transaction of its own, once `batch_size`
+    rows are queued or `max_latency` seconds after the first one. Each
+    caller gets its own row back once the batch is committed.
+    """
+
+    def __init__(
+        self,
+        begin: Callable[[], AsyncContextManager[AsyncConnection]],
+        batch_size: int = settings.book_insert_batch_size,
+        max_latency: float = settings.book_insert_batch_latency,
+    ) -> None:
+        self.begin = begin
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set[asyncio.Task] = set()
+
+    async def insert(self, values: dict) -> RowMapping:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((values, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush_pending()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_latency, self._flush_pending)
+        # The row goes in with its batch even when the caller goes away
+        return await asyncio.shield(future)
+
+    async def close(self) -> None:
+        """Write the queued rows and wait for the batches in flight."""
+        self._flush_pending()
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def _flush_pending(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        try:
+            results = await self._insert([values for values, _ in batch])
+        except DBAPIError:
+            # One bad row fails the statement: the rows go one by one, so
+            # that only its caller gets the error and the others their row
+            results = [await self._insert_one(values) for values, _ in batch]
+        except Exception as error:
+            logger.error("Book insert batch of %s rows failed: %s", len(batch), error)
+            results = [error] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+                # Retrieved here, the caller may be gone
+                future.exception()
+            else:
+                future.set_result(result)
+
+    async def _insert(self, values: list[dict]) -> list[RowMapping]:
+        # RETURNING gives the rows in the order of the VALUES list
+        async with self.begin() as connection:
+            result = await connection.execute(insert(Book).values(values).returning(*BOOK_COLUMNS))
+            rows = result.mappings().all()
+            await record_changes(connection, "book", "created", [row["id"] for row in rows])
+            return rows
+
+    async def _insert_one(self, values: dict) -> RowMapping | Exception:
+        # Never raises: the rows before it are committed and reported as such
+        try:
+            return (await self._insert([values]))[0]
+        except Exception as error:
+            return error
+
+
+__book_batcher: Optional[InsertBatcher] = None
+
+
+def get_book_batcher() -> InsertBatcher:
+    global __book_batcher
+
+    if __book_batcher is None:
+        __book_batcher = InsertBatcher(lambda: get_async_engine().begin())
+    return __book_batcher
+
+
+async def close_book_batcher() -> None:
+    global __book_batcher
+
+    if __book_batcher is not None:
+        await __book_batcher.close()
+    __book_batcher = None
@@ -0,0 +1,178 @@
+from itertools import islice
+from typing import Any, Iterable, Iterator, Sequence
+
+import orjson
+from fastapi import HTTPException, Request, status
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import RowMapping, bindparam, delete, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.configurations.settings import settings
+from src.models.books import Book
+from src.models.sellers import Seller
+from src.services.statements import BOOK_COLUMNS
+from src.services.streaming import NDJSON_MEDIA_TYPE
+
+__all__ = ["read_rows", "validate_rows", "insert_books", "update_books", "delete_books"]
+
+INSERTED_BOOK_FIELDS = ("title", "author", "year", "pages", "seller_id")
+UPDATED_BOOK_FIELDS = ("title", "author", "year", "pages")
+
+books_table = Book.__table__
+# Executed once per chunk with a list of parameters (executemany)
+UPDATE_BOOK = (
+    update(books_table)
+    .where(books_table.c.id == bindparam("b_id"))
+    .values(
+        **{field: bindparam(f"b_{field}") for field in UPDATED_BOOK_FIELDS},
+        version=books_table.c.version + 1,
+    )
+)
+
+
+def chunked(items: Iterable, size: int = settings.bulk_chunk_size) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def row_error(index: int, message: str) -> dict:
+    return {"index": index, "errors": [{"type": "bulk_error", "msg": message}]}
+
+
+async def read_rows(request: Request) -> list[Any]:
+    """Parse a JSON array or an NDJSON body into a list of raw rows."""
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+            rows = [orjson.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            rows = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"Malformed body: {e}")
+
+    if not isinstance(rows, list):
+        raise HTTPException(
+            status.HTTP_422_UNPROCESSABLE_ENTITY, "Body must be a JSON array or NDJSON"
+        )
+    if len(rows) > settings.bulk_max_rows:
+        raise HTTPException(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"At most {settings.bulk_max_rows} rows per request",
+        )
+    return rows
+
+
+def validate_rows(adapter: TypeAdapter, rows: Sequence[Any]) -> tuple[list[tuple[int, Any]], list[dict]]:
+    """Validate every row on its own, so one bad row does not reject the batch."""
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, adapter.validate_python(row)))
+        except ValidationError as e:
+            errors.append(
+                {"index": index, "errors": e.errors(include_url=False, include_context=False)}
+            )
+    return valid, errors
+
+
+async def existing_ids(session: AsyncSession, column, ids: Iterable[int]) -> set[int]:
+    found = set()
+    for chunk in chunked(set(ids)):
+        found.update((await session.execute(select(column).where(column.in_(chunk)))).scalars())
+    return found
+
+
+async def insert_books(session: AsyncSession, books: list[tuple[int, Any]]) -> tuple[list[RowMapping], list[dict]]:
+    """Insert validated `IncomingBook`s with multi-row statements.
+
+    Rows referencing unknown sellers are reported instead of failing the
+    whole batch on the foreign key.
+    """
+    sellers = await existing_ids(session, Seller.id, (book.seller_id for _, book in books))
+    errors = [
+        row_error(index, f"Seller {book.seller_id} does not exist")
+        for index, book in books if book.seller_id not in sellers
+    ]
+    values = [
+        book.model_dump(include=set(INSERTED_BOOK_FIELDS))
+        for _, book in books if book.seller_id in sellers
+    ]
+    if not values:
+        return [], errors
+
+    if len(values) > settings.bulk_copy_threshold and session.get_bind().dialect.driver == "asyncpg":
+        return await copy_books(session, values), errors
+
+    created = []
+    for chunk in chunked(values):
+        result = await session.execute(insert(Book).values(chunk).returning(*BOOK_COLUMNS))
+        created.extend(result.mappings().all())
+    return created, errors
+
+
+async def copy_books(session: AsyncSession, values: list[dict]) -> list[RowMapping]:
+    # COPY cannot return generated ids, so rows are staged in a temporary
+    # table and moved with a single INSERT ... SELECT ... RETURNING
+    connection = await session.connection()
+    driver_connection = (await connection.get_raw_connection()).driver_connection
+
+    await driver_connection.execute(
+        "CREATE TEMPORARY TABLE books_bulk_stage (title text, author text, "
+        "year integer, pages integer, seller_id integer, ord integer) ON COMMIT DROP"
+    )
+    await driver_connection.copy_records_to_table(
+        "books_bulk_stage",
+        records=[
+            (*(book[field] for field in INSERTED_BOOK_FIELDS), ord)
+            for ord, book in enumerate(values)
+        ],
+        columns=[*INSERTED_BOOK_FIELDS, "ord"],
+    )
+    result = await session.execute(
+        text(
+            "INSERT INTO books_table (title, author, year, pages, seller_id) "
+            "SELECT title, author, year, pages, seller_id FROM books_bulk_stage ORDER BY ord "
+            "RETURNING title, author, year, id, pages, seller_id"
+        )
+    )
+    created = result.mappings().all()
+    await driver_connection.execute("DROP TABLE books_bulk_stage")
+    return created
+
+
+async def update_books(session: AsyncSession, books: list[tuple[int, Any]]) -> tuple[dict[int, int], list[dict]]:
+    """Update validated `ReturnedBook`s with one executemany per chunk.
+
+    Returns the seller id of every updated book by its id.
+    """
+    found = {}
+    for chunk in chunked({book.id for _, book in books}):
+        result = await session.execute(select(Book.id, Book.seller_id).where(Book.id.in_(chunk)))
+        found.update(result.tuples().all())
+    errors = [
+        row_error(index, f"Book {book.id} does not exist")
+        for index, book in books if book.id not in found
+    ]
+    values = [
+        {f"b_{field}": value for field, value in book.model_dump(include={"id", *UPDATED_BOOK_FIELDS}).items()}
+        for _, book in books if book.id in found
+    ]
+    for chunk in chunked(values):
+        await session.execute(UPDATE_BOOK, chunk)
+    return {value["b_id"]: found[value["b_id"]] for value in values}, errors
+
+
+async def delete_books(session: AsyncSession, ids: list[tuple[int, int]]) -> tuple[dict[int, int], list[dict]]:
+    """Delete books by id, returns the seller id of every deleted book by its id."""
+    deleted = {}
+    for chunk in chunked(book_id for _, book_id in ids):
+        result = await session.execute(
+            delete(Book).where(Book.id.in_(chunk)).returning(Book.id, Book.seller_id)
+        )
+        deleted.update(result.tuples().all())
+    errors = [
+        row_error(index, f"Book {book_id} does not exist")
+        for index, book_id in ids if book_id not in deleted
+    ]
+    return deleted, errors
@@ -0,0 +1,293 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextvars import ContextVar
+from time import monotonic
+from typing import Annotated, Awaitable, Callable, Iterable, NamedTuple, Optional
+
+import orjson
+from fastapi import Depends, Request
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.configurations.database import after_commit, get_read_session, read_from_replica
+from src.configurations.replicas import PRIMARY_READS_COOKIE
+from src.configurations.settings import settings
+from src.services.singleflight import SingleFlight
+
+__all__ = [
+    "CacheBackend", "NullCacheBackend", "MemoryCacheBackend", "RedisCacheBackend",
+    "CachedResponse", "ResponseCache", "get_response_cache", "get_read_cache", "params_key", "book_key", "seller_key",
+    "seller_books_tag", "BOOKS_LIST_TAG", "SELLERS_LIST_TAG",
+]
+
+# Every cached page of the book and seller lists carries one of these tags
+BOOKS_LIST_TAG = "books:list"
+SELLERS_LIST_TAG = "seller:list"
+
+
+def book_key(book_id: int) -> str:
+    return f"books:{book_id}"
+
+
+def seller_key(seller_id: int) -> str:
+    # Key of the default seller response and tag of every variant of it
+    # (field selections, pages of books); the responses embed the books
+    return f"seller:{seller_id}"
+
+
+def seller_books_tag(seller_id: int) -> str:
+    # Carried by the cached books of a seller, dropped when the seller is deleted
+    return f"seller:{seller_id}:books"
+
+
+class CacheBackend(ABC):
+    """Storage of serialized responses.
+
+    Every entry may carry tags, so that a group of keys which cannot be
+    enumerated up front (e.g. every filtered page of a list) is dropped
+    with a single call.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None: ...
+
+    @abstractmethod
+    async def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None: ...
+
+
+class NullCacheBackend(CacheBackend):
+    async def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None:
+        pass
+
+    async def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries: int = settings.cache_max_entries) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, bytes, tuple[str, ...]]] = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+
+    def _drop(self, key: str) -> None:
+        if (entry := self._entries.pop(key, None)) is None:
+            return
+        for tag in entry[2]:
+            if keys := self._tags.get(tag):
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None:
+        self._drop(key)
+        tags = tuple(tags)
+        self._entries[key] = (monotonic() + ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    async def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        for key in keys:
+            self._drop(key)
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._drop(key)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Backend for any client with the `redis.asyncio` command interface.
+
+    Tags are Redis sets of keys; they expire together with the longest
+    lived entry they point to.
+    """
+
+    def __init__(self, client, prefix: str = "cache:") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None:
+        ttl_ms = max(int(ttl * 1000), 1)
+        await self.client.set(self.prefix + key, value, px=ttl_ms)
+        for tag in tags:
+            await self.client.sadd(self.prefix + "tag:" + tag, key)
+            await self.client.pexpire(self.prefix + "tag:" + tag, ttl_ms)
+
+    async def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        keys = set(keys)
+        tag_keys = [self.prefix + "tag:" + tag for tag in tags]
+        for tag_key in tag_keys:
+            keys.update(
+                key.decode() if isinstance(key, bytes) else key
+                for key in await self.client.smembers(tag_key)
+            )
+        if keys or tag_keys:
+            await self.client.delete(*(self.prefix + key for key in keys), *tag_keys)
+
+
+def params_key(params: BaseModel) -> str:
+    """Stable key part for a query parameters model."""
+    return orjson.dumps(params.model_dump(exclude_none=True), option=orjson.OPT_SORT_KEYS).decode()
+
+
+# Invalidation count of the cache when the load running in this task started
+_load_started: ContextVar[Optional[int]] = ContextVar("load_started", default=None)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    headers: dict[str, str]
+
+
+class ResponseCache:
+    """Serialized responses together with their validator headers (ETag, Last-Modified).
+
+    Unless `fill`, the entries are read but `set` does nothing.
+
+    Every invalidation stamps its keys and tags with a new generation. A
+    load that started before the generation of its key or of one of its
+    tags read the rows before the write: its `set` is dropped, the next
+    request loads them again.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        ttl: float = settings.cache_ttl,
+        fill: bool = True,
+        flight: Optional[SingleFlight] = None,
+    ) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.fill = fill
+        self.flight = flight or SingleFlight()
+        self._generation = 0
+        # Key or tag -> generation of its last invalidation, kept while loads run
+        self._invalidated: dict[str, int] = {}
+        self._loads = 0
+
+    def without_fill(self) -> "ResponseCache":
+        """The same entries and loads in flight, never written."""
+        return ResponseCache(self.backend, self.ttl, fill=False, flight=self.flight)
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        if (value := await self.backend.get(key)) is None:
+            return None
+        headers, body = value.split(b"\n", 1)
+        return CachedResponse(body, orjson.loads(headers))
+
+    async def set(
+        self, key: str, body: bytes, tags: Iterable[str] = (), headers: Optional[dict[str, str]] = None
+    ) -> None:
+        if not self.fill or self._stale(key, tags):
+            return
+        # orjson never emits a newline, so it separates the headers from the body
+        await self.backend.set(key, orjson.dumps(headers or {}) + b"\n" + body, self.ttl, tags)
+
+    async def load(
+        self, key: str, loader: Callable[[], Awaitable[Optional[CachedResponse]]]
+    ) -> Optional[CachedResponse]:
+        """Response of `key` on a cache miss, `loader` runs once for concurrent callers.
+
+        `loader` queries the database and sets the cache entry, None stands
+        for a missing row.
+        """
+        if not settings.single_flight:
+            return await self._load(loader)
+        return await self.flight.do(key, lambda: self._load(loader))
+
+    async def _load(self, loader: Callable[[], Awaitable[Optional[CachedResponse]]]) -> Optional[CachedResponse]:
+        token = _load_started.set(self._generation)
+        self._loads += 1
+        try:
+            return await loader()
+        finally:
+            _load_started.reset(token)
+            self._loads -= 1
+            if not self._loads:
+                # Loads from now on start after every invalidation so far
+                self._invalidated.clear()
+
+    def _stale(self, key: str, tags: Iterable[str]) -> bool:
+        if (started := _load_started.get()) is None:
+            return False
+        return any(self._invalidated.get(name, -1) > started for name in (key, *tags))
+
+    async def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        keys, tags = tuple(keys), tuple(tags)
+        if self._loads:
+            self._generation += 1
+            for name in (*keys, *tags):
+                self._invalidated[name] = self._generation
+        # Loads in flight may have read the rows before the write
+        self.flight.forget()
+        await self.backend.invalidate(keys, tags)
+
+    def invalidate_on_commit(
+        self, session: AsyncSession, keys: Iterable[str] = (), tags: Iterable[str] = ()
+    ) -> None:
+        # Invalidating before the commit would let a concurrent read
+        # cache the old rows again
+        keys, tags = tuple(keys), tuple(tags)
+        after_commit(session, lambda: self.invalidate(keys, tags))
+
+
+__response_cache: Optional[ResponseCache] = None
+
+
+def create_backend() -> CacheBackend:
+    if settings.cache_backend == "memory":
+        return MemoryCacheBackend()
+    if settings.cache_backend == "redis":
+        # Optional dependency, only needed for a shared cache
+        from redis.asyncio import Redis
+
+        return RedisCacheBackend(Redis.from_url(settings.redis_url))
+    return NullCacheBackend()
+
+
+def get_response_cache() -> ResponseCache:
+    global __response_cache
+
+    if __response_cache is None:
+        __response_cache = ResponseCache(create_backend())
+    return __response_cache
+
+
+def get_read_cache(
+    request: Request,
+    session: Annotated[AsyncSession, Depends(get_read_session)],
+    cache: Annotated[ResponseCache, Depends(get_response_cache)],
+) -> ResponseCache:
+    """Cache of the read routes, filled from the primary only.
+
+    A replica may lag behind the invalidation of a write: its rows would
+    be cached for the whole TTL. A client reading its own writes skips
+    the cache, and the loads of the other clients, altogether.
+    """
+    if PRIMARY_READS_COOKIE in request.cookies:
+        return ResponseCache(NullCacheBackend(), cache.ttl)
+    if read_from_replica(session):
+        return cache.without_fill()
+    return cache
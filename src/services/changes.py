@@ -0,0 +1,234 @@
+"""Catalogue change feed.
+
+Writes add rows to changes_table in their own transaction (`record_changes`),
+so a change is published if and only if it is committed. A relay numbers
+the committed rows with a dense sequence: one worker at a time, under an
+advisory lock, and only the rows of transactions older than every
+transaction still in progress. A change numbered later can therefore
+never be committed before one already delivered, and a client resuming
+after sequence N misses nothing.
+
+Each worker has one ChangeFeed: a task woken by NOTIFY (or every
+poll interval) numbers and reads the new changes once and keeps the latest
+in memory, from where every subscriber of the worker is served. Older
+changes are read from the table.
+"""
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from time import monotonic
+from typing import AsyncContextManager, AsyncIterator, Callable, Iterable, Optional, Union
+
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from src.configurations.database import after_commit, get_async_engine
+from src.configurations.settings import settings
+from src.models.changes import Change
+
+__all__ = ["CHANGES_CHANNEL", "ChangeFeed", "record_changes", "get_change_feed", "close_change_feed"]
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY channel, signalled by the writes and by the relay
+CHANGES_CHANNEL = "catalogue_changes"
+# Key of the PostgreSQL advisory lock of the relay
+RELAY_LOCK_KEY = 0x5DA_0002
+# The relay deletes the expired changes at most this often
+PRUNE_INTERVAL = 60.0
+
+# Event fields, in this order
+CHANGE_COLUMNS = (Change.seq, Change.entity, Change.entity_id.label("id"), Change.op)
+
+
+async def record_changes(
+    executor: Union[AsyncSession, AsyncConnection], entity: str, op: str, ids: Iterable[int]
+) -> None:
+    """Publish changes of `entity` rows with the transaction of `executor`."""
+    rows = [{"entity": entity, "entity_id": entity_id, "op": op} for entity_id in ids]
+    if not rows:
+        return
+    connection = executor if isinstance(executor, AsyncConnection) else await executor.connection()
+    await connection.execute(insert(Change), rows)
+    if connection.dialect.name == "postgresql":
+        # Delivered to the feed of every worker on commit, once per transaction
+        await connection.execute(select(func.pg_notify(CHANGES_CHANNEL, "")))
+    elif isinstance(executor, AsyncSession):
+        after_commit(executor, get_change_feed().notify)
+
+
+class ChangeFeed:
+    def __init__(
+        self,
+        begin: Callable[[], AsyncContextManager[AsyncConnection]],
+        buffer_size: int = settings.change_feed_buffer,
+        poll_interval: float = settings.change_feed_poll_interval,
+        retention: float = settings.change_feed_retention_hours * 3600,
+    ) -> None:
+        self.begin = begin
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self.retention = retention
+        # Every change numbered after `_complete_after`, up to `_last_seq`
+        self._changes: deque[dict] = deque()
+        self._complete_after = 0
+        self._last_seq = 0
+        self._new_changes = asyncio.Condition()
+        self._wake = asyncio.Event()
+        self._pruned_at = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+        self._listener: Optional[AsyncConnection] = None
+
+    async def open(self) -> None:
+        """Start from the latest change, older ones are read from the table."""
+        async with self.begin() as connection:
+            last_seq = await connection.scalar(select(func.coalesce(func.max(Change.seq), 0)))
+        self._changes.clear()
+        self._complete_after = self._last_seq = last_seq
+
+    async def start(self, engine: AsyncEngine) -> None:
+        await self.open()
+        if engine.dialect.driver == "asyncpg":
+            # One connection of the pool stays on LISTEN
+            self._listener = await engine.connect()
+            raw = await self._listener.get_raw_connection()
+            await raw.driver_connection.add_listener(CHANGES_CHANNEL, self._on_notify)
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+
+    async def notify(self) -> None:
+        self._wake.set()
+
+    def _on_notify(self, *args) -> None:
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("Change feed refresh failed: %s", e)
+
+    async def refresh(self) -> None:
+        """Number the committed changes, then read the new ones into the buffer."""
+        await self.relay()
+        await self.fetch()
+
+    async def relay(self) -> int:
+        """Number the changes whose transactions are all finished, returns how many."""
+        async with self.begin() as connection:
+            postgresql = connection.dialect.name == "postgresql"
+            if postgresql and not await connection.scalar(select(func.pg_try_advisory_xact_lock(RELAY_LOCK_KEY))):
+                # Another worker is numbering them
+                return 0
+            if monotonic() - self._pruned_at > PRUNE_INTERVAL:
+                self._pruned_at = monotonic()
+                expired = datetime.now(timezone.utc) - timedelta(seconds=self.retention)
+                await connection.execute(delete(Change).where(Change.created_at < expired))
+
+            last_seq = await connection.scalar(select(func.coalesce(func.max(Change.seq), 0)))
+            pending = select(
+                Change.id, (last_seq + func.row_number().over(order_by=(Change.txid, Change.id))).label("seq")
+            ).where(Change.seq.is_(None))
+            if postgresql:
+                # Older than every transaction in progress: committed, or never
+                # will be. The relay's own transaction counts as finished, for
+                # a relay run after the writes of the same transaction
+                pending = pending.where(or_(
+                    Change.txid < func.txid_snapshot_xmin(func.txid_current_snapshot()),
+                    Change.txid == func.txid_current_if_assigned(),
+                ))
+            pending = pending.subquery()
+            result = await connection.execute(
+                update(Change).where(Change.id == pending.c.id).values(seq=pending.c.seq)
+            )
+            if result.rowcount and postgresql:
+                await connection.execute(select(func.pg_notify(CHANGES_CHANNEL, "")))
+            return result.rowcount
+
+    async def fetch(self) -> None:
+        while rows := await self.read(self._last_seq):
+            self._changes.extend(rows)
+            self._last_seq = rows[-1]["seq"]
+            while len(self._changes) > self.buffer_size:
+                self._complete_after = self._changes.popleft()["seq"]
+            async with self._new_changes:
+                self._new_changes.notify_all()
+            if len(rows) < self.buffer_size:
+                break
+
+    async def read(self, after: int) -> list[dict]:
+        async with self.begin() as connection:
+            result = await connection.execute(
+                select(*CHANGE_COLUMNS).where(Change.seq > after).order_by(Change.seq).limit(self.buffer_size)
+            )
+            return [dict(row) for row in result.mappings()]
+
+    async def retains(self, after: Optional[int]) -> bool:
+        """Whether every change after `after` is still kept."""
+        if after is None or after >= self._complete_after:
+            return True
+        async with self.begin() as connection:
+            first_seq = await connection.scalar(select(func.min(Change.seq)))
+        return first_seq is None or after >= first_seq - 1
+
+    async def subscribe(self, after: Optional[int] = None, timeout: Optional[float] = None) -> AsyncIterator[list[dict]]:
+        """Batches of the changes numbered after `after`, or from now, in order.
+
+        An empty batch is yielded after `timeout` seconds without changes.
+        """
+        if after is None:
+            after = self._last_seq
+        while True:
+            if after < self._complete_after:
+                batch = await self.read(after)
+            else:
+                # Sequence numbers are dense: the buffer is indexed by them
+                batch = list(islice(self._changes, after - self._complete_after, None))
+            if batch:
+                after = batch[-1]["seq"]
+                yield batch
+            elif not await self._wait(after, timeout):
+                yield []
+
+    async def _wait(self, after: int, timeout: Optional[float]) -> bool:
+        async with self._new_changes:
+            try:
+                await asyncio.wait_for(self._new_changes.wait_for(lambda: self._last_seq > after), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+
+__change_feed: Optional[ChangeFeed] = None
+
+
+def get_change_feed() -> ChangeFeed:
+    global __change_feed
+
+    if __change_feed is None:
+        __change_feed = ChangeFeed(lambda: get_async_engine().begin())
+    return __change_feed
+
+
+async def close_change_feed() -> None:
+    global __change_feed
+
+    if __change_feed is not None:
+        await __change_feed.close()
+    __change_feed = None
@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+__all__ = [
+    "make_etag", "validator_headers", "etag_matches", "etag_versions", "json_response", "not_modified",
+]
+
+
+def make_etag(*parts) -> str:
+    return '"' + ".".join(str(part) for part in parts) + '"'
+
+
+def http_date(moment: datetime) -> str:
+    if moment.tzinfo is None:
+        # SQLite drops the time zone, the database clock is in UTC
+        moment = moment.replace(tzinfo=timezone.utc)
+    return format_datetime(moment.astimezone(timezone.utc), usegmt=True)
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime]) -> dict[str, str]:
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """Match `etag` against an If-None-Match (weak) or If-Match (strong) header."""
+    if header is None:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            if not weak:
+                continue
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def etag_versions(header: str) -> Optional[list[int]]:
+    """Row versions named by the strong ETags of an If-Match header, None for `*`.
+
+    Lets the If-Match check be a condition of the UPDATE itself.
+    """
+    versions = []
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return None
+        if candidate.startswith('"') and candidate.endswith('"') and candidate[1:-1].isdigit():
+            versions.append(int(candidate[1:-1]))
+    return versions
+
+
+def not_modified(headers: dict[str, str]) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def json_response(request: Request, body: bytes, headers: Optional[dict[str, str]] = None) -> Response:
+    """Response for serialized `body`, or 304 when the client already holds it."""
+    if headers and etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return not_modified(headers)
+    return Response(body, media_type="application/json", headers=headers)
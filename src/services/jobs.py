@@ -0,0 +1,233 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncContextManager, Awaitable, Callable, Optional
+
+from fastapi import Request, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import RowMapping, and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from src.configurations.database import after_commit, get_async_engine
+from src.configurations.settings import settings
+from src.models.books import Book
+from src.models.jobs import Job
+from src.models.sellers import Seller
+from src.schemas import IncomingBook, ReturnedJob
+from src.services import bulk
+from src.services.cache import (
+    BOOKS_LIST_TAG, SELLERS_LIST_TAG, ResponseCache, get_response_cache, seller_books_tag, seller_key,
+)
+from src.services.changes import record_changes
+
+__all__ = [
+    "JobRunner", "JOB_HANDLERS", "get_job_runner", "close_job_runner", "respond_async", "job_accepted",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobRunner:
+    """Runs background jobs in this worker, `concurrency` at a time.
+
+    A job is a row of jobs_table inserted by `submit` in the transaction of
+    the request, and started once that transaction is committed. Handlers
+    work in chunks, each in a transaction of its own that also records the
+    progress, so that a job resumed after a restart continues where it
+    stopped. Jobs hold at most `concurrency` pooled connections, the
+    interactive routes keep the rest of the pool.
+    """
+
+    def __init__(
+        self,
+        begin: Callable[[], AsyncContextManager[AsyncConnection]],
+        cache: ResponseCache,
+        concurrency: int = settings.job_concurrency,
+        chunk_size: int = settings.job_chunk_size,
+        lease: float = settings.job_lease_seconds,
+    ) -> None:
+        self.begin = begin
+        self.cache = cache
+        self.chunk_size = chunk_size
+        self.lease = lease
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, session: AsyncSession, kind: str, params: dict[str, Any], total: Optional[int] = None) -> Job:
+        job = Job(kind=kind, params=params, total=total)
+        session.add(job)
+        await session.flush()
+        job_id = job.id
+        after_commit(session, lambda: self.start(job_id))
+        return job
+
+    async def start(self, job_id: int) -> None:
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def resume(self) -> None:
+        """Start the queued jobs and the running ones that lost their worker."""
+        async with self.begin() as connection:
+            job_ids = (await connection.scalars(
+                select(Job.id).where(self._claimable()).order_by(Job.id)
+            )).all()
+        for job_id in job_ids:
+            await self.start(job_id)
+
+    async def wait(self) -> None:
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Stop the running jobs, the next worker to start resumes them."""
+        for task in self._tasks:
+            task.cancel()
+        await self.wait()
+
+    async def progress(
+        self, connection: AsyncConnection, job_id: int, done: int, result: Optional[dict[str, Any]] = None
+    ) -> None:
+        """Record the progress in the transaction of the chunk of work it counts."""
+        values = {"done": done, "heartbeat_at": utcnow()}
+        if result is not None:
+            values["result"] = result
+        await connection.execute(update(Job).where(Job.id == job_id).values(values))
+
+    def _claimable(self):
+        lost = utcnow() - timedelta(seconds=self.lease)
+        return or_(Job.status == "queued", and_(Job.status == "running", Job.heartbeat_at < lost))
+
+    async def _claim(self, job_id: int) -> Optional[RowMapping]:
+        # A single statement, one worker wins a job that several try to resume
+        now = utcnow()
+        async with self.begin() as connection:
+            result = await connection.execute(
+                update(Job)
+                .where(Job.id == job_id, self._claimable())
+                .values(status="running", started_at=now, heartbeat_at=now)
+                .returning(Job.id, Job.kind, Job.params, Job.done, Job.result)
+            )
+            return result.mappings().first()
+
+    async def _finish(self, job_id: int, status: str, **values) -> None:
+        finished_at = utcnow() if status != "queued" else None
+        async with self.begin() as connection:
+            await connection.execute(
+                update(Job).where(Job.id == job_id).values(status=status, finished_at=finished_at, **values)
+            )
+
+    async def _run(self, job_id: int) -> None:
+        async with self._slots:
+            if (job := await self._claim(job_id)) is None:
+                # Done, or taken by another worker
+                return
+            try:
+                result = await JOB_HANDLERS[job.kind](self, job)
+            except asyncio.CancelledError:
+                # Shutdown: back in the queue without waiting for the lease
+                await self._finish(job_id, "queued")
+                raise
+            except Exception as error:
+                logger.exception("Job %s (%s) failed", job_id, job.kind)
+                await self._finish(job_id, "failed", error=str(error))
+            else:
+                await self._finish(job_id, "succeeded", result=result)
+
+
+async def delete_seller(runner: JobRunner, job: RowMapping) -> dict[str, Any]:
+    """Delete the seller's books a chunk at a time, then the seller.
+
+    The cascade would delete them all in one statement, holding the locks
+    and firing the statistics triggers over the whole catalogue at once.
+    """
+    seller_id = job.params["seller_id"]
+    deleted = job.done
+    while True:
+        async with runner.begin() as connection:
+            chunk = (
+                select(Book.id).where(Book.seller_id == seller_id).order_by(Book.id).limit(runner.chunk_size)
+            )
+            result = await connection.execute(delete(Book).where(Book.id.in_(chunk.scalar_subquery())))
+            deleted += result.rowcount
+            last = result.rowcount < runner.chunk_size
+            if last:
+                await connection.execute(delete(Seller).where(Seller.id == seller_id))
+                await record_changes(connection, "seller", "deleted", [seller_id])
+            await runner.progress(connection, job.id, deleted)
+        # After every commit, so that the books deleted so far are not served
+        # from the cache while the next chunks are
+        tags = [seller_key(seller_id), BOOKS_LIST_TAG, seller_books_tag(seller_id)]
+        if last:
+            tags.append(SELLERS_LIST_TAG)
+        await runner.cache.invalidate(tags=tags)
+        if last:
+            break
+    return {"deleted_books": deleted}
+
+
+async def import_books(runner: JobRunner, job: RowMapping) -> dict[str, Any]:
+    """Insert the validated rows of a bulk request, a chunk per transaction."""
+    rows = job.params["books"]
+    result = job.result or {"created": 0, "errors": job.params["errors"]}
+    for start in range(job.done, len(rows), runner.chunk_size):
+        books = [(index, IncomingBook.model_validate(values)) for index, values in rows[start:start + runner.chunk_size]]
+        async with runner.begin() as connection:
+            # Joins the transaction of the connection, which commits it
+            session = AsyncSession(bind=connection)
+            created, errors = await bulk.insert_books(session, books)
+            await session.close()
+            await record_changes(connection, "book", "created", [book["id"] for book in created])
+            result = {"created": result["created"] + len(created), "errors": result["errors"] + errors}
+            await runner.progress(connection, job.id, start + len(books), result)
+        await runner.cache.invalidate(
+            tags={seller_key(book["seller_id"]) for book in created} | {BOOKS_LIST_TAG}
+        )
+    result["errors"].sort(key=lambda e: e["index"])
+    return result
+
+
+# Job kind -> its handler, which returns the result of the job
+JOB_HANDLERS: dict[str, Callable[[JobRunner, RowMapping], Awaitable[dict[str, Any]]]] = {
+    "delete_seller": delete_seller,
+    "import_books": import_books,
+}
+
+
+def respond_async(request: Request) -> bool:
+    # RFC 7240: the client asks for 202 and a job instead of waiting
+    return "respond-async" in request.headers.get("prefer", "").lower()
+
+
+def job_accepted(request: Request, job: Job) -> ORJSONResponse:
+    """202 Accepted with the job, its progress at the Location."""
+    return ORJSONResponse(
+        ReturnedJob.model_validate(job, from_attributes=True).model_dump(mode="json"),
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={
+            "Location": str(request.url_for("get_job", job_id=job.id)),
+            "Preference-Applied": "respond-async",
+        },
+    )
+
+
+__job_runner: Optional[JobRunner] = None
+
+
+def get_job_runner() -> JobRunner:
+    global __job_runner
+
+    if __job_runner is None:
+        __job_runner = JobRunner(lambda: get_async_engine().begin(), get_response_cache())
+    return __job_runner
+
+
+async def close_job_runner() -> None:
+    global __job_runner
+
+    if __job_runner is not None:
+        await __job_runner.close()
+    __job_runner = None
@@ -0,0 +1,232 @@
+import logging
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine.default import CacheStats
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.configurations.settings import settings
+
+__all__ = [
+    "Histogram", "MetricsRegistry", "RequestMetrics", "MetricsMiddleware", "PROMETHEUS_MEDIA_TYPE",
+    "registry", "instrument_engine", "uninstrument_engine", "timed",
+]
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Lookups of the statement in the engine's compiled cache; DDL, driver SQL
+# and the statements that cannot be cached are "uncached"
+CACHE_RESULTS = {CacheStats.CACHE_HIT: "hit", CacheStats.CACHE_MISS: "miss"}
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Prometheus histogram with one series per combination of label values."""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...], buckets: tuple[float, ...]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # Label values -> (count per bucket, with +Inf last; sum)
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, labels: tuple[str, ...], value: float) -> None:
+        if (series := self._series.get(labels)) is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{format_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labels, labels)} {total[0]}"
+            yield f"{self.name}_count{format_labels(self.labels, labels)} {cumulative}"
+
+
+class MetricsRegistry:
+    """Request and database metrics of this worker process."""
+
+    def __init__(self) -> None:
+        labels = ("method", "route")
+        self.request_seconds = Histogram(
+            "http_request_duration_seconds", "Time until the last byte of the response.",
+            (*labels, "status"), SECONDS_BUCKETS,
+        )
+        self.db_seconds = Histogram(
+            "http_request_db_seconds", "Time spent in database statements per request.", labels, SECONDS_BUCKETS,
+        )
+        self.db_queries = Histogram(
+            "http_request_db_queries", "Database statements per request.", labels, QUERIES_BUCKETS,
+        )
+        self.serialize_seconds = Histogram(
+            "http_request_serialize_seconds", "Time spent validating and serializing the response body.",
+            labels, SECONDS_BUCKETS,
+        )
+        self.n_plus_one: Counter[tuple[str, ...]] = Counter()
+        self.queries_total = 0
+        self.statement_cache: Counter[str] = Counter()
+
+    def observe(self, method: str, route: str, status: int, seconds: float, request: "RequestMetrics") -> None:
+        labels = (method, route)
+        self.request_seconds.observe((*labels, str(status)), seconds)
+        self.db_seconds.observe(labels, request.db_seconds)
+        self.db_queries.observe(labels, request.queries)
+        if "serialize" in request.timings:
+            self.serialize_seconds.observe(labels, request.timings["serialize"])
+        for statement, count in request.statements.items():
+            if count >= settings.n_plus_one_threshold:
+                self.n_plus_one[labels] += 1
+                logger.warning("Possible N+1 on %s %s: %d x %s", method, route, count, statement)
+
+    def render(self, pool_status: Optional[dict] = None) -> str:
+        lines = []
+        for histogram in (self.request_seconds, self.db_seconds, self.db_queries, self.serialize_seconds):
+            lines.extend(histogram.render())
+
+        lines.append("# HELP http_request_n_plus_one_total Requests that repeated one statement too often.")
+        lines.append("# TYPE http_request_n_plus_one_total counter")
+        for labels, count in self.n_plus_one.items():
+            lines.append(f"http_request_n_plus_one_total{format_labels(('method', 'route'), labels)} {count}")
+
+        lines.append("# HELP db_queries_total Database statements run by this worker.")
+        lines.append("# TYPE db_queries_total counter")
+        lines.append(f"db_queries_total {self.queries_total}")
+
+        lines.append("# HELP db_statement_cache_total Statements by their compiled cache lookup.")
+        lines.append("# TYPE db_statement_cache_total counter")
+        for result, count in self.statement_cache.items():
+            lines.append(f'db_statement_cache_total{{result="{result}"}} {count}')
+
+        for name, value in (pool_status or {}).items():
+            lines.append(f"# TYPE db_pool_{name} gauge")
+            lines.append(f"db_pool_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetrics:
+    __slots__ = ("queries", "db_seconds", "statements", "timings")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: Counter[str] = Counter()
+        self.timings: dict[str, float] = {}
+
+    def server_timing(self, total: float) -> str:
+        parts = [f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries"']
+        parts.extend(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.timings.items())
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Add the time spent in the block to the `name` timing of the current request."""
+    if (request := _current.get()) is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        request.timings[name] = request.timings.get(name, 0.0) + perf_counter() - start
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info["query_start"] = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = perf_counter() - conn.info["query_start"]
+    registry.queries_total += 1
+    registry.statement_cache[CACHE_RESULTS.get(getattr(context, "cache_hit", None), "uncached")] += 1
+    if (request := _current.get()) is not None:
+        request.queries += 1
+        request.db_seconds += elapsed
+        request.statements[statement] += 1
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def uninstrument_engine(engine: AsyncEngine) -> None:
+    event.remove(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.remove(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """Times every HTTP request, adds a Server-Timing header and feeds `registry`.
+
+    The route label is the path template (e.g. /api/v1/books/{book_id}),
+    so the number of series stays bounded.
+    """
+
+    def __init__(self, app, metrics: MetricsRegistry = registry) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestMetrics()
+        token = _current.set(request)
+        start = perf_counter()
+        status = 500
+
+        async def send_with_timing(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = request.server_timing(perf_counter() - start).encode()
+                message["headers"] = [*message.get("headers", ()), (b"server-timing", timing)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            self.metrics.observe(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status,
+                perf_counter() - start,
+                request,
+            )
@@ -0,0 +1,203 @@
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from math import ceil
+from time import monotonic
+from typing import Optional
+
+from starlette.responses import JSONResponse
+from starlette.routing import Match, Router
+
+from src.configurations.settings import settings
+
+__all__ = [
+    "TokenBucketStore", "MemoryTokenBucketStore", "RedisTokenBucketStore", "AdmissionMiddleware",
+    "create_store", "gcra", "GCRA_SCRIPT",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def gcra(tat: Optional[float], now: float, rate: float, burst: int) -> tuple[Optional[float], float]:
+    """Take a token from a bucket of `burst` tokens refilled at `rate` per second.
+
+    Generic cell rate algorithm: the bucket is a single timestamp, `tat`,
+    when it is full again (None for a full bucket). Returns the new `tat`,
+    None when there was no token, and the seconds until there is one.
+    """
+    interval = 1 / rate
+    new_tat = max(tat or now, now) + interval
+    allow_at = new_tat - burst * interval
+    if now < allow_at:
+        return None, allow_at - now
+    return new_tat, 0.0
+
+
+class TokenBucketStore(ABC):
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take a token of bucket `key`: 0 when there was one, else the seconds until there is."""
+
+
+class MemoryTokenBucketStore(TokenBucketStore):
+    """Buckets of this worker process, the least recently used go first."""
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self.max_keys = max_keys
+        self._tats: OrderedDict[str, float] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        new_tat, retry_after = gcra(self._tats.get(key), monotonic(), rate, burst)
+        if new_tat is not None:
+            self._tats[key] = new_tat
+            self._tats.move_to_end(key)
+            if len(self._tats) > self.max_keys:
+                self._tats.popitem(last=False)
+        return retry_after
+
+
+# gcra() on the Redis server: atomic for every worker, on the clock of the
+# server. The timestamp expires when the bucket is full again.
+GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local interval = 1 / tonumber(ARGV[1])
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+local new_tat = math.max(tat, now) + interval
+local allow_at = new_tat - tonumber(ARGV[2]) * interval
+if now < allow_at then
+    return tostring(allow_at - now)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+
+class RedisTokenBucketStore(TokenBucketStore):
+    """Buckets shared by the workers, for any client with the `redis.asyncio` command interface."""
+
+    def __init__(self, client, prefix: str = "ratelimit:") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        # Lua numbers are truncated to integers in replies, seconds come as a string
+        return float(await self.client.eval(GCRA_SCRIPT, 1, self.prefix + key, rate, burst))
+
+
+def create_store() -> TokenBucketStore:
+    if settings.rate_limit_store == "redis":
+        # Optional dependency, only needed for buckets shared by the workers
+        from redis.asyncio import Redis
+
+        return RedisTokenBucketStore(Redis.from_url(settings.redis_url))
+    return MemoryTokenBucketStore()
+
+
+# Responses that stay open as long as their client, without a pool
+# connection: a few followers would otherwise fill the in-flight cap
+LONG_LIVED_ROUTES = frozenset({"GET /api/v1/changes/stream"})
+
+
+class AdmissionMiddleware:
+    """Sheds excess load before it reaches the routes and the connection pool.
+
+    A request is refused at once with 503 when `max_in_flight` requests of
+    this worker are in progress, and with 429 when the token bucket of its
+    client, or of its client on its route, is empty. Both carry Retry-After.
+    Only the API is limited: /metrics, /system and the docs stay reachable.
+    The `long_lived_routes` and WebSockets take tokens but are not counted
+    in flight.
+    """
+
+    def __init__(
+        self,
+        app,
+        router: Router,
+        store: Optional[TokenBucketStore] = None,
+        rate: float = settings.rate_limit_rate,
+        burst: int = settings.rate_limit_burst,
+        routes: dict[str, tuple[float, int]] = settings.rate_limit_routes,
+        max_in_flight: int = settings.max_in_flight,
+        client_header: Optional[str] = settings.rate_limit_client_header,
+        trusted_hops: int = settings.rate_limit_trusted_hops,
+        long_lived_routes: frozenset[str] = LONG_LIVED_ROUTES,
+    ) -> None:
+        self.app = app
+        self.router = router
+        self.store = store or create_store()
+        self.rate = rate
+        self.burst = burst
+        self.routes = routes
+        # Requests beyond what the pool serves at once would only wait for it
+        self.max_in_flight = max_in_flight or 2 * (settings.max_connection_count + settings.db_max_overflow)
+        self.client_header = client_header.lower().encode() if client_header else None
+        self.trusted_hops = trusted_hops
+        self.long_lived_routes = long_lived_routes
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        route = f"{scope['method']} {self.route_of(scope)}"
+        counted = route not in self.long_lived_routes
+        if counted and self.in_flight >= self.max_in_flight:
+            await self.refuse(scope, receive, send, 503, 1.0)
+            return
+
+        self.in_flight += counted
+        try:
+            if retry_after := await self.take_tokens(scope, route):
+                await self.refuse(scope, receive, send, 429, retry_after)
+                return
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= counted
+
+    async def take_tokens(self, scope, route: str) -> float:
+        client = self.client_of(scope)
+        buckets = [(client, self.rate, self.burst)]
+        if route in self.routes:
+            # The tighter bucket first: a request it refuses spends no token
+            # of the client's other routes
+            buckets.insert(0, (f"{client}:{route}", *self.routes[route]))
+        try:
+            for key, rate, burst in buckets:
+                if retry_after := await self.store.take(key, rate, burst):
+                    return retry_after
+        except Exception as e:
+            # A store that is down must not take the API down with it
+            logger.warning("Rate limit store failed, request admitted: %s", e)
+        return 0.0
+
+    def client_of(self, scope) -> str:
+        if self.client_header is not None:
+            # Repeated headers are one list, in order
+            entries = [
+                entry.strip()
+                for name, value in scope["headers"] if name == self.client_header
+                for entry in value.decode("latin-1").split(",")
+            ]
+            # Fewer entries than proxies: the request did not come through them
+            if len(entries) >= self.trusted_hops:
+                return entries[-self.trusted_hops]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def route_of(self, scope) -> Optional[str]:
+        # Path template, so a client's requests to /books/1 and /books/2 share a bucket
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return None
+
+    @staticmethod
+    async def refuse(scope, receive, send, status_code: int, retry_after: float) -> None:
+        detail = "Too many requests" if status_code == 429 else "Server busy"
+        response = JSONResponse(
+            {"detail": detail}, status_code=status_code, headers={"Retry-After": str(max(1, ceil(retry_after)))}
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,66 @@
+import re
+from typing import Optional
+
+from sqlalchemy import ColumnElement, Select, func, literal, select
+
+from src.models.books import Book, search_document
+
+__all__ = ["to_tsquery_text", "search_books"]
+
+# Short fields: highlight the whole title or author, not a fragment of it
+HEADLINE_OPTIONS = "HighlightAll=true, StartSel=<b>, StopSel=</b>"
+# The highlights are HTML: the text is escaped before the <b> are added, so
+# a title cannot carry markup of its own. & goes first, so that the
+# entities of the others are not escaped again
+HTML_ENTITIES = (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;"), ("'", "&#39;"))
+
+
+def html_escape(text: ColumnElement) -> ColumnElement:
+    for char, entity in HTML_ENTITIES:
+        text = func.replace(text, char, entity)
+    return text
+
+
+def to_tsquery_text(q: str) -> Optional[str]:
+    """tsquery matching every word of `q` as a prefix, None when `q` has no words.
+
+    Only word characters are kept, so user input cannot inject tsquery
+    operators.
+    """
+    words = re.findall(r"\w+", q.lower())
+    return " & ".join(f"{word}:*" for word in words) if words else None
+
+
+def search_books(terms: str, limit: int, offset: int) -> Select:
+    """Books matching the tsquery `terms`, best ranked first.
+
+    The GIN index finds and the inner query ranks the matches; the
+    highlights are computed for the returned page only.
+    """
+    config = literal("simple", literal_execute=True)
+    query = func.to_tsquery(config, terms)
+    rank = func.ts_rank(search_document, query).label("rank")
+    page = (
+        select(Book.id, rank)
+        .where(search_document.bool_op("@@")(query))
+        .order_by(rank.desc(), Book.id)
+        .limit(limit)
+        .offset(offset)
+        .subquery()
+    )
+    # Columns are listed in the field order of BookSearchHit
+    return (
+        select(
+            Book.title,
+            Book.author,
+            Book.year,
+            Book.id,
+            Book.pages,
+            Book.seller_id,
+            page.c.rank,
+            func.ts_headline(config, html_escape(Book.title), query, HEADLINE_OPTIONS).label("title_highlight"),
+            func.ts_headline(config, html_escape(Book.author), query, HEADLINE_OPTIONS).label("author_highlight"),
+        )
+        .join(page, Book.id == page.c.id)
+        .order_by(page.c.rank.desc(), Book.id)
+    )
@@ -0,0 +1,60 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from src.configurations.settings import settings
+
+__all__ = ["hash_password", "verify_password"]
+
+SALT_SIZE = 16
+KEY_SIZE = 32
+
+# scrypt releases the GIL, so hashes run in parallel without blocking the event loop
+_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers, thread_name_prefix="password-hash"
+)
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * r * (n + p + 2), dklen=KEY_SIZE,
+    )
+
+
+def hash_password_sync(
+    password: str,
+    n: int = settings.password_hash_n,
+    r: int = settings.password_hash_r,
+    p: int = settings.password_hash_p,
+) -> str:
+    """Hash as `scrypt$n$r$p$salt$key`, the cost is stored with the hash."""
+    salt = os.urandom(SALT_SIZE)
+    key = _scrypt(password, salt, n, r, p)
+    return "$".join(
+        ["scrypt", str(n), str(r), str(p), base64.b64encode(salt).decode(), base64.b64encode(key).decode()]
+    )
+
+
+def verify_password_sync(password: str, hashed: str) -> bool:
+    try:
+        algorithm, n, r, p, salt, key = hashed.split("$")
+    except ValueError:
+        return False
+    if algorithm != "scrypt":
+        return False
+    expected = base64.b64decode(key)
+    return hmac.compare_digest(_scrypt(password, base64.b64decode(salt), int(n), int(r), int(p)), expected)
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, hash_password_sync, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor, verify_password_sync, password, hashed
+    )
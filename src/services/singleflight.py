@@ -0,0 +1,61 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+__all__ = ["SingleFlight"]
+
+
+class Abandoned(Exception):
+    """The caller running the call was cancelled before the result landed."""
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one, per worker.
+
+    The first caller runs the call, callers arriving while it is in flight
+    wait for its result. The key is released as soon as the result lands,
+    so later callers run the call again and never get a result older than
+    their request.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[str, asyncio.Future] = {}
+        # Callers served by the call of another one
+        self.coalesced = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        while (future := self._calls.get(key)) is not None:
+            try:
+                # Shielded: a cancelled waiter must not cancel the shared result
+                result = await asyncio.shield(future)
+            except Abandoned:
+                # Run by a request that went away, the next waiter takes over
+                continue
+            self.coalesced += 1
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            self._fail(future, Abandoned())
+            raise
+        except Exception as error:
+            self._fail(future, error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def forget(self) -> None:
+        """Detach the calls in flight, callers from now on run their own."""
+        self._calls.clear()
+
+    @staticmethod
+    def _fail(future: asyncio.Future, error: BaseException) -> None:
+        future.set_exception(error)
+        # Retrieved here, so a call without waiters logs no warning
+        future.exception()
@@ -0,0 +1,137 @@
+"""The fixed queries of the v1 read routes, as lambda statements.
+
+A lambda statement is analyzed once per code location: later calls skip
+building the select() and computing its cache key, they only pick up the
+new bound values, and the compiled SQL comes from the engine's compiled
+cache. The SQL string is the same on every request, so asyncpg reuses the
+statement it prepared on the pooled connection.
+
+Optional parts are added with `+=`, each combination is cached on its own.
+Closure variables holding columns, e.g. the selected seller fields, are
+part of the cache key; the others become bound parameters.
+"""
+from typing import Optional, Sequence
+
+from sqlalchemy import ColumnElement, StatementLambdaElement, func, lambda_stmt, select
+from sqlalchemy.orm import load_only
+
+from src.models.books import Book
+from src.models.sellers import Seller
+from src.schemas import BookFilters, SellerFilters
+
+__all__ = [
+    "BOOK_COLUMNS", "BOOK_FIELDS", "RETURNED_SELLER_COLUMNS", "SELLER_BOOK_COLUMNS",
+    "book_row", "book_versions", "book_rows", "books_page", "books_export",
+    "seller_row", "seller_versions", "seller_books_page", "seller_rows", "sellers_page", "sellers_export",
+]
+
+# Columns in the field order of ReturnedBook, for the rows serialized without the ORM
+BOOK_COLUMNS = (Book.title, Book.author, Book.year, Book.id, Book.pages, Book.seller_id)
+BOOK_FIELDS = tuple(column.key for column in BOOK_COLUMNS)
+# Columns in the field order of ReturnedSeller and ReturnedBookLinkedToSeller
+RETURNED_SELLER_COLUMNS = (Seller.first_name, Seller.last_name, Seller.e_mail, Seller.id)
+SELLER_BOOK_COLUMNS = (Book.title, Book.author, Book.year, Book.id, Book.pages.label("count_pages"))
+
+
+def keyset_page(
+    statement: StatementLambdaElement, id_column: ColumnElement, after: Optional[int], limit: int
+) -> StatementLambdaElement:
+    if after is not None:
+        statement += lambda s: s.where(id_column > after)
+    # One extra row tells whether there is a next page
+    statement += lambda s: s.order_by(id_column).limit(limit + 1)
+    return statement
+
+
+def book_row(book_id: int) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(*BOOK_COLUMNS, Book.version, Book.updated_at).where(Book.id == book_id))
+
+
+def book_versions(book_id: int) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(Book.version, Book.updated_at).where(Book.id == book_id))
+
+
+def book_rows(filters: BookFilters, fast: bool = True) -> StatementLambdaElement:
+    """Books matching `filters`, as column tuples or, unless `fast`, as ORM instances."""
+    statement = lambda_stmt(lambda: select(*BOOK_COLUMNS)) if fast else lambda_stmt(lambda: select(Book))
+    if (author := filters.author) is not None:
+        statement += lambda s: s.where(Book.author == author)
+    if (seller_id := filters.seller_id) is not None:
+        statement += lambda s: s.where(Book.seller_id == seller_id)
+    if (year_from := filters.year_from) is not None:
+        statement += lambda s: s.where(Book.year >= year_from)
+    if (year_to := filters.year_to) is not None:
+        statement += lambda s: s.where(Book.year <= year_to)
+    return statement
+
+
+def books_page(filters: BookFilters, after: Optional[int], limit: int, fast: bool) -> StatementLambdaElement:
+    return keyset_page(book_rows(filters, fast), Book.id, after, limit)
+
+
+def seller_row(seller_id: int, columns: Sequence[ColumnElement], with_books: bool) -> StatementLambdaElement:
+    """The seller with only `columns` loaded, and the validators of its books."""
+    columns = tuple(columns)
+    if with_books:
+        # Scalar subqueries, answered from the seller's index entries
+        return lambda_stmt(lambda: select(
+            Seller,
+            select(func.count(Book.id)).where(Book.seller_id == seller_id).scalar_subquery(),
+            select(func.max(Book.updated_at)).where(Book.seller_id == seller_id).scalar_subquery(),
+        ).options(load_only(Seller.version, Seller.updated_at, *columns)).where(Seller.id == seller_id))
+    return lambda_stmt(
+        lambda: select(Seller).options(load_only(Seller.version, Seller.updated_at, *columns)).where(
+            Seller.id == seller_id
+        )
+    )
+
+
+def seller_versions(seller_id: int, with_books: bool) -> StatementLambdaElement:
+    if with_books:
+        return lambda_stmt(lambda: select(
+            Seller.version,
+            Seller.updated_at,
+            select(func.count(Book.id)).where(Book.seller_id == seller_id).scalar_subquery(),
+            select(func.max(Book.updated_at)).where(Book.seller_id == seller_id).scalar_subquery(),
+        ).where(Seller.id == seller_id))
+    return lambda_stmt(lambda: select(Seller.version, Seller.updated_at).where(Seller.id == seller_id))
+
+
+def seller_books_page(seller_id: int, after: Optional[int], limit: int, fast: bool) -> StatementLambdaElement:
+    # One keyset page over ix_books_seller_id_id, whatever the size of the catalogue
+    if fast:
+        statement = lambda_stmt(lambda: select(*SELLER_BOOK_COLUMNS))
+    else:
+        statement = lambda_stmt(lambda: select(Book).options(load_only(Book.title, Book.author, Book.year, Book.pages)))
+    statement += lambda s: s.where(Book.seller_id == seller_id)
+    return keyset_page(statement, Book.id, after, limit)
+
+
+def seller_rows(filters: SellerFilters, fast: bool = True) -> StatementLambdaElement:
+    """Sellers matching `filters`, without the password in the column tuples."""
+    if fast:
+        statement = lambda_stmt(lambda: select(*RETURNED_SELLER_COLUMNS))
+    else:
+        statement = lambda_stmt(lambda: select(Seller))
+    if (last_name := filters.last_name) is not None:
+        statement += lambda s: s.where(Seller.last_name == last_name)
+    if (e_mail := filters.e_mail) is not None:
+        statement += lambda s: s.where(Seller.e_mail == e_mail)
+    return statement
+
+
+def sellers_page(filters: SellerFilters, after: Optional[int], limit: int, fast: bool) -> StatementLambdaElement:
+    return keyset_page(seller_rows(filters, fast), Seller.id, after, limit)
+
+
+def books_export(filters: BookFilters) -> StatementLambdaElement:
+    statement = book_rows(filters)
+    statement += lambda s: s.order_by(Book.id)
+    return statement
+
+
+def sellers_export(filters: SellerFilters) -> StatementLambdaElement:
+    # The password is never exported
+    statement = seller_rows(filters)
+    statement += lambda s: s.order_by(Seller.id)
+    return statement
@@ -0,0 +1,42 @@
+from typing import AsyncIterator
+
+import orjson
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Executable
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
+
+from src.configurations.settings import settings
+
+__all__ = ["NDJSON_MEDIA_TYPE", "stream_ndjson", "ndjson_response"]
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def stream_ndjson(
+    session: AsyncSession, query: Executable, chunk_size: int = settings.export_chunk_size
+) -> AsyncIterator[bytes]:
+    """Yield rows of `query` as NDJSON, one chunk per `chunk_size` rows.
+
+    Rows are read through a server-side cursor, so memory stays bounded by
+    the chunk size and the first chunk is sent before the table is scanned.
+    The session is closed once the stream is exhausted or fails.
+    """
+    try:
+        result = await session.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.mappings().partitions():
+            yield b"".join(orjson.dumps(dict(row)) + b"\n" for row in rows)
+    finally:
+        await session.close()
+
+
+def ndjson_response(session: AsyncSession, query: Executable) -> StreamingResponse:
+    """Rows of `query` streamed as NDJSON, see `stream_ndjson`.
+
+    The session is also closed after the response, by a background task:
+    a stream that never starts, or that is left at a yield when the
+    client goes away, never reaches its own cleanup.
+    """
+    return StreamingResponse(
+        stream_ndjson(session, query), media_type=NDJSON_MEDIA_TYPE, background=BackgroundTask(session.close)
+    )
@@ -5,10 +5,13 @@ import pytest
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
+from src.configurations.database import run_after_commit
+from src.migrations import migrate, schema_version
 from src.configurations.settings import settings
-from src.models import books
+from src.models import books, changes, jobs, stats
 from src.models.base import BaseModel
 from src.models.books import Book  
+from src.services.cache import MemoryCacheBackend, ResponseCache, get_response_cache
 
 async_test_engine = create_async_engine(
     settings.database_test_url,
@@ -30,7 +33,8 @@ def event_loop():
 async def create_tables() -> None:
     async with async_test_engine.begin() as connection:
         await connection.run_sync(BaseModel.metadata.drop_all)
-        await connection.run_sync(BaseModel.metadata.create_all)
+        await connection.run_sync(schema_version.drop, checkfirst=True)
+        await connection.run_sync(migrate)
 
 
 @pytest_asyncio.fixture(scope="function")
@@ -45,16 +49,49 @@ async def db_session():
 def override_get_async_session(db_session):
     async def _override_get_async_session():
         yield db_session
+        await run_after_commit(db_session)
 
     return _override_get_async_session
 
 
 @pytest.fixture(scope="function")
-def test_app(override_get_async_session):
-    from src.configurations.database import get_async_session
+def override_get_read_session(db_session):
+    async def _override_get_read_session():
+        yield db_session
+
+    return _override_get_read_session
+
+
+@pytest.fixture(scope="function")
+def override_get_stream_session(db_session):
+    # A second session on the test connection: it sees the flushed test data
+    # and closing it after the stream does not end the test transaction
+    async def _override_get_stream_session():
+        return async_test_session(bind=db_session.bind)
+
+    return _override_get_stream_session
+
+
+@pytest.fixture(scope="function")
+def response_cache():
+    return ResponseCache(MemoryCacheBackend())
+
+
+@pytest.fixture(scope="function")
+def test_app(
+    override_get_async_session, override_get_read_session, override_get_stream_session, response_cache
+):
+    from src.configurations.database import (
+        get_async_session, get_primary_read_session, get_read_session, get_stream_session,
+    )
     from src.main import app
 
     app.dependency_overrides[get_async_session] = override_get_async_session
+    app.dependency_overrides[get_read_session] = override_get_read_session
+    app.dependency_overrides[get_primary_read_session] = override_get_read_session
+    app.dependency_overrides[get_stream_session] = override_get_stream_session
+    # A fresh cache per test, the test transactions are rolled back
+    app.dependency_overrides[get_response_cache] = lambda: response_cache
 
     return app
 
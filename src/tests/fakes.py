@@ -0,0 +1,72 @@
+# In-memory stand-ins for external services
+from time import monotonic
+
+from src.services.ratelimit import GCRA_SCRIPT, gcra
+
+
+class FakeRedis:
+    """Subset of the `redis.asyncio.Redis` commands used by the app."""
+
+    def __init__(self):
+        self.data = {}
+        self.expires_at = {}
+
+    def _alive(self, key):
+        expires_at = self.expires_at.get(key)
+        if expires_at is not None and expires_at <= monotonic():
+            self.data.pop(key, None)
+            self.expires_at.pop(key, None)
+        return key in self.data
+
+    async def get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        self.expires_at.pop(key, None)
+        if px is not None:
+            await self.pexpire(key, px)
+        return True
+
+    async def delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self._alive(key):
+                deleted += 1
+            self.data.pop(key, None)
+            self.expires_at.pop(key, None)
+        return deleted
+
+    async def pexpire(self, key, px):
+        if not self._alive(key):
+            return False
+        self.expires_at[key] = monotonic() + px / 1000
+        return True
+
+    async def sadd(self, key, *members):
+        if not self._alive(key):
+            self.data[key] = set()
+        before = len(self.data[key])
+        self.data[key].update(member.encode() for member in members)
+        return len(self.data[key]) - before
+
+    async def smembers(self, key):
+        return set(self.data[key]) if self._alive(key) else set()
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        # Lua is not interpreted, the scripts of the app have Python twins
+        keys, args = keys_and_args[:numkeys], keys_and_args[numkeys:]
+        return SCRIPTS[script](self, keys, args)
+
+
+def take_token(redis, keys, args):
+    now = monotonic()
+    tat = float(redis.data[keys[0]]) if redis._alive(keys[0]) else None
+    new_tat, retry_after = gcra(tat, now, float(args[0]), int(args[1]))
+    if new_tat is not None:
+        redis.data[keys[0]] = str(new_tat).encode()
+        redis.expires_at[keys[0]] = new_tat
+    return str(retry_after).encode()
+
+
+SCRIPTS = {GCRA_SCRIPT: take_token}
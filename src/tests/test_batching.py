@@ -0,0 +1,124 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import status
+from sqlalchemy import func, select
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from src.configurations.settings import settings
+from src.models.books import Book
+from src.models.sellers import Seller
+from src.services.batching import InsertBatcher, get_book_batcher
+from .data import *
+
+
+def connection_batcher(db_session, savepoints: bool = False, **options) -> InsertBatcher:
+    # Batches run on the test connection, inside the test transaction. With
+    # savepoints each one is rolled back on its own when it fails, as its
+    # transaction would be
+    @asynccontextmanager
+    async def begin():
+        begin.calls += 1
+        connection = await db_session.connection()
+        if not savepoints:
+            yield connection
+            return
+        async with connection.begin_nested():
+            yield connection
+
+    begin.calls = 0
+    return InsertBatcher(begin, **options)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_inserts_share_one_statement(db_session):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+    batcher = connection_batcher(db_session, batch_size=3, max_latency=60)
+
+    books = [make_returned(book1) | {"seller_id": seller.id, "title": f"Book {n}"} for n in range(3)]
+    rows = await asyncio.gather(*(batcher.insert(book) for book in books))
+
+    assert batcher.begin.calls == 1
+    assert [row["title"] for row in rows] == ["Book 0", "Book 1", "Book 2"]
+    assert len({row["id"] for row in rows}) == 3
+
+
+@pytest.mark.asyncio
+async def test_partial_batch_is_written_after_the_latency(db_session):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+    batcher = connection_batcher(db_session, batch_size=100, max_latency=0.01)
+
+    row = await batcher.insert(make_returned(book1) | {"seller_id": seller.id})
+    assert row["seller_id"] == seller.id and row["id"]
+
+
+@pytest.mark.asyncio
+async def test_rejected_row_fails_only_its_caller(db_session):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+    seller_id = seller.id
+    batcher = connection_batcher(db_session, savepoints=True, batch_size=3, max_latency=60)
+
+    books = [make_returned(book1) | {"seller_id": seller_id, "title": f"Book {n}"} for n in range(3)]
+    books[1]["seller_id"] = seller_id + 1000  # unknown seller
+    results = await asyncio.gather(*(batcher.insert(book) for book in books), return_exceptions=True)
+
+    assert isinstance(results[1], IntegrityError)
+    assert [results[0]["title"], results[2]["title"]] == ["Book 0", "Book 2"]
+    # The batch, then each row on its own
+    assert batcher.begin.calls == 4
+    count = await db_session.scalar(select(func.count(Book.id)).where(Book.seller_id == seller_id))
+    assert count == 2
+
+
+@pytest.mark.asyncio
+async def test_row_rejected_by_the_column_type_fails_only_its_caller(db_session):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+    seller_id = seller.id
+    batcher = connection_batcher(db_session, savepoints=True, batch_size=3, max_latency=60)
+
+    books = [make_returned(book1) | {"seller_id": seller_id, "title": f"Book {n}"} for n in range(3)]
+    books[1]["title"] = "x" * 51  # longer than the String(50) column
+    results = await asyncio.gather(*(batcher.insert(book) for book in books), return_exceptions=True)
+
+    assert isinstance(results[1], DBAPIError) and not isinstance(results[1], IntegrityError)
+    assert [results[0]["title"], results[2]["title"]] == ["Book 0", "Book 2"]
+    count = await db_session.scalar(select(func.count(Book.id)).where(Book.seller_id == seller_id))
+    assert count == 2
+
+
+@pytest.mark.asyncio
+async def test_create_book_with_too_long_title(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = book1 | {"seller_id": seller.id, "title": "x" * 51}
+    response = await async_client.post("/api/v1/books/", json=book)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_create_book_batched(db_session, async_client, test_app, monkeypatch):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+    monkeypatch.setattr(settings, "book_insert_batching", True)
+    batcher = connection_batcher(db_session, batch_size=2, max_latency=60)
+    monkeypatch.setitem(test_app.dependency_overrides, get_book_batcher, lambda: batcher)
+
+    book = book1 | {"seller_id": seller.id}
+    responses = await asyncio.gather(*(async_client.post("/api/v1/books/", json=book) for _ in range(2)))
+
+    assert {response.status_code for response in responses} == {status.HTTP_201_CREATED}
+    assert batcher.begin.calls == 1
+    created = [response.json() for response in responses]
+    assert created[0].pop("id") != created[1].pop("id")
+    assert created[0] == make_returned(book1) | {"seller_id": seller.id}
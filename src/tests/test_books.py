@@ -1,9 +1,16 @@
+import asyncio
+import html
+import json
+import re
 import pytest
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.models.books import Book
 from src.models.sellers import Seller
 from fastapi import status
-from icecream import ic
+from src.configurations.database import get_stream_session
+from src.configurations.settings import settings
+from src.services.cache import BOOKS_LIST_TAG, book_key
 from .data import *
 
 @pytest.mark.asyncio
@@ -158,3 +165,352 @@ async def test_delete_book_with_invalid_book_id(db_session, async_client):
     response = await async_client.delete(f"/api/v1/books/{added_book.id + 1}")
 
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_get_books_paginated(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    books = [make_returned(book1), make_returned(book2), make_returned(book3)]
+    for book in books:
+        book['seller_id'] = seller.id
+    added_books = [Book(**book) for book in books]
+
+    db_session.add_all(added_books)
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/books/", params={"limit": 2})
+    assert response.status_code == status.HTTP_200_OK
+
+    first_page = response.json()
+    assert [book['id'] for book in first_page['books']] == [added_books[0].id, added_books[1].id]
+    assert first_page['next_after'] == added_books[1].id
+
+    response = await async_client.get(
+        "/api/v1/books/", params={"limit": 2, "after": first_page['next_after']}
+    )
+    second_page = response.json()
+    assert [book['id'] for book in second_page['books']] == [added_books[2].id]
+    assert second_page['next_after'] is None
+
+
+@pytest.mark.asyncio
+async def test_get_books_filtered(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    books = [make_returned(book1), make_returned(book2), make_returned(book3)]
+    for book in books:
+        book['seller_id'] = seller.id
+    added_books = [Book(**book) for book in books]
+
+    db_session.add_all(added_books)
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/books/", params={"author": "Pushkin"})
+    assert [book['id'] for book in response.json()['books']] == [added_books[1].id]
+
+    response = await async_client.get("/api/v1/books/", params={"year_from": 2023})
+    assert [book['id'] for book in response.json()['books']] == [added_books[0].id]
+
+
+@pytest.mark.asyncio
+async def test_export_books(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    books = [make_returned(book1), make_returned(book2)]
+    books[0]['seller_id'] = seller.id
+    books[1]['seller_id'] = seller.id
+    added_books = [Book(**books[0]), Book(**books[1])]
+
+    db_session.add_all(added_books)
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/books/export", params={"seller_id": seller.id})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    right_result_data = books.copy()
+    right_result_data[0]['id'] = added_books[0].id
+    right_result_data[1]['id'] = added_books[1].id
+    assert [json.loads(line) for line in response.text.splitlines()] == right_result_data
+
+
+@pytest.mark.asyncio
+async def test_export_session_is_closed_when_the_client_leaves_first(db_session, test_app, monkeypatch):
+    session = AsyncSession(bind=db_session.bind)
+    closed = []
+    close = session.close
+
+    async def spy_close():
+        closed.append(True)
+        await close()
+
+    session.close = spy_close
+    monkeypatch.setitem(test_app.dependency_overrides, get_stream_session, lambda: session)
+
+    messages = iter([{"type": "http.request", "body": b"", "more_body": False}])
+
+    async def receive():
+        return next(messages, {"type": "http.disconnect"})
+
+    async def send(message):
+        # Gone before the first byte: the rows are never streamed
+        await asyncio.Event().wait()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/api/v1/books/export", "raw_path": b"/api/v1/books/export", "root_path": "",
+        "query_string": b"", "headers": [], "server": ("127.0.0.1", 8000), "client": ("127.0.0.1", 50000),
+    }
+    await asyncio.wait_for(test_app(scope, receive, send), 5)
+    assert closed
+
+
+@pytest.mark.asyncio
+async def test_create_books_bulk(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    books = [book1.copy(), book2.copy(), book3.copy()]
+    books[0]['seller_id'] = seller.id
+    books[1]['year'] = 1985 # < 2020
+    books[2]['seller_id'] = seller.id + 1 # unknown seller
+
+    response = await async_client.post("/api/v1/books/bulk", json=books)
+
+    assert response.status_code == status.HTTP_200_OK
+
+    result_data = response.json()
+    assert len(result_data['created']) == 1
+    created_book = result_data['created'][0]
+    assert created_book.pop('id')
+    assert created_book == make_returned(books[0])
+    assert [error['index'] for error in result_data['errors']] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_create_books_bulk_ndjson(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    books = [book1.copy(), book2.copy()]
+    for book in books:
+        book['seller_id'] = seller.id
+
+    response = await async_client.post(
+        "/api/v1/books/bulk",
+        content="\n".join(json.dumps(book) for book in books),
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()['created']) == 2
+    assert response.json()['errors'] == []
+
+
+@pytest.mark.asyncio
+async def test_update_and_delete_books_bulk(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = make_returned(book1)
+    book['seller_id'] = seller.id
+    added_book = Book(**book)
+    db_session.add(added_book)
+    await db_session.flush()
+
+    updated_book = make_returned(book2)
+    updated_book['seller_id'] = seller.id
+    updated_book['id'] = added_book.id
+    missing_book = updated_book.copy()
+    missing_book['id'] = added_book.id + 1
+
+    response = await async_client.put("/api/v1/books/bulk", json=[updated_book, missing_book])
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['updated'] == [added_book.id]
+    assert [error['index'] for error in response.json()['errors']] == [1]
+
+    response = await async_client.request(
+        "DELETE", "/api/v1/books/bulk", json=[added_book.id, added_book.id + 1]
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['deleted'] == [added_book.id]
+    assert [error['index'] for error in response.json()['errors']] == [1]
+    assert (await db_session.execute(select(Book).where(Book.id == added_book.id))).first() is None
+
+
+@pytest.mark.asyncio
+async def test_get_book_conditional(db_session, async_client, response_cache):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = make_returned(book1)
+    book['seller_id'] = seller.id
+    added_book = Book(**book)
+    db_session.add(added_book)
+    await db_session.flush()
+
+    response = await async_client.get(f"/api/v1/books/{added_book.id}")
+    etag = response.headers["etag"]
+    assert response.headers["last-modified"]
+
+    response = await async_client.get(
+        f"/api/v1/books/{added_book.id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+
+    # Revalidation without a cached response reads the version from the database
+    await response_cache.invalidate(keys=[f"books:{added_book.id}"])
+    response = await async_client.get(
+        f"/api/v1/books/{added_book.id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+@pytest.mark.asyncio
+async def test_update_book_if_match(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = make_returned(book1)
+    book['seller_id'] = seller.id
+    added_book = Book(**book)
+    db_session.add(added_book)
+    await db_session.flush()
+
+    etag = (await async_client.get(f"/api/v1/books/{added_book.id}")).headers["etag"]
+
+    updated_book = make_returned(book2)
+    updated_book['seller_id'] = seller.id
+    updated_book['id'] = added_book.id
+    response = await async_client.put(
+        f"/api/v1/books/{added_book.id}", json=updated_book, headers={"If-Match": etag}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    # The version has moved on, a second update with the old ETag is lost
+    response = await async_client.put(
+        f"/api/v1/books/{added_book.id}", json=updated_book, headers={"If-Match": etag}
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = await async_client.get(f"/api/v1/books/{added_book.id}")
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_update_book_if_match_any(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = make_returned(book1)
+    book['seller_id'] = seller.id
+    added_book = Book(**book)
+    db_session.add(added_book)
+    await db_session.flush()
+
+    updated_book = make_returned(book2)
+    updated_book['seller_id'] = seller.id
+    updated_book['id'] = added_book.id
+    response = await async_client.put(
+        f"/api/v1/books/{added_book.id}", json=updated_book, headers={"If-Match": "*"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == updated_book
+
+    # A missing book stays a 404 under If-Match
+    response = await async_client.put(
+        f"/api/v1/books/{added_book.id + 1}", json=updated_book, headers={"If-Match": '"1"'}
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_search_books(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    db_session.add_all([
+        Book(title="Dune", author="Frank Herbert", year=2021, pages=412, seller_id=seller.id),
+        Book(title="Dune Messiah", author="Frank Herbert", year=2022, pages=256, seller_id=seller.id),
+        Book(title="Neuromancer", author="William Gibson", year=2023, pages=271, seller_id=seller.id),
+    ])
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/books/search", params={"q": "dun herb"})
+    assert response.status_code == status.HTTP_200_OK
+    hits = response.json()["books"]
+    assert sorted(hit["title"] for hit in hits) == ["Dune", "Dune Messiah"]
+    assert "<b>Dune</b>" in hits[0]["title_highlight"]
+    assert hits[0]["author_highlight"] == "Frank <b>Herbert</b>"
+
+    response = await async_client.get("/api/v1/books/search", params={"q": "Gibs", "limit": 1})
+    assert [hit["title"] for hit in response.json()["books"]] == ["Neuromancer"]
+    assert response.json()["next_offset"] is None
+
+    response = await async_client.get("/api/v1/books/search", params={"q": "dune", "limit": 1})
+    assert response.json()["next_offset"] == 1
+    response = await async_client.get(
+        "/api/v1/books/search", params={"q": "dune", "limit": 1, "offset": 1}
+    )
+    assert len(response.json()["books"]) == 1
+    assert response.json()["next_offset"] is None
+
+    # Operators in the input are not passed on to to_tsquery
+    response = await async_client.get("/api/v1/books/search", params={"q": "!&|"})
+    assert response.json() == {"books": [], "next_offset": None}
+
+
+@pytest.mark.asyncio
+async def test_search_books_highlights_are_escaped_html(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    title = '<img src=x onerror="alert(1)"> Dune & co'
+    db_session.add(Book(title=title, author="O'Brien <b>", year=2021, pages=412, seller_id=seller.id))
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/books/search", params={"q": "dune"})
+    hit, = response.json()["books"]
+    assert "<img" not in hit["title_highlight"]
+    assert "<b>Dune</b>" in hit["title_highlight"]
+    assert html.unescape(re.sub("</?b>", "", hit["title_highlight"])) == title
+    assert hit["author_highlight"] == "O&#39;Brien &lt;b&gt;"
+
+
+@pytest.mark.asyncio
+async def test_fast_serialization_is_byte_identical(db_session, async_client, response_cache, monkeypatch):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+    books = [Book(**(make_returned(book) | {"seller_id": seller.id})) for book in (book1, book2)]
+    db_session.add_all(books)
+    await db_session.flush()
+
+    paths = ["/api/v1/books/?limit=1", f"/api/v1/books/{books[0].id}"]
+    bodies = {}
+    for fast in (False, True):
+        monkeypatch.setattr(settings, "fast_serialization", fast)
+        await response_cache.invalidate(keys=[book_key(books[0].id)], tags=[BOOKS_LIST_TAG])
+        bodies[fast] = [(await async_client.get(path)).content for path in paths]
+
+    assert json.loads(bodies[False][0])["next_after"] == books[0].id
+    assert bodies[True] == bodies[False]
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from fastapi import status
+from src.models.books import Book
+from src.models.sellers import Seller
+from src.services.cache import CachedResponse, MemoryCacheBackend, RedisCacheBackend, ResponseCache, seller_key
+from .data import *
+from .fakes import FakeRedis
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("make_backend", [MemoryCacheBackend, lambda: RedisCacheBackend(FakeRedis())])
+async def test_cache_backend_invalidation(make_backend):
+    backend = make_backend()
+    await backend.set("books:1", b"1", ttl=60, tags=["seller:1:books"])
+    await backend.set("books:2", b"2", ttl=60, tags=["seller:2:books"])
+    await backend.set("books:list:{}", b"[]", ttl=60, tags=["books:list"])
+
+    await backend.invalidate(keys=["books:2"], tags=["books:list"])
+
+    assert await backend.get("books:1") == b"1"
+    assert await backend.get("books:2") is None
+    assert await backend.get("books:list:{}") is None
+
+    await backend.invalidate(tags=["seller:1:books"])
+    assert await backend.get("books:1") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("make_backend", [MemoryCacheBackend, lambda: RedisCacheBackend(FakeRedis())])
+async def test_cache_backend_ttl(make_backend):
+    backend = make_backend()
+    await backend.set("books:1", b"1", ttl=0.01)
+    await asyncio.sleep(0.02)
+    assert await backend.get("books:1") is None
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend(max_entries=2)
+    await backend.set("books:1", b"1", ttl=60)
+    await backend.set("books:2", b"2", ttl=60)
+    await backend.get("books:1")
+    await backend.set("books:3", b"3", ttl=60)
+
+    assert await backend.get("books:1") == b"1"
+    assert await backend.get("books:2") is None
+    assert await backend.get("books:3") == b"3"
+
+
+async def slow_load(cache: ResponseCache, key: str, tags: list[str], invalidate: dict) -> None:
+    # The loader reads the rows, the write commits and invalidates, then the
+    # loader caches what it read
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def loader():
+        started.set()
+        await release.wait()
+        await cache.set(key, b"old", tags)
+        return CachedResponse(b"old", {})
+
+    load = asyncio.create_task(cache.load(key, loader))
+    await started.wait()
+    await cache.invalidate(**invalidate)
+    release.set()
+    assert await load == CachedResponse(b"old", {})
+
+
+@pytest.mark.asyncio
+async def test_load_overtaken_by_an_invalidation_is_not_cached():
+    cache = ResponseCache(MemoryCacheBackend())
+
+    await slow_load(cache, "books:1", ["seller:1"], {"tags": ["seller:1"]})
+    assert await cache.get("books:1") is None
+    await slow_load(cache, "books:1", ["seller:1"], {"keys": ["books:1"]})
+    assert await cache.get("books:1") is None
+
+    # Invalidations of other entries, or before the load, do not count
+    await slow_load(cache, "books:1", ["seller:1"], {"keys": ["books:2"], "tags": ["seller:2"]})
+    assert await cache.get("books:1") == CachedResponse(b"old", {})
+
+    async def loader():
+        await cache.set("books:1", b"new", ["seller:1"])
+        return CachedResponse(b"new", {})
+
+    await cache.invalidate(tags=["seller:1"])
+    await cache.load("books:1", loader)
+    assert await cache.get("books:1") == CachedResponse(b"new", {})
+
+
+@pytest.mark.asyncio
+async def test_update_book_invalidates_cached_book_and_seller(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = make_returned(book1)
+    book['seller_id'] = seller.id
+    added_book = Book(**book)
+    db_session.add(added_book)
+    await db_session.flush()
+
+    first_book = await async_client.get(f"/api/v1/books/{added_book.id}")
+    first_seller = await async_client.get(f"/api/v1/seller/{seller.id}")
+    assert (await async_client.get(f"/api/v1/books/{added_book.id}")).content == first_book.content
+
+    updated_book = make_returned(book2)
+    updated_book['seller_id'] = seller.id
+    updated_book['id'] = added_book.id
+    response = await async_client.put(f"/api/v1/books/{added_book.id}", json=updated_book)
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await async_client.get(f"/api/v1/books/{added_book.id}")
+    assert response.json() == updated_book
+
+    response = await async_client.get(f"/api/v1/seller/{seller.id}")
+    assert response.content != first_seller.content
+    assert response.json()['books'][0]['title'] == updated_book['title']
+
+
+@pytest.mark.asyncio
+async def test_create_book_invalidates_cached_lists(db_session, async_client, response_cache):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/books/")
+    assert response.json()['books'] == []
+    await async_client.get(f"/api/v1/seller/{seller.id}")
+
+    book = book1.copy()
+    book['seller_id'] = seller.id
+    response = await async_client.post("/api/v1/books/", json=book)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    response = await async_client.get("/api/v1/books/")
+    assert len(response.json()['books']) == 1
+    assert await response_cache.get(seller_key(seller.id)) is None
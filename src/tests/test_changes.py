@@ -0,0 +1,276 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+import orjson
+import pytest
+import pytest_asyncio
+from fastapi import status
+from sqlalchemy import delete
+from src.configurations.settings import settings
+from src.models.changes import Change
+from src.models.sellers import Seller
+from src.services.changes import ChangeFeed, get_change_feed
+from src.services.ratelimit import AdmissionMiddleware, MemoryTokenBucketStore
+from .data import *
+
+
+def connection_feed(db_session, **options) -> ChangeFeed:
+    # Numbered and read on the test connection, inside the test transaction;
+    # the tests call refresh() where the feed's task would
+    @asynccontextmanager
+    async def begin():
+        yield await db_session.connection()
+
+    return ChangeFeed(begin, **options)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def change_feed(test_app, db_session, monkeypatch):
+    feed = connection_feed(db_session)
+    await feed.open()
+    monkeypatch.setitem(test_app.dependency_overrides, get_change_feed, lambda: feed)
+    return feed
+
+
+class ASGIConnection:
+    """One request to the app, message by message, for the responses that never end."""
+
+    def __init__(self, app, scope: dict, *messages: dict) -> None:
+        self.received = asyncio.Queue()
+        self.sent = asyncio.Queue()
+        for message in messages:
+            self.received.put_nowait(message)
+        scope = {
+            "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "http", "root_path": "",
+            "server": ("127.0.0.1", 8000), "client": ("127.0.0.1", 50000), "headers": [], **scope,
+        }
+        scope.setdefault("raw_path", scope["path"].encode())
+        self.task = asyncio.create_task(app(scope, self.received.get, self.sent.put))
+
+    async def next(self) -> dict:
+        return await asyncio.wait_for(self.sent.get(), 5)
+
+    async def body(self) -> bytes:
+        message = await self.next()
+        assert message["type"] == "http.response.body"
+        return message["body"]
+
+    async def close(self, message: dict) -> None:
+        await self.received.put(message)
+        await asyncio.wait_for(self.task, 5)
+
+
+def sse(test_app, query: bytes = b"", headers: list = ()) -> ASGIConnection:
+    return ASGIConnection(
+        test_app,
+        {"type": "http", "method": "GET", "path": "/api/v1/changes/stream", "query_string": query,
+         "headers": list(headers)},
+        {"type": "http.request", "body": b"", "more_body": False},
+    )
+
+
+def websocket(test_app, query: bytes = b"") -> ASGIConnection:
+    return ASGIConnection(
+        test_app,
+        {"type": "websocket", "path": "/api/v1/changes/ws", "query_string": query, "subprotocols": []},
+        {"type": "websocket.connect"},
+    )
+
+
+async def add_seller(db_session) -> int:
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+    return seller.id
+
+
+async def create_books(async_client, seller_id: int, count: int) -> list[int]:
+    books = [book1 | {"seller_id": seller_id, "title": f"Book {n}"} for n in range(count)]
+    response = await async_client.post("/api/v1/books/bulk", json=books)
+    assert response.status_code == status.HTTP_200_OK
+    return [book["id"] for book in response.json()["created"]]
+
+
+async def collect(feed: ChangeFeed, after: int, count: int) -> list[dict]:
+    changes = []
+    async for batch in feed.subscribe(after, timeout=1):
+        assert batch, "the feed stopped short"
+        changes.extend(batch)
+        if len(changes) >= count:
+            return changes
+
+
+@pytest.mark.asyncio
+async def test_writes_publish_changes_in_order(db_session, async_client, change_feed):
+    head = change_feed._last_seq
+
+    response = await async_client.post("/api/v1/seller", json=seller1)
+    seller_id = response.json()["id"]
+    book_id, = await create_books(async_client, seller_id, 1)
+    response = await async_client.put(
+        f"/api/v1/books/{book_id}", json=make_returned(book2) | {"id": book_id, "seller_id": seller_id}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    response = await async_client.delete(f"/api/v1/books/{book_id}")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    response = await async_client.delete(f"/api/v1/seller/{seller_id}")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    assert await change_feed.relay() == 5
+    await change_feed.fetch()
+    changes = await collect(change_feed, head, 5)
+
+    assert changes == [
+        {"seq": head + 1, "entity": "seller", "id": seller_id, "op": "created"},
+        {"seq": head + 2, "entity": "book", "id": book_id, "op": "created"},
+        {"seq": head + 3, "entity": "book", "id": book_id, "op": "updated"},
+        {"seq": head + 4, "entity": "book", "id": book_id, "op": "deleted"},
+        {"seq": head + 5, "entity": "seller", "id": seller_id, "op": "deleted"},
+    ]
+    # Numbered once
+    assert await change_feed.relay() == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_write_publishes_nothing(db_session, async_client, change_feed):
+    response = await async_client.delete("/api/v1/books/0")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    assert await change_feed.relay() == 0
+
+
+@pytest.mark.asyncio
+async def test_subscriber_catches_up_from_the_table(db_session, async_client):
+    feed = connection_feed(db_session, buffer_size=2)
+    await feed.open()
+    head = feed._last_seq
+
+    book_ids = await create_books(async_client, await add_seller(db_session), 5)
+    await feed.refresh()
+
+    # The buffer holds the last two, the first three are read from the table
+    assert feed._complete_after == head + 3
+    changes = await collect(feed, head, 5)
+    assert [change["seq"] for change in changes] == list(range(head + 1, head + 6))
+    assert [change["id"] for change in changes] == book_ids
+    # Resuming in the middle
+    changes = await collect(feed, head + 3, 2)
+    assert [change["id"] for change in changes] == book_ids[3:]
+
+
+@pytest.mark.asyncio
+async def test_subscriber_waits_for_new_changes(db_session, async_client, change_feed):
+    head = change_feed._last_seq
+    subscriber = asyncio.create_task(collect(change_feed, head, 1))
+    await asyncio.sleep(0)
+
+    book_id, = await create_books(async_client, await add_seller(db_session), 1)
+    await change_feed.refresh()
+
+    changes = await asyncio.wait_for(subscriber, 5)
+    assert changes == [{"seq": head + 1, "entity": "book", "id": book_id, "op": "created"}]
+
+
+@pytest.mark.asyncio
+async def test_stream_changes_as_server_sent_events(db_session, async_client, test_app, change_feed, monkeypatch):
+    monkeypatch.setattr(settings, "change_feed_keepalive", 0.05)
+    head = change_feed._last_seq
+    seller_id = await add_seller(db_session)
+    _, second = await create_books(async_client, seller_id, 2)
+    await change_feed.refresh()
+
+    stream = sse(test_app, b"after=%d" % (head + 1))
+    start = await stream.next()
+    assert start["status"] == status.HTTP_200_OK
+    headers = dict(start["headers"])
+    assert headers[b"content-type"].startswith(b"text/event-stream")
+    assert headers[b"cache-control"] == b"no-cache"
+
+    event = {"seq": head + 2, "entity": "book", "id": second, "op": "created"}
+    assert await stream.body() == b"id: %d\nevent: change\ndata: %s\n\n" % (head + 2, orjson.dumps(event))
+    assert await stream.body() == b": keep-alive\n\n"
+
+    # Sent as soon as the feed has it
+    third, = await create_books(async_client, seller_id, 1)
+    await change_feed.refresh()
+    body = await stream.body()
+    while body == b": keep-alive\n\n":
+        body = await stream.body()
+    assert body.startswith(b"id: %d\n" % (head + 3))
+    assert b'"id":%d' % third in body
+
+    await stream.close({"type": "http.disconnect"})
+
+
+@pytest.mark.asyncio
+async def test_stream_resumes_after_last_event_id(db_session, async_client, test_app, change_feed):
+    head = change_feed._last_seq
+    await create_books(async_client, await add_seller(db_session), 2)
+    await change_feed.refresh()
+
+    # The header of the browser's reconnection wins over the query of the page
+    stream = sse(test_app, b"after=%d" % (head + 1), [(b"last-event-id", b"%d" % head)])
+    assert (await stream.next())["status"] == status.HTTP_200_OK
+    body = await stream.body()
+    assert body.startswith(b"id: %d\n" % (head + 1))
+    assert body.count(b"event: change") == 2
+
+    await stream.close({"type": "http.disconnect"})
+
+
+@pytest.mark.asyncio
+async def test_open_stream_is_not_counted_in_flight(db_session, test_app, change_feed):
+    middleware = AdmissionMiddleware(test_app, router=test_app.router, store=MemoryTokenBucketStore(), max_in_flight=1)
+    stream = sse(middleware)
+    assert (await stream.next())["status"] == status.HTTP_200_OK
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=middleware), base_url="http://127.0.0.1:8000"
+    ) as client:
+        response = await client.get("/api/v1/books/")
+    assert response.status_code == status.HTTP_200_OK
+    assert middleware.in_flight == 0
+
+    await stream.close({"type": "http.disconnect"})
+
+
+@pytest.mark.asyncio
+async def test_follow_changes_over_websocket(db_session, async_client, test_app, change_feed):
+    head = change_feed._last_seq
+    book_ids = await create_books(async_client, await add_seller(db_session), 2)
+    await change_feed.refresh()
+
+    connection = websocket(test_app, b"after=%d" % head)
+    assert (await connection.next())["type"] == "websocket.accept"
+    for seq, book_id in enumerate(book_ids, head + 1):
+        message = await connection.next()
+        assert message["type"] == "websocket.send"
+        assert orjson.loads(message["text"]) == {"seq": seq, "entity": "book", "id": book_id, "op": "created"}
+
+    await connection.close({"type": "websocket.disconnect", "code": 1000})
+
+
+@pytest.mark.asyncio
+async def test_resuming_before_the_retained_changes_is_gone(db_session, async_client, test_app, monkeypatch):
+    feed = connection_feed(db_session, buffer_size=1)
+    await feed.open()
+    monkeypatch.setitem(test_app.dependency_overrides, get_change_feed, lambda: feed)
+    head = feed._last_seq
+    await create_books(async_client, await add_seller(db_session), 3)
+    await feed.refresh()
+    # Expired
+    await db_session.execute(delete(Change).where(Change.seq <= head + 2))
+
+    assert await feed.retains(head + 2)
+    assert not await feed.retains(head + 1)
+
+    stream = sse(test_app, b"after=%d" % (head + 1))
+    assert (await stream.next())["status"] == status.HTTP_410_GONE
+    await stream.body()
+    await asyncio.wait_for(stream.task, 5)
+
+    connection = websocket(test_app, b"after=%d" % (head + 1))
+    assert (await connection.next())["type"] == "websocket.accept"
+    assert await connection.next() == {"type": "websocket.close", "code": 4410, "reason": ""}
+    await asyncio.wait_for(connection.task, 5)
@@ -0,0 +1,160 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import status
+from sqlalchemy import func, select
+from src.models.books import Book
+from src.models.jobs import Job
+from src.models.sellers import Seller
+from src.services.cache import book_key
+from src.services.jobs import JobRunner, get_job_runner
+from .data import *
+
+RESPOND_ASYNC = {"Prefer": "respond-async"}
+
+
+@pytest.fixture(scope="function")
+def job_runner(test_app, db_session, response_cache, monkeypatch):
+    # Jobs run on the test connection, inside the test transaction
+    @asynccontextmanager
+    async def begin():
+        yield await db_session.connection()
+
+    runner = JobRunner(begin, response_cache, chunk_size=2)
+    monkeypatch.setitem(test_app.dependency_overrides, get_job_runner, lambda: runner)
+    return runner
+
+
+async def add_seller_with_books(db_session, count: int) -> Seller:
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+    db_session.add_all(
+        Book(**make_returned(book1) | {"seller_id": seller.id, "title": f"Book {n}"}) for n in range(count)
+    )
+    await db_session.flush()
+    return seller
+
+
+@pytest.mark.asyncio
+async def test_delete_seller_in_background(db_session, async_client, job_runner):
+    seller_id = (await add_seller_with_books(db_session, 5)).id
+
+    response = await async_client.delete(f"/api/v1/seller/{seller_id}", headers=RESPOND_ASYNC)
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.headers["preference-applied"] == "respond-async"
+    job = response.json()
+    assert job["status"] == "queued"
+    assert job["total"] == 5
+    location = response.headers["location"]
+    assert location.endswith(f"/api/v1/jobs/{job['id']}")
+
+    await job_runner.wait()
+    db_session.expire_all()
+
+    response = await async_client.get(location)
+    assert response.status_code == status.HTTP_200_OK
+    job = response.json()
+    assert job["status"] == "succeeded"
+    assert job["done"] == 5
+    assert job["result"] == {"deleted_books": 5}
+    assert job["finished_at"] is not None
+
+    assert (await async_client.get(f"/api/v1/seller/{seller_id}")).status_code == status.HTTP_404_NOT_FOUND
+    assert await db_session.scalar(select(func.count(Book.id)).where(Book.seller_id == seller_id)) == 0
+
+
+@pytest.mark.asyncio
+async def test_deleted_books_leave_the_cache_chunk_by_chunk(
+    db_session, async_client, job_runner, response_cache, monkeypatch
+):
+    seller_id = (await add_seller_with_books(db_session, 5)).id
+    first_id = await db_session.scalar(select(func.min(Book.id)).where(Book.seller_id == seller_id))
+    assert (await async_client.get(f"/api/v1/books/{first_id}")).status_code == status.HTTP_200_OK
+    assert await response_cache.get(book_key(first_id)) is not None
+
+    cached = []
+    invalidate = response_cache.invalidate
+
+    async def invalidate_and_look(keys=(), tags=()):
+        await invalidate(keys, tags)
+        cached.append(await response_cache.get(book_key(first_id)) is not None)
+
+    monkeypatch.setattr(response_cache, "invalidate", invalidate_and_look)
+    response = await async_client.delete(f"/api/v1/seller/{seller_id}", headers=RESPOND_ASYNC)
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    await job_runner.wait()
+
+    # Chunks of 2, 2 and 1 books: the first book is gone after the first one
+    assert cached == [False, False, False]
+
+
+@pytest.mark.asyncio
+async def test_delete_unknown_seller_in_background(async_client, job_runner):
+    response = await async_client.delete("/api/v1/seller/0", headers=RESPOND_ASYNC)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_in_background(db_session, async_client, job_runner):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+    seller_id = seller.id
+
+    rows = [make_incoming(make_returned(book1)) | {"seller_id": seller_id, "title": f"Book {n}"} for n in range(3)]
+    rows.insert(1, rows[0] | {"seller_id": seller_id + 1})
+    rows.append({"title": "No author"})
+
+    response = await async_client.post("/api/v1/books/bulk", json=rows, headers=RESPOND_ASYNC)
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.json()["total"] == 4
+
+    await job_runner.wait()
+    db_session.expire_all()
+
+    job = (await async_client.get(response.headers["location"])).json()
+    assert job["status"] == "succeeded"
+    assert job["done"] == 4
+    assert job["result"]["created"] == 3
+    assert [error["index"] for error in job["result"]["errors"]] == [1, 4]
+    assert await db_session.scalar(select(func.count(Book.id)).where(Book.seller_id == seller_id)) == 3
+
+
+@pytest.mark.asyncio
+async def test_job_of_a_lost_worker_resumes_where_it_stopped(db_session, job_runner):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+    rows = [
+        [n, make_incoming(make_returned(book1)) | {"seller_id": seller.id, "title": f"Book {n}"}]
+        for n in range(3)
+    ]
+    # Two rows were committed before the worker went away
+    job = Job(
+        kind="import_books",
+        params={"books": rows, "errors": []},
+        status="running",
+        done=2,
+        total=3,
+        result={"created": 2, "errors": []},
+        heartbeat_at=datetime.now(timezone.utc) - timedelta(seconds=job_runner.lease + 1),
+    )
+    db_session.add(job)
+    await db_session.flush()
+
+    await job_runner.resume()
+    await job_runner.wait()
+    await db_session.refresh(job)
+
+    assert job.status == "succeeded"
+    assert job.result == {"created": 3, "errors": []}
+    titles = (await db_session.scalars(select(Book.title).where(Book.seller_id == seller.id))).all()
+    assert titles == ["Book 2"]
+
+
+@pytest.mark.asyncio
+async def test_unknown_job(async_client):
+    response = await async_client.get("/api/v1/jobs/0")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
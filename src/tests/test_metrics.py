@@ -0,0 +1,135 @@
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import status
+from src.configurations import database
+from src.configurations.database import create_engine
+from src.configurations.settings import settings
+from src.models.books import Book
+from src.models.sellers import Seller
+from src.services import statements
+from src.services.metrics import (
+    MetricsMiddleware, MetricsRegistry, RequestMetrics, instrument_engine, registry, uninstrument_engine,
+)
+from .data import *
+
+
+@pytest.fixture(scope="function")
+def metrics():
+    return MetricsRegistry()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def metrics_client(test_app, db_session, metrics):
+    engine = db_session.bind.engine
+    instrument_engine(engine)
+    transport = httpx.ASGITransport(app=MetricsMiddleware(test_app, metrics))
+    async with httpx.AsyncClient(transport=transport, base_url="http://127.0.0.1:8000") as client:
+        yield client
+    uninstrument_engine(engine)
+
+
+@pytest.mark.asyncio
+async def test_server_timing_counts_queries(db_session, metrics_client, metrics):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    book = make_returned(book1)
+    book['seller_id'] = seller.id
+    added_book = Book(**book)
+    db_session.add(added_book)
+    await db_session.flush()
+
+    response = await metrics_client.get("/api/v1/books/")
+    assert response.status_code == status.HTTP_200_OK
+
+    timing = response.headers["server-timing"]
+    assert timing.startswith("db;dur=")
+    assert 'desc="1 queries"' in timing
+    assert "serialize;dur=" in timing
+    assert "total;dur=" in timing
+
+    # Served from the response cache, no query
+    response = await metrics_client.get("/api/v1/books/")
+    assert 'desc="0 queries"' in response.headers["server-timing"]
+
+    rendered = metrics.render()
+    labels = 'method="GET",route="/api/v1/books/"'
+    assert f'http_request_duration_seconds_count{{{labels},status="200"}} 2' in rendered
+    assert f"http_request_db_queries_sum{{{labels}}} 1" in rendered
+
+
+@pytest.mark.asyncio
+async def test_unmatched_route_label(metrics_client, metrics):
+    response = await metrics_client.get("/no/such/path")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert 'route="unmatched",status="404"' in metrics.render()
+
+
+def test_repeated_statement_is_counted_as_n_plus_one(metrics):
+    request = RequestMetrics()
+    request.queries = 6
+    request.statements["SELECT books.id FROM books WHERE books.seller_id = $1"] = 5
+    request.statements["SELECT sellers.id FROM sellers"] = 1
+
+    metrics.observe("GET", "/api/v1/seller", 200, 0.01, request)
+
+    assert 'http_request_n_plus_one_total{method="GET",route="/api/v1/seller"} 1' in metrics.render()
+
+
+def test_histogram_buckets_are_cumulative(metrics):
+    for queries in (1, 1, 4, 200):
+        request = RequestMetrics()
+        request.queries = queries
+        metrics.observe("GET", "/api/v1/books/", 200, 0.01, request)
+
+    rendered = metrics.render({"checked_out": 3})
+    labels = 'method="GET",route="/api/v1/books/"'
+    assert f'http_request_db_queries_bucket{{{labels},le="1"}} 2' in rendered
+    assert f'http_request_db_queries_bucket{{{labels},le="5"}} 3' in rendered
+    assert f'http_request_db_queries_bucket{{{labels},le="+Inf"}} 4' in rendered
+    assert f"http_request_db_queries_count{{{labels}}} 4" in rendered
+    assert "db_pool_checked_out 3" in rendered
+
+
+@pytest.mark.asyncio
+async def test_fixed_queries_hit_the_statement_cache(db_session, metrics_client):
+    # Pages of different sizes and positions are one cached statement
+    await metrics_client.get("/api/v1/books/?limit=2")
+    hits = registry.statement_cache["hit"]
+    await metrics_client.get("/api/v1/books/?limit=3&after=1")
+    await metrics_client.get("/api/v1/books/?limit=4&after=1")
+
+    assert registry.statement_cache["hit"] >= hits + 1
+    assert 'db_statement_cache_total{result="hit"}' in registry.render()
+
+
+def test_lambda_statements_bind_their_arguments():
+    first = statements.book_row(1).compile()
+    second = statements.book_row(2).compile()
+    assert str(first) == str(second)
+    assert list(second.params.values()) == [2]
+
+
+@pytest.mark.asyncio
+async def test_pool_status_after_a_checkout(async_client, monkeypatch):
+    engine = create_engine(settings.database_test_url)
+    monkeypatch.setattr(database, "__async_engine", engine)
+    try:
+        async with engine.connect():
+            response = await async_client.get("/system/pool")
+            assert response.json()["checked_out"] == 1
+
+        response = await async_client.get("/system/pool")
+        assert response.status_code == status.HTTP_200_OK
+        pool = response.json()
+        assert pool["size"] == settings.max_connection_count
+        assert pool["checked_out"] == 0
+        assert pool["checked_in"] == 1
+        assert pool["checkouts"] == 1
+        assert pool["timeouts"] == 0
+        # No pre-ping round trip by default
+        assert not engine.pool._pre_ping
+    finally:
+        await engine.dispose()
@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import delete, inspect, text
+from src.migrations import (
+    HEAD, SchemaVersionError, current_version, migrate, schema_version, v0001_catalogue, verify,
+)
+from src.models.books import Book
+from src.models.sellers import Seller
+
+
+@pytest.mark.asyncio
+async def test_schema_is_at_head(db_session):
+    connection = await db_session.connection()
+    assert await current_version(connection) == HEAD
+    # Applied migrations are not applied again
+    assert await connection.run_sync(migrate) == []
+
+
+@pytest.mark.asyncio
+async def test_boot_refuses_an_old_schema(db_session):
+    connection = await db_session.connection()
+    await connection.execute(delete(schema_version).where(schema_version.c.version == HEAD))
+
+    with pytest.raises(SchemaVersionError):
+        verify(await current_version(connection))
+    with pytest.raises(SchemaVersionError):
+        verify(None)
+    # Migrated ahead of this code during a rolling deploy
+    verify(HEAD + 1)
+
+
+# Tables as the first release created them with metadata.create_all
+BASELINE_SCHEMA = (
+    "CREATE TABLE sellers_table (id SERIAL PRIMARY KEY, first_name VARCHAR(32) NOT NULL, "
+    "last_name VARCHAR(32) NOT NULL, e_mail VARCHAR(64) NOT NULL, password VARCHAR(64) NOT NULL)",
+    "CREATE TABLE books_table (id SERIAL PRIMARY KEY, title VARCHAR(50) NOT NULL, "
+    "author VARCHAR(100) NOT NULL, year INTEGER NOT NULL, pages INTEGER NOT NULL, "
+    "seller_id INTEGER NOT NULL REFERENCES sellers_table (id) ON DELETE CASCADE)",
+)
+
+
+@pytest.mark.asyncio
+async def test_catalogue_migration_upgrades_a_baseline_database(db_session):
+    connection = await db_session.connection()
+    # A schema of its own, dropped with the test transaction
+    await connection.execute(text("CREATE SCHEMA baseline"))
+    await connection.execute(text("SET LOCAL search_path TO baseline"))
+    for statement in BASELINE_SCHEMA:
+        await connection.execute(text(statement))
+    await connection.execute(text(
+        "INSERT INTO sellers_table (first_name, last_name, e_mail, password) VALUES ('a', 'b', 'c', 'd')"
+    ))
+    await connection.execute(text(
+        "INSERT INTO books_table (title, author, year, pages, seller_id) SELECT 't', 'a', 2024, 1, id FROM sellers_table"
+    ))
+
+    await connection.run_sync(v0001_catalogue.upgrade)
+    # Idempotent
+    await connection.run_sync(v0001_catalogue.upgrade)
+
+    def inspect_tables(sync_connection):
+        inspector = inspect(sync_connection)
+        columns = {
+            table: {column["name"]: column for column in inspector.get_columns(table, schema="baseline")}
+            for table in ("sellers_table", "books_table")
+        }
+        indexes = {
+            index["name"]
+            for table in ("sellers_table", "books_table")
+            for index in inspector.get_indexes(table, schema="baseline")
+        }
+        return columns, indexes
+
+    columns, indexes = await connection.run_sync(inspect_tables)
+    for table in columns.values():
+        assert {"version", "updated_at"} <= table.keys()
+    assert columns["sellers_table"]["password"]["type"].length == 128
+    assert {index.name for index in Book.__table__.indexes} | {index.name for index in Seller.__table__.indexes} <= indexes
+
+    row = (await connection.execute(text("SELECT version, updated_at FROM books_table"))).one()
+    assert row.version == 1 and row.updated_at is not None
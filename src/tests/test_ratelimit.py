@@ -0,0 +1,118 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, status
+from src.services.ratelimit import (
+    AdmissionMiddleware, MemoryTokenBucketStore, RedisTokenBucketStore, gcra,
+)
+from .fakes import FakeRedis
+
+
+def admission_client(app, **options) -> httpx.AsyncClient:
+    middleware = AdmissionMiddleware(app, router=app.router, store=MemoryTokenBucketStore(), **options)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://127.0.0.1:8000")
+
+
+def test_gcra_refills_at_the_rate():
+    tat, retry_after = gcra(None, now=0.0, rate=2, burst=2)
+    tat, retry_after = gcra(tat, now=0.0, rate=2, burst=2)
+    assert retry_after == 0
+    assert gcra(tat, now=0.0, rate=2, burst=2) == (None, 0.5)
+    assert gcra(tat, now=0.5, rate=2, burst=2)[1] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("make_store", [MemoryTokenBucketStore, lambda: RedisTokenBucketStore(FakeRedis())])
+async def test_token_bucket_store(make_store):
+    store = make_store()
+    assert await store.take("client", rate=1, burst=2) == 0
+    assert await store.take("client", rate=1, burst=2) == 0
+    assert 0 < await store.take("client", rate=1, burst=2) <= 1
+    # Buckets are independent
+    assert await store.take("other", rate=1, burst=2) == 0
+
+
+@pytest.mark.asyncio
+async def test_client_bucket_sheds_with_429(test_app):
+    async with admission_client(test_app, rate=1, burst=2) as client:
+        responses = [await client.get("/api/v1/books/") for _ in range(3)]
+
+    assert [response.status_code for response in responses] == [
+        status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS,
+    ]
+    assert responses[2].headers["retry-after"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_route_bucket_is_shared_by_the_path_template(test_app):
+    routes = {"GET /api/v1/books/{book_id}": (1, 1)}
+    async with admission_client(test_app, rate=100, burst=100, routes=routes) as client:
+        first = await client.get("/api/v1/books/1")
+        second = await client.get("/api/v1/books/2")
+        listed = await client.get("/api/v1/books/")
+
+    assert first.status_code == status.HTTP_404_NOT_FOUND
+    assert second.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert listed.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_request_refused_by_its_route_keeps_the_client_tokens(test_app):
+    routes = {"GET /api/v1/books/{book_id}": (1, 1)}
+    async with admission_client(test_app, rate=1, burst=2, routes=routes) as client:
+        first = await client.get("/api/v1/books/1")
+        refused = await client.get("/api/v1/books/2")
+        listed = await client.get("/api/v1/books/")
+
+    assert first.status_code == status.HTTP_404_NOT_FOUND
+    assert refused.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert listed.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.parametrize(("hops", "headers", "client"), [
+    # The proxy appends the address it sees, the rest is up to the client
+    (1, [(b"x-forwarded-for", b"1.1.1.1, 10.0.0.1")], "10.0.0.1"),
+    (2, [(b"x-forwarded-for", b"1.1.1.1, 10.0.0.1, 10.0.0.2")], "10.0.0.1"),
+    (2, [(b"x-forwarded-for", b"1.1.1.1"), (b"x-forwarded-for", b"10.0.0.1")], "1.1.1.1"),
+    # Not through the proxies
+    (2, [(b"x-forwarded-for", b"1.1.1.1")], "192.168.0.1"),
+    (1, [], "192.168.0.1"),
+])
+def test_client_is_counted_from_the_trusted_proxies(hops, headers, client):
+    middleware = AdmissionMiddleware(
+        FastAPI(), router=FastAPI().router, store=MemoryTokenBucketStore(),
+        client_header="X-Forwarded-For", trusted_hops=hops,
+    )
+    assert middleware.client_of({"headers": headers, "client": ("192.168.0.1", 50000)}) == client
+
+
+@pytest.mark.asyncio
+async def test_spoofed_forwarded_for_shares_the_bucket(test_app):
+    async with admission_client(test_app, rate=1, burst=1, client_header="X-Forwarded-For") as client:
+        first = await client.get("/api/v1/books/", headers={"X-Forwarded-For": "1.1.1.1, 10.0.0.1"})
+        second = await client.get("/api/v1/books/", headers={"X-Forwarded-For": "2.2.2.2, 10.0.0.1"})
+
+    assert first.status_code == status.HTTP_200_OK
+    assert second.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+
+@pytest.mark.asyncio
+async def test_requests_beyond_max_in_flight_get_503():
+    app = FastAPI()
+    release = asyncio.Event()
+
+    @app.get("/api/slow")
+    async def slow():
+        await release.wait()
+        return {}
+
+    async with admission_client(app, max_in_flight=1) as client:
+        first = asyncio.create_task(client.get("/api/slow"))
+        await asyncio.sleep(0.01)
+        shed = await client.get("/api/slow")
+        release.set()
+        assert (await first).status_code == status.HTTP_200_OK
+
+    assert shed.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert shed.headers["retry-after"] == "1"
@@ -0,0 +1,164 @@
+from typing import Annotated
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import Depends, FastAPI
+from sqlalchemy import make_url, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from src.configurations import database
+from src.configurations.database import (
+    create_engine, get_async_session, get_primary_read_session, get_read_session, get_write_session,
+    read_from_replica,
+)
+from src.configurations.replicas import Replica, ReplicaSet
+from src.configurations.settings import settings
+from src.services.cache import ResponseCache, get_read_cache, get_response_cache
+
+
+# Stand-ins: two engines on the test database and one on a server that does not
+# listen (port 9, discard, refused on loopback)
+DEAD_URL = make_url(settings.database_test_url).set(host="127.0.0.1", port=9)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def replicas():
+    replica_set = ReplicaSet(
+        [
+            Replica(create_engine(settings.database_test_url)),
+            Replica(create_engine(settings.database_test_url)),
+            Replica(create_engine(DEAD_URL.render_as_string(hide_password=False))),
+        ],
+        health_timeout=5.0,
+    )
+    yield replica_set
+    await replica_set.dispose()
+
+
+@pytest.mark.asyncio
+async def test_health_check_takes_dead_replica_out_of_rotation(replicas):
+    first, second, dead = replicas.replicas
+    await replicas.check_all()
+
+    assert first.healthy and second.healthy
+    assert not dead.healthy
+    # Round robin over the healthy replicas only
+    assert [replicas.choose() for _ in range(4)] == [first, second, first, second]
+
+
+@pytest.mark.asyncio
+async def test_no_healthy_replica_falls_back_to_primary(replicas):
+    for replica in replicas.replicas:
+        replicas.mark_down(replica)
+    assert replicas.choose() is None
+
+    # A later successful check brings a replica back
+    await replicas.check(replicas.replicas[0])
+    assert replicas.choose() is replicas.replicas[0]
+
+
+@pytest.mark.asyncio
+async def test_least_connections(replicas):
+    first, second, dead = replicas.replicas
+    replicas.strategy = "least_connections"
+    replicas.mark_down(dead)
+
+    async with first.engine.connect():
+        assert replicas.choose() is second
+    async with second.engine.connect():
+        assert replicas.choose() is first
+
+
+@pytest.mark.asyncio
+async def test_unreachable_replica_read_is_retried_on_the_primary(replicas):
+    primary = create_engine(settings.database_test_url)
+    replicas.fallback = primary
+    dead = replicas.replicas[2]
+    session = replicas.session(dead)
+    try:
+        assert read_from_replica(session)
+        assert await session.scalar(select(1)) == 1
+        # The rest of the request stays on the primary
+        assert await session.scalar(select(2)) == 2
+        assert not read_from_replica(session)
+        assert not dead.healthy
+    finally:
+        await session.close()
+        await primary.dispose()
+
+
+@pytest.fixture(scope="function")
+def routing_app(replicas, monkeypatch, response_cache):
+    first, second, dead = replicas.replicas
+    replicas.mark_down(dead)
+    monkeypatch.setattr(database, "__replicas", replicas)
+    monkeypatch.setattr(database, "__read_session_factory", first.session_factory)
+
+    app = FastAPI()
+    app.dependency_overrides[get_async_session] = lambda: None
+    app.dependency_overrides[get_response_cache] = lambda: response_cache
+
+    @app.post("/write")
+    async def write(session: Annotated[AsyncSession, Depends(get_write_session)]):
+        return {}
+
+    @app.get("/read")
+    async def read(
+        session: Annotated[AsyncSession, Depends(get_read_session)],
+        cache: Annotated[ResponseCache, Depends(get_read_cache)],
+    ):
+        if cache is response_cache:
+            used = "fill"
+        else:
+            used = "read" if cache.backend is response_cache.backend else "none"
+        return {"replica": read_from_replica(session), "cache": used}
+
+    @app.get("/primary")
+    async def primary(session: Annotated[AsyncSession, Depends(get_primary_read_session)]):
+        await session.execute(select(1))
+        return {"replica": read_from_replica(session)}
+
+    @app.get("/cached")
+    async def cached(cache: Annotated[ResponseCache, Depends(get_read_cache)]):
+        await cache.set("cached", b"{}")
+        return {"stored": await response_cache.get("cached") is not None}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_reads_after_a_write_go_to_the_primary(routing_app, replicas):
+    transport = httpx.ASGITransport(app=routing_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://127.0.0.1:8000") as client:
+        # Cached entries are served, but a replica never fills them
+        assert (await client.get("/read")).json() == {"replica": True, "cache": "read"}
+
+        response = await client.post("/write")
+        assert settings.read_your_writes_seconds
+        assert "read_primary" in response.cookies
+
+        # The client's own writes: primary, no cache at all
+        assert (await client.get("/read")).json() == {"replica": False, "cache": "none"}
+
+        client.cookies.clear()
+        assert (await client.get("/read")).json()["replica"] is True
+
+
+@pytest.mark.asyncio
+async def test_primary_reads_never_go_to_a_replica(routing_app):
+    transport = httpx.ASGITransport(app=routing_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://127.0.0.1:8000") as client:
+        assert (await client.get("/read")).json()["replica"] is True
+        assert (await client.get("/primary")).json()["replica"] is False
+
+
+@pytest.mark.asyncio
+async def test_replica_reads_do_not_fill_the_cache(routing_app, replicas):
+    transport = httpx.ASGITransport(app=routing_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://127.0.0.1:8000") as client:
+        assert (await client.get("/cached")).json() == {"stored": False}
+
+        # Fallen back to the primary, the read fills it
+        for replica in replicas.replicas:
+            replicas.mark_down(replica)
+        assert (await client.get("/cached")).json() == {"stored": True}
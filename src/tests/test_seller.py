@@ -3,7 +3,9 @@ from sqlalchemy import select
 from src.models.books import Book
 from src.models.sellers import Seller
 from fastapi import status
-from icecream import ic
+from src.configurations.settings import settings
+from src.services.cache import SELLERS_LIST_TAG, seller_key
+from src.services.security import verify_password
 from .data import *
 
 @pytest.mark.asyncio
@@ -194,3 +196,156 @@ async def test_delete_seller_with_invalid_seller_id(db_session, async_client):
     response = await async_client.delete(f"/api/v1/seller/{added_seller.id + 1}")
 
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_get_sellers_paginated(db_session, async_client):
+    added_sellers = [Seller(**seller1), Seller(**seller2)]
+    db_session.add_all(added_sellers)
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/seller", params={'limit': 1})
+    assert response.status_code == status.HTTP_200_OK
+
+    first_page = response.json()
+    assert [seller['id'] for seller in first_page['sellers']] == [added_sellers[0].id]
+    assert first_page['next_after'] == added_sellers[0].id
+
+    response = await async_client.get(
+        "/api/v1/seller", params={'limit': 1, 'after': first_page['next_after']}
+    )
+    second_page = response.json()
+    assert [seller['id'] for seller in second_page['sellers']] == [added_sellers[1].id]
+    assert second_page['next_after'] is None
+
+    response = await async_client.get("/api/v1/seller", params={'last_name': 'Jobs'})
+    assert [seller['id'] for seller in response.json()['sellers']] == [added_sellers[1].id]
+
+
+@pytest.mark.asyncio
+async def test_get_seller_fields_and_books_pages(db_session, async_client):
+    added_seller = Seller(**seller1)
+    db_session.add(added_seller)
+    await db_session.flush()
+
+    added_books = []
+    for index in range(3):
+        book = make_returned(book1)
+        book['title'] = f"Book {index}"
+        book['seller_id'] = added_seller.id
+        added_books.append(Book(**book))
+    db_session.add_all(added_books)
+    await db_session.flush()
+
+    response = await async_client.get(
+        f"/api/v1/seller/{added_seller.id}", params={'fields': 'email, first_name'}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {'first_name': seller1['first_name'], 'email': seller1['e_mail']}
+
+    response = await async_client.get(
+        f"/api/v1/seller/{added_seller.id}", params={'fields': 'id', 'include': 'books', 'books_limit': 2}
+    )
+    result_data = response.json()
+    assert [book['id'] for book in result_data['books']] == [added_books[0].id, added_books[1].id]
+    assert result_data['books_next_after'] == added_books[1].id
+    assert result_data['id'] == added_seller.id and 'email' not in result_data
+
+    response = await async_client.get(
+        f"/api/v1/seller/{added_seller.id}",
+        params={'include': 'books', 'books_limit': 2, 'books_after': result_data['books_next_after']},
+    )
+    result_data = response.json()
+    assert [book['id'] for book in result_data['books']] == [added_books[2].id]
+    assert 'books_next_after' not in result_data
+    assert result_data['email'] == seller1['e_mail']
+
+    # A summary ETag is enough for a conditional update
+    response = await async_client.get(f"/api/v1/seller/{added_seller.id}", params={'fields': 'id'})
+    updated_seller = seller2.copy()
+    updated_seller['id'] = added_seller.id
+    response = await async_client.put(
+        f"/api/v1/seller/{added_seller.id}", json=updated_seller, headers={'If-Match': response.headers['etag']}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await async_client.get(
+        f"/api/v1/seller/{added_seller.id}", params={'fields': 'password'}
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_get_seller_conditional(db_session, async_client, response_cache):
+    added_seller = Seller(**seller1)
+    db_session.add(added_seller)
+    await db_session.flush()
+
+    book = make_returned(book1)
+    book['seller_id'] = added_seller.id
+    db_session.add(Book(**book))
+    await db_session.flush()
+
+    response = await async_client.get(f"/api/v1/seller/{added_seller.id}")
+    etag = response.headers['etag']
+
+    response = await async_client.get(
+        f"/api/v1/seller/{added_seller.id}", headers={'If-None-Match': etag}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # Revalidation without a cached response reads the versions from the database
+    await response_cache.invalidate(keys=[f"seller:{added_seller.id}"])
+    response = await async_client.get(
+        f"/api/v1/seller/{added_seller.id}", headers={'If-None-Match': etag}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    updated_seller = seller2.copy()
+    updated_seller['id'] = added_seller.id
+    response = await async_client.put(
+        f"/api/v1/seller/{added_seller.id}", json=updated_seller, headers={'If-Match': '"0.0.0"'}
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = await async_client.put(
+        f"/api/v1/seller/{added_seller.id}", json=updated_seller, headers={'If-Match': etag}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_create_seller_stores_password_hash(db_session, async_client):
+    seller = seller1.copy()
+    response = await async_client.post("/api/v1/seller", json=seller)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    added_seller = await db_session.get(Seller, response.json()['id'])
+    assert added_seller.password != seller['password']
+    assert await verify_password(seller['password'], added_seller.password)
+    assert not await verify_password(seller2['password'], added_seller.password)
+
+
+@pytest.mark.asyncio
+async def test_fast_serialization_is_byte_identical(db_session, async_client, response_cache, monkeypatch):
+    added_seller = Seller(**seller1)
+    db_session.add_all([added_seller, Seller(**seller2)])
+    await db_session.flush()
+    book = make_returned(book1)
+    book['seller_id'] = added_seller.id
+    db_session.add_all([Book(**book), Book(**book)])
+    await db_session.flush()
+
+    paths = [
+        "/api/v1/seller?limit=1",
+        f"/api/v1/seller/{added_seller.id}",
+        f"/api/v1/seller/{added_seller.id}?include=books&books_limit=1",
+    ]
+    bodies = {}
+    for fast in (False, True):
+        monkeypatch.setattr(settings, 'fast_serialization', fast)
+        await response_cache.invalidate(tags=[seller_key(added_seller.id), SELLERS_LIST_TAG])
+        bodies[fast] = [(await async_client.get(path)).content for path in paths]
+
+    assert b'"books_next_after"' in bodies[False][2]
+    assert bodies[True] == bodies[False]
@@ -0,0 +1,35 @@
+import pytest
+import uvicorn
+from src.serve import PoolSize, check_cache_backend, size_pool, uvicorn_options
+
+
+def test_pool_that_fits_is_kept():
+    assert size_pool(workers=4, max_connections=100, pool_size=10, max_overflow=5) == PoolSize(10, 5)
+
+
+def test_pool_shrinks_to_the_share_of_each_worker():
+    # The overflow goes first
+    assert size_pool(workers=8, max_connections=100, pool_size=10, max_overflow=5) == PoolSize(10, 2)
+    assert size_pool(workers=16, max_connections=100, pool_size=10, max_overflow=5) == PoolSize(6, 0)
+    for workers in range(1, 101):
+        pool_size, max_overflow = size_pool(workers, max_connections=100, pool_size=10, max_overflow=5)
+        assert workers * (pool_size + max_overflow) <= 100
+
+
+def test_more_workers_than_connections_is_refused():
+    with pytest.raises(ValueError):
+        size_pool(workers=8, max_connections=4, pool_size=10, max_overflow=5)
+
+
+def test_memory_cache_is_refused_with_several_workers():
+    check_cache_backend(workers=1, backend="memory")
+    check_cache_backend(workers=8, backend="redis")
+    check_cache_backend(workers=8, backend="none")
+    with pytest.raises(ValueError):
+        check_cache_backend(workers=2, backend="memory")
+
+
+def test_uvicorn_accepts_the_options():
+    config = uvicorn.Config("src.main:app", **uvicorn_options(workers=2))
+    assert config.workers == 2
+    assert config.timeout_graceful_shutdown is not None
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from fastapi import status
+from src.models.sellers import Seller
+from src.services.singleflight import SingleFlight
+from .data import *
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return calls
+
+    waiters = [asyncio.create_task(flight.do("key", call)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*waiters) == [1] * 5
+    assert flight.coalesced == 4
+
+    # The result landed, the next caller runs the call again
+    assert await flight.do("key", call) == 2
+
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_a_cancelled_call():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def stuck():
+        started.set()
+        await asyncio.sleep(60)
+
+    async def call():
+        return "result"
+
+    leader = asyncio.create_task(flight.do("key", stuck))
+    await started.wait()
+    waiter = asyncio.create_task(flight.do("key", call))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await waiter == "result"
+
+
+@pytest.mark.asyncio
+async def test_forget_detaches_calls_in_flight():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def old():
+        await release.wait()
+        return "old"
+
+    async def new():
+        return "new"
+
+    leader = asyncio.create_task(flight.do("key", old))
+    await asyncio.sleep(0)
+    # A write committed: new callers must not get the result read before it
+    flight.forget()
+    assert await flight.do("key", new) == "new"
+    release.set()
+    assert await leader == "old"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_seller_reads_are_coalesced(db_session, async_client, response_cache):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    responses = await asyncio.gather(
+        *(async_client.get(f"/api/v1/seller/{seller.id}") for _ in range(5))
+    )
+    assert {response.status_code for response in responses} == {status.HTTP_200_OK}
+    assert len({response.content for response in responses}) == 1
+    assert response_cache.flight.coalesced > 0
@@ -0,0 +1,41 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[2]
+
+# Loose enough for a slow machine, it catches heavy imports added to the boot path
+IMPORT_BUDGET_SECONDS = 3.0
+# The modules of the app alone, the frameworks are most of the total
+OWN_IMPORT_BUDGET_SECONDS = 0.5
+# Not needed to serve requests, imported on first use or by the tools only
+LAZY_MODULES = (
+    "redis", "httpx", "src.benchmarks",
+    "src.migrations.v0001_catalogue", "src.migrations.v0002_stats", "src.migrations.v0003_jobs",
+    "src.migrations.v0004_changes", "src.migrations.v0005_stats_shards",
+)
+
+
+def import_app() -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import sys, src.main; print(' '.join(sys.modules))"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+
+
+def test_app_import_time_is_within_budget():
+    # -X importtime lines: "import time: self [us] | cumulative | package"
+    times = {}
+    for line in import_app().stderr.splitlines():
+        if line.startswith("import time:") and not line.endswith("package"):
+            own, cumulative, name = line.removeprefix("import time:").split("|")
+            times[name.strip()] = (int(own), int(cumulative))
+
+    assert times["src.main"][1] / 1e6 < IMPORT_BUDGET_SECONDS
+    own = sum(own for name, (own, _) in times.items() if name == "src" or name.startswith("src."))
+    assert own / 1e6 < OWN_IMPORT_BUDGET_SECONDS
+
+
+def test_app_import_leaves_tools_and_optional_dependencies_out():
+    modules = set(import_app().stdout.split())
+    assert modules.isdisjoint(LAZY_MODULES)
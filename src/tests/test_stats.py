@@ -0,0 +1,94 @@
+import pytest
+from fastapi import status
+from src.models.sellers import Seller
+from src.models.stats import AuthorStats, SellerYearStats, YearStats
+from .data import *
+
+
+@pytest.mark.asyncio
+async def test_stats_follow_book_writes(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    books = [
+        {"title": "Dune", "author": "Frank Herbert", "year": 2021, "count_pages": 400, "seller_id": seller.id},
+        {"title": "Dune Messiah", "author": "Frank Herbert", "year": 2022, "count_pages": 250, "seller_id": seller.id},
+        {"title": "Neuromancer", "author": "William Gibson", "year": 2022, "count_pages": 270, "seller_id": seller.id},
+    ]
+    response = await async_client.post("/api/v1/books/bulk", json=books)
+    created = response.json()["created"]
+
+    response = await async_client.get("/api/v1/stats")
+    assert response.json() == {"books": 3, "pages": 920}
+
+    # Moving a book to another year moves its counts
+    moved = created[0] | {"year": 2022}
+    response = await async_client.put(f"/api/v1/books/{moved['id']}", json=moved)
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await async_client.get("/api/v1/stats/years")
+    assert response.json() == [{"books": 3, "pages": 920, "year": 2022}]
+
+    response = await async_client.delete(f"/api/v1/books/{created[2]['id']}")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    response = await async_client.get("/api/v1/stats/authors")
+    assert response.json() == {
+        "authors": [{"books": 2, "pages": 650, "author": "Frank Herbert"}],
+        "next_after": None,
+    }
+
+    response = await async_client.get(f"/api/v1/stats/sellers/{seller.id}")
+    assert response.json() == {
+        "books": 2, "pages": 650, "seller_id": seller.id,
+        "years": [{"books": 2, "pages": 650, "year": 2022}],
+    }
+
+    response = await async_client.delete(f"/api/v1/seller/{seller.id}")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    response = await async_client.get("/api/v1/stats")
+    assert response.json() == {"books": 0, "pages": 0}
+    response = await async_client.get(f"/api/v1/stats/sellers/{seller.id}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_stats_of_seller_without_books(db_session, async_client):
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+
+    response = await async_client.get(f"/api/v1/stats/sellers/{seller.id}")
+    assert response.json() == {"books": 0, "pages": 0, "seller_id": seller.id, "years": []}
+
+
+@pytest.mark.asyncio
+async def test_stats_add_up_the_shards(db_session, async_client):
+    # As left by writers on different connections: 2021 has a book in each
+    # of two shards, 2022 had one added in a shard and removed in another
+    seller = Seller(**seller1)
+    db_session.add(seller)
+    await db_session.flush()
+    db_session.add_all([
+        YearStats(year=2021, shard=0, books=1, pages=100),
+        YearStats(year=2021, shard=3, books=1, pages=200),
+        YearStats(year=2022, shard=1, books=1, pages=50),
+        YearStats(year=2022, shard=2, books=-1, pages=-50),
+        AuthorStats(author="Frank Herbert", shard=0, books=1, pages=100),
+        AuthorStats(author="Frank Herbert", shard=3, books=1, pages=200),
+        SellerYearStats(seller_id=seller.id, year=2021, shard=0, books=1, pages=100),
+        SellerYearStats(seller_id=seller.id, year=2021, shard=3, books=1, pages=200),
+    ])
+    await db_session.flush()
+
+    response = await async_client.get("/api/v1/stats")
+    assert response.json() == {"books": 2, "pages": 300}
+    response = await async_client.get("/api/v1/stats/years")
+    assert response.json() == [{"books": 2, "pages": 300, "year": 2021}]
+    response = await async_client.get("/api/v1/stats/authors")
+    assert response.json()["authors"] == [{"books": 2, "pages": 300, "author": "Frank Herbert"}]
+    response = await async_client.get("/api/v1/stats/sellers")
+    assert response.json()["sellers"] == [{
+        "books": 2, "pages": 300, "seller_id": seller.id, "years": [{"books": 2, "pages": 300, "year": 2021}],
+    }]